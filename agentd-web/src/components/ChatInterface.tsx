@@ -18,6 +18,7 @@ export const ChatInterface: React.FC = () => {
   const [showSidebar, setShowSidebar] = useState(true);
   const [isTyping, setIsTyping] = useState(false);
   const [progress, setProgress] = useState<{ step: number, total: number, message: string } | null>(null);
+  const [commandOutput, setCommandOutput] = useState<string[]>([]);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState<string | null>(null);
   const [creatingSession, setCreatingSession] = useState(false);
@@ -187,6 +188,7 @@ export const ChatInterface: React.FC = () => {
     setInputMessage('');
     setIsTyping(true);
     setProgress(null);
+    setCommandOutput([]);
     try {
       const response = await fetch('/api/chat', {
         method: 'POST',
@@ -214,6 +216,10 @@ export const ChatInterface: React.FC = () => {
             const data = JSON.parse(line.slice(6));
             if (data.type === 'progress') {
               setProgress({ step: data.step, total: data.total, message: data.message });
+            } else if (data.type === 'tool_output') {
+              // Keep the last few lines of the running command's output
+              const text = data.stream === 'command' ? `$ ${data.line}` : data.line;
+              setCommandOutput(prev => [...prev, text].slice(-6));
             } else if (data.type === 'response') {
               const aiMessage: Message = {
                 id: generateId(),
@@ -238,6 +244,7 @@ export const ChatInterface: React.FC = () => {
               ));
               setIsTyping(false);
               setProgress(null);
+              setCommandOutput([]);
               return;
             } else if (data.type === 'error') {
               const errorMessage: Message = {
@@ -253,6 +260,7 @@ export const ChatInterface: React.FC = () => {
               ));
               setIsTyping(false);
               setProgress(null);
+              setCommandOutput([]);
               return;
             }
           }
@@ -272,6 +280,7 @@ export const ChatInterface: React.FC = () => {
       ));
       setIsTyping(false);
       setProgress(null);
+      setCommandOutput([]);
     }
   };
 
@@ -408,6 +417,13 @@ export const ChatInterface: React.FC = () => {
                         </div>
                       </div>
 
+                      {/* Live output of the running terminal command */}
+                      {commandOutput.length > 0 && (
+                        <pre className="text-xs text-white/70 bg-black/30 rounded-lg p-2 overflow-x-auto whitespace-pre-wrap">
+                          {commandOutput.join('\n')}
+                        </pre>
+                      )}
+
                       {/* Step counter with percentage */}
                       <div className="flex items-center justify-between text-xs">
                         <span className="text-white/60 font-medium">
@@ -1,20 +1,39 @@
 from .agentD_State import AgentState
 from langgraph.graph import add_messages, StateGraph, END
-from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_groq import ChatGroq
 from langchain_core.messages import HumanMessage, AIMessage, ToolMessage
 from dotenv import load_dotenv
 from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
-import sqlite3
 import aiosqlite
 from langgraph.prebuilt import ToolNode
+from langgraph.types import Send
 from .terminal_tool import execute_shell_command
-from .zapier_tools import initialize_and_get_mcp_tools 
+from .output_capture import read_command_output
+from .jobs import get_job_tools
+from .search_tool import search_files
+from .shell_pool import shell_pool
+from .zapier_tools import connect_mcp_servers
 from .file_tools import get_file_tools, create_file, write_file, read_file, replace_in_file, delete_file
 from .browse_cloud_tool import browse_web_cloud
 from .prompts import SYSTEM_PROMPT
+from .db import DB_PATH, BUSY_TIMEOUT_SECONDS
+from .session_lock import session_lock
+from .clients import close_clients, get_chat_llm
+from .run_context import current_event_sink, current_run_id, current_session_id
+from .tracing import TraceCallbackHandler, finish_run, span, start_run
+from .tool_selector import ToolSelector, tool_name
+from .llm_gateway import estimate_tokens, gateway, usage_metadata_tokens
+from .tool_cache import invalidate_for_calls, with_result_cache
+from .read_tracker import current_read_scope, read_tracker, with_read_tracking
+from .planner import (
+    MAX_SUBTASKS, PLANNER_ENABLED, PLANNER_PROMPT, SUBTASK_MAX_ROUNDS, SUBTASK_PREAMBLE, SYNTHESIZE_INSTRUCTION,
+    dependency_context, format_results, parse_plan, ready_subtasks,
+)
+from .budgets import FINALIZE_INSTRUCTION, REASON_TEXT, exceeded_budget, initial_budget_state, record_overrun, recursion_limit
+from .response_cache import RESPONSE_CACHE_ENABLED, cache_key, is_cacheable_turn, response_cache, toolset_fingerprint
 import re
 import os
+import time
 
 import asyncio
 
@@ -22,8 +41,15 @@ load_dotenv()
 
 # Global variables
 _agent = None
+_llm = None
+_memory = None
+_mcp_task = None
 zapier_tools_list = []
 mcp_active = False
+_toolset_fingerprint = ""
+
+# Pause between streamed progress steps (seconds); benchmarks set it to 0
+PROGRESS_STEP_DELAY = float(os.getenv("AGENTD_PROGRESS_DELAY", "0.5"))
 
 def format_system_info(content: str) -> str:
     """Format system information without markdown formatting."""
@@ -88,103 +114,232 @@ def format_tool_output(content: str) -> str:
     # Join with newlines
     return '\n'.join(formatted_lines)
 
-def init_chat_db():
-    conn = sqlite3.connect("memory.sqlite")
-    cursor = conn.cursor()
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS chat_sessions (
-            id TEXT PRIMARY KEY,
-            title TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS chat_messages (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            session_id TEXT,
-            role TEXT,
-            content TEXT,
-            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY(session_id) REFERENCES chat_sessions(id) ON DELETE CASCADE
-        )
-    ''')
-    conn.commit()
-    conn.close()
+class TracedAsyncSqliteSaver(AsyncSqliteSaver):
+    """Checkpointer that records each checkpoint write as a span of the current run."""
 
-async def initialize_agent():
-    """Initialize the LangGraph agent with necessary tools and configuration."""
-    global _agent, zapier_tools_list
-    
-    if _agent is not None:
-        return _agent
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        with span("checkpoint.put", "db"):
+            return await super().aput(config, checkpoint, metadata, new_versions)
 
-    sqlite_conn = await aiosqlite.connect("memory.sqlite", check_same_thread=False)
-    memory = AsyncSqliteSaver(sqlite_conn)
+    async def aput_writes(self, config, writes, task_id, task_path=""):
+        with span("checkpoint.put_writes", "db", writes=len(writes)):
+            return await super().aput_writes(config, writes, task_id, task_path)
 
-    # Initialize chat DB tables
-    init_chat_db()
+def get_builtin_tools() -> list:
+    """Tools that are always available, independent of MCP servers."""
+    tools = [execute_shell_command, read_command_output]
+    tools.extend(get_job_tools())
+    tools.extend(get_file_tools())
+    tools.append(search_files)
+    tools.append(browse_web_cloud)
+    return tools
 
-    # Initialize Zapier tools (will return empty list if MCP is not available)
-    zapier_tools_list = await initialize_and_get_mcp_tools()
-    
-    global mcp_active
-    mcp_active = len(zapier_tools_list) > 0
+def build_agent(llm, all_tools: list, memory):
+    """Compile the chat <-> tool_node graph for the given tool set.
 
+    In plan mode the turn instead goes planner -> waves of parallel execute_subtask
+    branches (joined by schedule) -> synthesize.
+    """
     graph = StateGraph(AgentState)
 
-    # Get Google API key from environment variable
-    google_api_key = os.getenv("GOOGLE_API_KEY")
-    if not google_api_key:
-        raise RuntimeError("GOOGLE_API_KEY environment variable not set. Please set it to your Google Generative AI API key.")
-
-    # Pass the API key to the LLM
-    llm = ChatGoogleGenerativeAI(model="gemini-2.5-flash", api_key=google_api_key)
-    # llm = ChatGroq(model="openai/gpt-oss-20b")
+    # Built-in tools are always bound; MCP tools are retrieved per turn so that only the
+    # relevant schemas are sent with each request.
+    builtin_names = {tool_name(t) for t in get_builtin_tools()}
+    tool_selector = ToolSelector(
+        all_tools,
+        always_include=[tool_name(t) for t in all_tools if tool_name(t) in builtin_names],
+        top_k=int(os.getenv("AGENTD_TOOL_TOP_K", "12")),
+    )
+    bound_llms = {}
 
-    # Combine all tools
-    all_tools = [execute_shell_command]
-    all_tools.extend(get_file_tools())
-    all_tools.append(browse_web_cloud)
-    
-    # Only add Zapier tools if they were successfully initialized
-    if zapier_tools_list:
-        all_tools.extend(zapier_tools_list)
+    def get_llm_with_tools(messages):
+        tools = tool_selector.select(messages)
+        key = tuple(tool_name(t) for t in tools)
+        if key not in bound_llms:
+            if len(bound_llms) >= 64:
+                bound_llms.clear()
+            bound_llms[key] = llm.bind_tools(tools=tools)
+        return bound_llms[key]
 
-    llm_with_tools = llm.bind_tools(tools=all_tools)
+    async def call_llm(model, messages, name):
+        # Rate limits and transient Gemini errors are queued/retried instead of ending the turn
+        return await gateway.call(
+            lambda: model.ainvoke(messages),
+            name=name,
+            estimated_tokens=estimate_tokens("".join(str(m.content) for m in messages)),
+            usage_of=usage_metadata_tokens,
+        )
 
-    async def agentDChat(state: AgentState):
-        response = await llm_with_tools.ainvoke(state["messages"])
-        
+    def format_response(response):
         # Format system information if present
         if isinstance(response, AIMessage):
             if "system information" in response.content.lower():
                 response.content = format_system_info(response.content)
             elif "tool" in response.content.lower() or "command" in response.content.lower():
                 response.content = format_tool_output(response.content)
-                
-        return {"messages": [response]}
+        return response
+
+    async def agentDChat(state: AgentState):
+        llm_with_tools = get_llm_with_tools(state["messages"])
+        response = format_response(await call_llm(llm_with_tools, state["messages"], "chat"))
+        return {
+            "messages": [response],
+            "tokens_used": state.get("tokens_used", 0) + (usage_metadata_tokens(response) or 0),
+        }
+
+    async def finalize(state: AgentState):
+        """Answer from what has been gathered so far, without tools, once a budget is used up."""
+        reason = exceeded_budget(state) or "tool_rounds"
+        messages = list(state["messages"])
+        pending = getattr(messages[-1], "tool_calls", None) or []
+        # Every tool call needs a result before the model is called again
+        skipped = [
+            ToolMessage(content="Not executed: the budget for this request was reached.", tool_call_id=call["id"], name=call["name"])
+            for call in pending
+        ]
+        instruction = HumanMessage(content=FINALIZE_INSTRUCTION.format(reason=REASON_TEXT[reason]))
+        with span("budget.finalize", "budget", reason=reason, tool_rounds=state.get("tool_rounds", 0),
+                  tokens_used=state.get("tokens_used", 0)):
+            await record_overrun(current_run_id.get(), current_session_id.get(), reason, state)
+            response = format_response(await call_llm(llm, messages + skipped + [instruction], "finalize"))
+        return {
+            "messages": skipped + [response],
+            "tokens_used": state.get("tokens_used", 0) + (usage_metadata_tokens(response) or 0),
+            "budget_exceeded": reason,
+        }
 
     def tools_router(state: AgentState):
         last_message = state["messages"][-1]
         if isinstance(last_message, ToolMessage):   
-            return "chat"
+            return "finalize" if exceeded_budget(state) else "chat"
         
         if hasattr(last_message, "tool_calls") and len(last_message.tool_calls) > 0:
-            return "tool_node"
+            return "finalize" if exceeded_budget(state) else "tool_node"
         else: 
             return END
         
-    tool_node = ToolNode(tools=all_tools)
+    tool_node = ToolNode(tools=[with_read_tracking(with_result_cache(t)) for t in all_tools])
+
+    async def execute_tools(messages, config):
+        # Cached tool results of the session are dropped around rounds that may change state
+        tool_calls = messages[-1].tool_calls
+        invalidate_for_calls(tool_calls)
+        result = await tool_node.ainvoke({"messages": messages}, config)
+        invalidate_for_calls(tool_calls)
+        return result
+
+    async def run_tools(state: AgentState, config):
+        result = await execute_tools(state["messages"], config)
+        return {**result, "tool_rounds": state.get("tool_rounds", 0) + 1}
+
+    # --- Plan-and-execute mode ---
+
+    def start_router(state: AgentState):
+        return "planner" if state.get("plan_mode") else "chat"
+
+    async def planner(state: AgentState):
+        """Split the request into a dependency DAG of sub-tasks."""
+        request = str(state["messages"][-1].content).split("User request:", 1)[-1].strip()
+        prompt = PLANNER_PROMPT.format(max_subtasks=MAX_SUBTASKS, request=request)
+        response = await call_llm(llm, [HumanMessage(content=prompt)], "planner")
+        with span("plan.parse", "plan") as attrs:
+            plan = parse_plan(response.content)
+            attrs.update(subtasks=len(plan or []), plan=plan)
+        return {
+            # A single step gains nothing from planning; it goes through the normal chat loop
+            "plan": plan if plan and len(plan) > 1 else None,
+            "tokens_used": state.get("tokens_used", 0) + (usage_metadata_tokens(response) or 0),
+        }
+
+    def plan_router(state: AgentState):
+        plan = state.get("plan")
+        if not plan:
+            return "chat"
+        results = state.get("subtask_results") or {}
+        if len(results) >= len(plan) or exceeded_budget(state):
+            return "synthesize"
+        # Fan the sub-tasks whose dependencies are done out in parallel
+        wave = max((r["wave"] for r in results.values()), default=0) + 1
+        return [
+            Send("execute_subtask", {
+                "subtask": subtask, "results": results, "wave": wave,
+                "budget": state["budget"], "turn_started_at": state["turn_started_at"],
+                "tool_rounds": state.get("tool_rounds", 0),
+            })
+            for subtask in ready_subtasks(plan, results)
+        ]
+
+    async def execute_subtask(task: dict, config):
+        """Mini chat/tool loop for one sub-task, isolated from the main conversation."""
+        subtask = task["subtask"]
+        context = dependency_context(subtask, task["results"])
+        messages = [HumanMessage(content=f"{SYSTEM_PROMPT}\n\n{SUBTASK_PREAMBLE}\n\n{context}\n\nUser request: {subtask['task']}")]
+        tokens = rounds = 0
+        max_rounds = min(SUBTASK_MAX_ROUNDS, task["budget"]["max_tool_rounds"])
+        # The sub-task has not seen the files the chat read, so its reads are tracked on their own
+        read_scope = f"{current_run_id.get()}/{subtask['id']}"
+        scope_token = current_read_scope.set(read_scope)
+        try:
+            while True:
+                out_of_budget = rounds >= max_rounds or exceeded_budget({
+                    "budget": task["budget"], "turn_started_at": task["turn_started_at"],
+                    "tool_rounds": task["tool_rounds"] + rounds,
+                })
+                model = llm if out_of_budget else get_llm_with_tools(messages)
+                response = await call_llm(model, messages, f"subtask:{subtask['id']}")
+                tokens += usage_metadata_tokens(response) or 0
+                messages.append(response)
+                if out_of_budget or not response.tool_calls:
+                    break
+                result = await execute_tools(messages, config)
+                messages.extend(result["messages"])
+                rounds += 1
+        finally:
+            current_read_scope.reset(scope_token)
+            read_tracker.forget(read_scope)
+        return {"subtask_results": {subtask["id"]: {
+            "task": subtask["task"], "result": str(response.content),
+            "tokens": tokens, "tool_rounds": rounds, "wave": task["wave"],
+        }}}
+
+    async def schedule(state: AgentState):
+        """Join point after each wave of sub-tasks: update the budget counters."""
+        results = state.get("subtask_results") or {}
+        wave = max((r["wave"] for r in results.values()), default=0)
+        return {
+            "tool_rounds": sum(r["tool_rounds"] for r in results.values()),
+            "tokens_used": state.get("tokens_used", 0) + sum(r["tokens"] for r in results.values() if r["wave"] == wave),
+        }
+
+    async def synthesize(state: AgentState):
+        """Final answer from the joined sub-task results."""
+        plan = state["plan"]
+        results = state.get("subtask_results") or {}
+        reason = exceeded_budget(state) if len(results) < len(plan) else None
+        if reason:
+            await record_overrun(current_run_id.get(), current_session_id.get(), reason, state)
+        instruction = HumanMessage(content=SYNTHESIZE_INSTRUCTION.format(results=format_results(plan, results)))
+        response = format_response(await call_llm(llm, list(state["messages"]) + [instruction], "synthesize"))
+        return {
+            "messages": [response],
+            "tokens_used": state.get("tokens_used", 0) + (usage_metadata_tokens(response) or 0),
+            "budget_exceeded": reason,
+        }
 
     graph.add_node("chat", agentDChat)
-    graph.add_node("tool_node", tool_node)
+    graph.add_node("tool_node", run_tools)
+    graph.add_node("finalize", finalize)
+    graph.add_node("planner", planner)
+    graph.add_node("execute_subtask", execute_subtask)
+    graph.add_node("schedule", schedule)
+    graph.add_node("synthesize", synthesize)
 
     graph.add_conditional_edges(
         "chat",
         tools_router,
         {
             "tool_node": "tool_node",
+            "finalize": "finalize",
             END: END
         }
     )
@@ -194,49 +349,208 @@ async def initialize_agent():
         tools_router,
         {
             "chat": "chat",
+            "finalize": "finalize",
             END: END
         }
     )
+    graph.add_edge("finalize", END)
+
+    graph.add_conditional_edges("planner", plan_router, ["chat", "synthesize", "execute_subtask"])
+    graph.add_edge("execute_subtask", "schedule")
+    graph.add_conditional_edges("schedule", plan_router, ["chat", "synthesize", "execute_subtask"])
+    graph.add_edge("synthesize", END)
+
+    graph.set_conditional_entry_point(start_router, ["planner", "chat"])
+    return graph.compile(checkpointer=memory)
+
+def _add_mcp_tools(new_tools: list):
+    """Hot-add tools from a freshly connected MCP server by recompiling the graph.
+    Runs already in flight keep the graph they started with."""
+    global _agent, mcp_active, _toolset_fingerprint
+    for tool in new_tools:
+        if tool not in zapier_tools_list:
+            zapier_tools_list.append(tool)
+    mcp_active = len(zapier_tools_list) > 0
+    all_tools = get_builtin_tools() + zapier_tools_list
+    _agent = build_agent(_llm, all_tools, _memory)
+    _toolset_fingerprint = toolset_fingerprint(all_tools)
+    print(f"Agent updated with {len(new_tools)} MCP tools ({len(zapier_tools_list)} total).")
+
+async def initialize_agent():
+    """Initialize the LangGraph agent with necessary tools and configuration.
+
+    The agent is compiled with the built-in tools right away; MCP servers are connected
+    in a background task and their tools are added as each server becomes ready.
+    """
+    global _agent, _llm, _memory, _mcp_task, _toolset_fingerprint
+    
+    if _agent is not None:
+        return _agent
+
+    # Workers share the checkpoint database; wait for their write locks instead of failing
+    sqlite_conn = await aiosqlite.connect(DB_PATH, timeout=BUSY_TIMEOUT_SECONDS, check_same_thread=False)
+    _memory = TracedAsyncSqliteSaver(sqlite_conn)
+
+    # Shared Gemini chat model (raises if GOOGLE_API_KEY is not set)
+    _llm = get_chat_llm()
+    # _llm = ChatGroq(model="openai/gpt-oss-20b")
+
+    all_tools = get_builtin_tools() + zapier_tools_list
+    _agent = build_agent(_llm, all_tools, _memory)
+    _toolset_fingerprint = toolset_fingerprint(all_tools)
 
-    graph.set_entry_point("chat")
-    _agent = graph.compile(checkpointer=memory)
+    # Connect MCP servers without blocking startup (no tools are added if MCP is not available)
+    if _mcp_task is None:
+        _mcp_task = asyncio.create_task(connect_mcp_servers(on_tools_ready=_add_mcp_tools))
     
     return _agent
 
-async def invoke_agent(message: str, config: dict):
-    """Invoke the agent with a message and yield progress and response."""
+async def _record_cached_turn(config: dict, message: str, content: str):
+    """Append a cached exchange to the thread's checkpoint so later turns still see it."""
+    thread_id = config.get("configurable", {}).get("thread_id")
+    async with session_lock(thread_id):
+        await _agent.aupdate_state(config, {"messages": [
+            HumanMessage(content=f"{SYSTEM_PROMPT}\n\nUser request: {message}"),
+            AIMessage(content=content),
+        ]}, as_node="chat")
+
+async def _forward_events(task: asyncio.Task, queue: asyncio.Queue):
+    """Yield events queued by tools until `task` is done; cancels the task if the stream is closed early."""
+    try:
+        while not task.done():
+            getter = asyncio.ensure_future(queue.get())
+            await asyncio.wait({task, getter}, return_when=asyncio.FIRST_COMPLETED)
+            if getter.done():
+                yield getter.result()
+            else:
+                getter.cancel()
+        await asyncio.sleep(0)  # let events scheduled from tool threads land in the queue
+        while not queue.empty():
+            yield queue.get_nowait()
+    finally:
+        if not task.done():
+            task.cancel()
+
+async def invoke_agent(message: str, config: dict, use_cache: bool = None, budget: dict = None, plan: bool = None):
+    """Invoke the agent with a message and yield progress and response.
+
+    With the response cache enabled (AGENTD_RESPONSE_CACHE or `use_cache`), answers of
+    read-only turns are reused for identical prompts, and identical prompts arriving
+    while such a turn is running wait for it instead of starting their own.
+
+    `budget` overrides the default max_tool_rounds / max_wall_seconds / max_tokens of the turn.
+    `plan` (default AGENTD_PLANNER) runs the turn in plan-and-execute mode.
+    """
     global _agent
     
     if _agent is None:
         _agent = await initialize_agent()
+    if use_cache is None:
+        use_cache = RESPONSE_CACHE_ENABLED
+    if plan is None:
+        plan = PLANNER_ENABLED
 
-    # Generate progress steps
-    from .progress_gemini import generate_progress_steps
-    progress_steps = generate_progress_steps(message, max_steps=6, mcp_active=mcp_active)
-    
-    # Yield progress steps
-    for i, step in enumerate(progress_steps, 1):
-        yield {"type": "progress", "step": i, "total": len(progress_steps), "message": step}
-        await asyncio.sleep(0.5)  # Small delay for real-time feel
+    thread_id = config.get("configurable", {}).get("thread_id")
+    current_session_id.set(thread_id)
+    run_id = start_run(thread_id)
+    yield {"type": "run", "run_id": run_id}
+    status = "error"
+    key = cache_key(message, _toolset_fingerprint, thread_id) if use_cache else None
+    flight = None
+    cached = None
 
-    initial_message_content = f"{SYSTEM_PROMPT}\n\nUser request: {message}"
-    
-    result = await _agent.ainvoke({
-        "messages": [HumanMessage(content=initial_message_content)],
-    }, config=config)
-    print(result["messages"][-1])
-    
-    # Yield final result
-    final_message = result["messages"][-1]
-    response_content = ""
-    if isinstance(final_message, AIMessage):
-        response_content = final_message.content if hasattr(final_message, "content") else str(final_message)
-    elif isinstance(final_message, ToolMessage):
-        response_content = f"Agent executed tool. Output: {final_message.content if hasattr(final_message, 'content') else str(final_message)}"
-    else:
-        response_content = str(final_message)
+    try:
+        if key is not None:
+            with span("response_cache.lookup", "cache") as attrs:
+                cached = response_cache.get(key)
+                if cached is None:
+                    flight, leader = response_cache.begin(key)
+                    if not leader:
+                        # Identical request in flight: share its answer (None if it was not cacheable)
+                        cached = await asyncio.shield(flight)
+                        flight = None
+                attrs["result"] = "hit" if cached is not None else "miss"
+
+        if cached is not None:
+            with span("response_cache.record", "db"):
+                await _record_cached_turn(config, message, cached["content"])
+            response_content = cached["content"]
+        else:
+            # Generate progress steps
+            from .progress_gemini import agenerate_progress_steps
+            with span("generate_progress_steps", "llm"):
+                progress_steps = await agenerate_progress_steps(message, max_steps=6, mcp_active=mcp_active)
+            
+            # Yield progress steps
+            for i, step in enumerate(progress_steps, 1):
+                yield {"type": "progress", "step": i, "total": len(progress_steps), "message": step}
+                await asyncio.sleep(PROGRESS_STEP_DELAY)  # Small delay for real-time feel
+
+            initial_message_content = f"{SYSTEM_PROMPT}\n\nUser request: {message}"
+            loop = asyncio.get_running_loop()
+            events = asyncio.Queue()
+            current_event_sink.set(lambda event: loop.call_soon_threadsafe(events.put_nowait, event))
+            turn_budget = initial_budget_state(budget)
+            run_config = {**config, "callbacks": [TraceCallbackHandler(run_id)],
+                          "recursion_limit": recursion_limit(turn_budget["budget"], bool(plan))}
+            
+            with span("agent.invoke", "run") as attrs:
+                # Turns of one thread must not interleave, even when they land on different workers
+                lock_started = time.perf_counter()
+                async with session_lock(thread_id):
+                    attrs["lock_wait_ms"] = round((time.perf_counter() - lock_started) * 1000, 3)
+                    turn_budget["turn_started_at"] = time.time()  # waiting for the lock is not charged
+                    agent = _agent
+                    agent_task = asyncio.create_task(agent.ainvoke({
+                        "messages": [HumanMessage(content=initial_message_content)],
+                        **turn_budget,
+                        "plan_mode": bool(plan),
+                        "plan": None,
+                        "subtask_results": None,
+                    }, config=run_config))
+                    # Stream tool events (e.g. command output) while the graph runs
+                    async for event in _forward_events(agent_task, events):
+                        yield event
+                    result = agent_task.result()
+            print(result["messages"][-1])
+            
+            # Yield final result
+            final_message = result["messages"][-1]
+            response_content = ""
+            if isinstance(final_message, AIMessage):
+                response_content = final_message.content if hasattr(final_message, "content") else str(final_message)
+            elif isinstance(final_message, ToolMessage):
+                response_content = f"Agent executed tool. Output: {final_message.content if hasattr(final_message, 'content') else str(final_message)}"
+            else:
+                response_content = str(final_message)
+
+            if flight is not None:
+                cacheable = not result.get("budget_exceeded") and is_cacheable_turn(result["messages"])
+                response_cache.end(key, {"content": response_content} if cacheable else None)
+                flight = None
+        status = "ok"
+    finally:
+        if flight is not None:
+            response_cache.end(key, None)
+        await finish_run(run_id, status)
     
-    yield {"type": "response", "content": response_content}
+    event = {"type": "response", "content": response_content, "run_id": run_id}
+    if cached is not None:
+        event["cached"] = True
+    yield event
+
+async def shutdown_agent():
+    """Stop MCP initialization and close the checkpoint database connection."""
+    global _agent, _memory, _mcp_task
+    if _mcp_task is not None and not _mcp_task.done():
+        _mcp_task.cancel()
+    _mcp_task = None
+    if _memory is not None:
+        await _memory.conn.close()
+    _agent = None
+    _memory = None
+    await shell_pool.close_all()
+    await close_clients()
 
 async def summarize_chat_history(messages: list) -> str:
     """Summarize the chat history."""
@@ -1,8 +1,24 @@
-from typing import List,TypedDict,Annotated
+from typing import List,TypedDict,Annotated,Optional
 from langgraph.graph import add_messages
 
+def merge_subtask_results(left: Optional[dict], right: Optional[dict]) -> dict:
+    """Merge results of sub-tasks finished in parallel; None resets them for a new turn."""
+    if right is None:
+        return {}
+    return {**(left or {}), **right}
+
 class AgentState(TypedDict):
     messages: Annotated[list, add_messages]
+    # Per-turn budget bookkeeping, reset by invoke_agent at the start of every turn
+    budget: dict
+    tool_rounds: int
+    tokens_used: int
+    turn_started_at: float
+    budget_exceeded: Optional[str]
+    # Plan-and-execute mode: dependency DAG of sub-tasks and their results
+    plan_mode: bool
+    plan: Optional[list]
+    subtask_results: Annotated[dict, merge_subtask_results]
 
 
 
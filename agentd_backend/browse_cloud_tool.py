@@ -1,80 +1,156 @@
+# browse_cloud_tool.py
+"""
+Web browsing through the BrowserUse cloud service.
+
+A browsing task runs remotely for seconds to minutes. The tool submits it, then polls it
+on the shared async HTTP client with a growing interval until it finishes or the
+deadline passes, streaming each new browser step to the UI as a `tool_output` event.
+If the agent turn is cancelled or the deadline passes, the remote task is stopped too.
+"""
+import asyncio
 import os
 import time
-import asyncio
+from typing import Any, Callable, Dict, Optional
+
 from dotenv import load_dotenv
-from browser_use_sdk import BrowserUse
-from .progress_gemini import generate_progress_steps
-from langchain.tools import tool
+from langchain_core.tools import tool
+
+from .clients import get_async_browser_use_client
+from .run_context import emit_event
 
 load_dotenv()
 
+# Seconds a browsing task may run before it is stopped
+BROWSE_TIMEOUT = float(os.getenv("AGENTD_BROWSE_TIMEOUT", "600"))
+# Polling starts at the first interval and grows by BROWSE_POLL_BACKOFF up to the max;
+# it drops back to the first interval whenever the task makes progress
+BROWSE_POLL_INTERVAL = float(os.getenv("AGENTD_BROWSE_POLL_INTERVAL", "1"))
+BROWSE_POLL_MAX_INTERVAL = float(os.getenv("AGENTD_BROWSE_POLL_MAX_INTERVAL", "5"))
+BROWSE_POLL_BACKOFF = 1.5
+# Consecutive failed polls after which the task is given up
+BROWSE_MAX_POLL_ERRORS = 5
+
+_DONE_STATUSES = ("finished", "stopped")
+# Stop requests for cancelled tasks, kept referenced until they complete
+_pending_stops = set()
+
+
+class BrowseTimeout(Exception):
+    pass
+
+
+def _describe_step(step) -> str:
+    goal = step.next_goal or step.evaluation_previous_goal or ", ".join(step.actions)
+    return f"[step {step.number}] {goal} ({step.url})" if step.url else f"[step {step.number}] {goal}"
+
+
+async def _stop_task(client, task_id: str):
+    try:
+        await client.tasks.update_task(task_id, action="stop")
+        print(f"[Browse] Stopped task {task_id}")
+    except Exception as e:
+        print(f"[Browse] Could not stop task {task_id}: {e}")
+
+
+def _stop_in_background(client, task_id: str):
+    """Stop the remote task without delaying the cancellation that caused it."""
+    stop = asyncio.create_task(_stop_task(client, task_id))
+    _pending_stops.add(stop)
+    stop.add_done_callback(_pending_stops.discard)
+
+
+async def run_browse_task(query: str, on_step: Optional[Callable[[str], None]] = None,
+                          timeout: float = BROWSE_TIMEOUT) -> Dict[str, Any]:
+    """
+    Run one browsing task to completion; returns its id, status, output and step count.
+    `on_step` is called with a one-line description of each new browser step. Raises
+    BrowseTimeout after `timeout` seconds, and stops the remote task in both that case
+    and on cancellation.
+    """
+    client = get_async_browser_use_client()
+    created = await client.tasks.create_task(task=query, llm="browser-use-llm")
+    task_id = created.id
+    deadline = time.monotonic() + timeout
+    interval = BROWSE_POLL_INTERVAL
+    seen_steps = errors = 0
+    try:
+        while True:
+            try:
+                # A hanging request must not outlast the deadline
+                view = await asyncio.wait_for(client.tasks.get_task(task_id), max(1.0, deadline - time.monotonic()))
+                errors = 0
+            except Exception as e:
+                errors += 1
+                if errors >= BROWSE_MAX_POLL_ERRORS:
+                    raise
+                print(f"[Browse] Polling task {task_id} failed ({e}), retrying")
+                view = None
+            if view is not None:
+                for step in view.steps[seen_steps:]:
+                    if on_step is not None:
+                        on_step(_describe_step(step))
+                if len(view.steps) > seen_steps:
+                    seen_steps = len(view.steps)
+                    interval = BROWSE_POLL_INTERVAL
+                if view.status in _DONE_STATUSES:
+                    return {"task_id": task_id, "status": view.status, "output": view.output or "",
+                            "is_success": view.is_success, "steps": seen_steps}
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise BrowseTimeout(f"Browsing task did not finish within {timeout:g} seconds ({seen_steps} steps done).")
+            await asyncio.sleep(min(interval, remaining))
+            interval = min(interval * BROWSE_POLL_BACKOFF, BROWSE_POLL_MAX_INTERVAL)
+    except asyncio.CancelledError:
+        _stop_in_background(client, task_id)
+        raise
+    except Exception:
+        await _stop_task(client, task_id)
+        raise
+
+
 @tool
 async def browse_web_cloud(query: str):
     """
     Browse the web using BrowserUse cloud service to find information based on the query.
-    
+
     Args:
         query (str): The search query or task to perform on the web.
-    
+
     Returns:
         dict: A dictionary containing the status and output of the browsing task.
     """
+    def on_step(line: str):
+        emit_event({"type": "tool_output", "tool": "browse_web_cloud", "stream": "step", "line": line})
+
     try:
-        # Generate Gemini-based progress steps (optional, for logging)
-        steps = generate_progress_steps(query)
-        
-        # Run Browser Use cloud task
-        client = BrowserUse(
-            api_key=os.getenv("BROWSER_USE_API_KEY")
-        )
-        
-        task = client.tasks.create_task(
-            task=query,
-            llm="browser-use-llm"
-        )
-        
-        result = task.complete()
-        
-        return {
-            'status': 'success',
-            'output': result.output,
-            'message': 'Web browsing task completed successfully.'
-        }
-        
+        result = await run_browse_task(query, on_step)
+    except BrowseTimeout as e:
+        return {'status': 'error', 'output': '', 'message': str(e)}
     except Exception as e:
         return {
             'status': 'error',
             'output': '',
             'message': f'Error during web browsing: {str(e)}'
         }
+    if result['status'] != 'finished':
+        return {'status': 'error', 'output': result['output'],
+                'message': f"Web browsing task was {result['status']} after {result['steps']} steps."}
+    return {
+        'status': 'success',
+        'output': result['output'],
+        'message': f"Web browsing task completed successfully in {result['steps']} steps."
+    }
 
 PROMPT = """
 Find the best restaurants in New York City and list their names and addresses.
 """
 
 async def main():
-    # 1. Generate Gemini-based progress steps
-    steps = generate_progress_steps(PROMPT)
-
-    print("\n🔵 LIVE PROGRESS (Gemini):\n")
-    for i, step in enumerate(steps, 1):
-        print(f"[{i}/{len(steps)}] {step}")
-        time.sleep(1)
-
-    # 2. Run Browser Use cloud task
-    client = BrowserUse(
-        api_key=os.getenv("BROWSER_USE_API_KEY")
-    )
-
-    task = client.tasks.create_task(
-        task=PROMPT,
-        llm="browser-use-llm"
-    )
-
-    result = task.complete()
+    print("\n🔵 LIVE PROGRESS:\n")
+    result = await run_browse_task(PROMPT, print)
 
     print("\n✅ FINAL OUTPUT:\n")
-    print(result.output)
+    print(result["output"])
 
 if __name__ == "__main__":
     asyncio.run(main())
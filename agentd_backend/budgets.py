@@ -0,0 +1,129 @@
+# budgets.py
+import asyncio
+import os
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from .db import connect
+from .planner import MAX_SUBTASKS
+
+# Defaults for every turn; a request can lower or raise them with a "budget" object
+DEFAULT_BUDGET = {
+    "max_tool_rounds": int(os.getenv("AGENTD_MAX_TOOL_ROUNDS", "15")),
+    "max_wall_seconds": float(os.getenv("AGENTD_MAX_WALL_SECONDS", "300")),
+    "max_tokens": int(os.getenv("AGENTD_MAX_TOKENS", "300000")),
+}
+
+# Accepted range of each budget a request sets; values outside it are clamped
+BUDGET_RANGES = {
+    "max_tool_rounds": (1, 100),
+    "max_wall_seconds": (1.0, 3600.0),
+    "max_tokens": (1000, 2_000_000),
+}
+
+FINALIZE_INSTRUCTION = (
+    "The budget for this request has been reached ({reason}). Do not call any tools. "
+    "Using only the information gathered so far, give the user the best possible final answer "
+    "and briefly say what is still unfinished."
+)
+
+REASON_TEXT = {
+    "tool_rounds": "maximum number of tool rounds",
+    "wall_time": "maximum time",
+    "tokens": "maximum number of tokens",
+}
+
+
+def make_budget(overrides: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Default budget with the known keys of `overrides` applied, each clamped to BUDGET_RANGES.
+
+    Raises:
+        ValueError: If `overrides` is not an object or one of its known keys is not a number.
+    """
+    if overrides is not None and not isinstance(overrides, dict):
+        raise ValueError("budget must be an object")
+    budget = dict(DEFAULT_BUDGET)
+    for key, value in (overrides or {}).items():
+        if key not in budget or value is None:
+            continue
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise ValueError(f"budget.{key} must be a number")
+        low, high = BUDGET_RANGES[key]
+        budget[key] = type(DEFAULT_BUDGET[key])(min(max(value, low), high))
+    return budget
+
+
+def initial_budget_state(overrides: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """State fields that start a new turn's budget accounting."""
+    return {
+        "budget": make_budget(overrides),
+        "tool_rounds": 0,
+        "tokens_used": 0,
+        "turn_started_at": time.time(),
+        "budget_exceeded": None,
+    }
+
+
+def exceeded_budget(state: Dict[str, Any]) -> Optional[str]:
+    """Name of the first exhausted budget ("tool_rounds", "wall_time" or "tokens"), or None."""
+    budget = state.get("budget") or DEFAULT_BUDGET
+    if state.get("tool_rounds", 0) >= budget["max_tool_rounds"]:
+        return "tool_rounds"
+    started = state.get("turn_started_at")
+    if started is not None and time.time() - started >= budget["max_wall_seconds"]:
+        return "wall_time"
+    if state.get("tokens_used", 0) >= budget["max_tokens"]:
+        return "tokens"
+    return None
+
+
+def recursion_limit(budget: Dict[str, Any], plan_mode: bool = False) -> int:
+    """
+    Graph step limit that leaves room for every allowed tool round plus the final answer. In
+    plan mode it also covers the planner, an execute/schedule pair per wave of sub-tasks
+    (at most one wave per sub-task) and the synthesis.
+    """
+    limit = 2 * budget["max_tool_rounds"] + 5
+    if plan_mode:
+        limit += 2 + 2 * MAX_SUBTASKS
+    return limit
+
+
+def _save_overrun(row: tuple):
+    conn = connect()
+    try:
+        with conn:
+            conn.execute(
+                "INSERT INTO budget_overruns (run_id, session_id, reason, tool_rounds, tokens_used, elapsed_ms, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                row,
+            )
+    finally:
+        conn.close()
+
+
+async def record_overrun(run_id: Optional[str], session_id: Optional[str], reason: str, state: Dict[str, Any]):
+    """Persist a budget overrun (off the event loop); failures are only logged."""
+    started = state.get("turn_started_at") or time.time()
+    row = (run_id, session_id, reason, state.get("tool_rounds", 0), state.get("tokens_used", 0),
+           round((time.time() - started) * 1000, 3), datetime.utcnow().isoformat())
+    print(f"[Budget] Run {run_id} of session {session_id} exceeded its {reason} budget")
+    try:
+        await asyncio.to_thread(_save_overrun, row)
+    except Exception as e:
+        print(f"[Budget] Error saving overrun: {e}")
+
+
+def get_overruns(limit: int = 50) -> List[Dict[str, Any]]:
+    conn = connect()
+    try:
+        rows = conn.execute(
+            "SELECT run_id, session_id, reason, tool_rounds, tokens_used, elapsed_ms, created_at "
+            "FROM budget_overruns ORDER BY id DESC LIMIT ?", (limit,)
+        ).fetchall()
+    finally:
+        conn.close()
+    keys = ("run_id", "session_id", "reason", "tool_rounds", "tokens_used", "elapsed_ms", "created_at")
+    return [dict(zip(keys, row)) for row in rows]
@@ -0,0 +1,201 @@
+# clients.py
+"""
+Registry of long-lived API clients shared by the agent, progress and browse paths.
+
+All HTTP traffic of the Gemini SDK (progress steps) and the BrowserUse SDK goes through
+one pooled httpx.Client / httpx.AsyncClient pair with keep-alive and, when the `h2`
+package is installed, HTTP/2. The LangChain chat model talks gRPC, whose channel is
+already multiplexed over HTTP/2, so it is simply created once and reused.
+"""
+import importlib.util
+import os
+import threading
+from typing import Any, Dict, Optional
+
+import httpx
+
+HTTP2_ENABLED = importlib.util.find_spec("h2") is not None
+
+POOL_LIMITS = httpx.Limits(
+    max_connections=int(os.getenv("AGENTD_HTTP_MAX_CONNECTIONS", "100")),
+    max_keepalive_connections=int(os.getenv("AGENTD_HTTP_MAX_KEEPALIVE", "20")),
+    keepalive_expiry=float(os.getenv("AGENTD_HTTP_KEEPALIVE_EXPIRY", "60")),
+)
+TIMEOUT = httpx.Timeout(120.0, connect=10.0)
+# BrowserUse API root; point it at a stand-in server (benchmarks/browser_use_stub.py) for offline runs
+BROWSER_USE_BASE_URL = os.getenv("BROWSER_USE_BASE_URL") or None
+
+_lock = threading.RLock()
+_http_client: Optional[httpx.Client] = None
+_async_http_client: Optional[httpx.AsyncClient] = None
+_genai_client = None
+_chat_llm = None
+_browser_use_client = None
+_async_browser_use_client = None
+
+
+class ConnectionStats:
+    """
+    Counts requests and newly opened connections using httpcore's `trace` request
+    extension, so connection reuse can be reported as requests minus new connections.
+    """
+
+    def __init__(self):
+        self.requests = 0
+        self.new_connections = 0
+        self.tls_handshakes = 0
+        self.http_versions: Dict[str, int] = {}
+
+    def _record(self, event: str):
+        if event == "connection.connect_tcp.complete":
+            self.new_connections += 1
+        elif event == "connection.start_tls.complete":
+            self.tls_handshakes += 1
+
+    def trace(self, event: str, info: Dict[str, Any]):
+        self._record(event)
+
+    async def atrace(self, event: str, info: Dict[str, Any]):
+        self._record(event)
+
+    def on_request(self, request: httpx.Request):
+        self.requests += 1
+        request.extensions["trace"] = self.trace
+
+    async def aon_request(self, request: httpx.Request):
+        self.requests += 1
+        request.extensions["trace"] = self.atrace
+
+    def on_response(self, response: httpx.Response):
+        self.http_versions[response.http_version] = self.http_versions.get(response.http_version, 0) + 1
+
+    async def aon_response(self, response: httpx.Response):
+        self.on_response(response)
+
+    def snapshot(self) -> Dict[str, Any]:
+        reused = max(0, self.requests - self.new_connections)
+        return {
+            "requests": self.requests,
+            "new_connections": self.new_connections,
+            "reused_connections": reused,
+            "reuse_ratio": round(reused / self.requests, 3) if self.requests else None,
+            "tls_handshakes": self.tls_handshakes,
+            "http_versions": dict(self.http_versions),
+        }
+
+
+_sync_stats = ConnectionStats()
+_async_stats = ConnectionStats()
+
+
+def get_http_client() -> httpx.Client:
+    """Shared synchronous HTTP client (keep-alive pool, HTTP/2 when available)."""
+    global _http_client
+    with _lock:
+        if _http_client is None:
+            _http_client = httpx.Client(
+                http2=HTTP2_ENABLED, limits=POOL_LIMITS, timeout=TIMEOUT, follow_redirects=True,
+                event_hooks={"request": [_sync_stats.on_request], "response": [_sync_stats.on_response]},
+            )
+        return _http_client
+
+
+def get_async_http_client() -> httpx.AsyncClient:
+    """Shared asynchronous HTTP client (keep-alive pool, HTTP/2 when available)."""
+    global _async_http_client
+    with _lock:
+        if _async_http_client is None:
+            _async_http_client = httpx.AsyncClient(
+                http2=HTTP2_ENABLED, limits=POOL_LIMITS, timeout=TIMEOUT, follow_redirects=True,
+                event_hooks={"request": [_async_stats.aon_request], "response": [_async_stats.aon_response]},
+            )
+        return _async_http_client
+
+
+def get_genai_client():
+    """Shared google-genai client, routed through the pooled httpx clients."""
+    global _genai_client
+    if _genai_client is None:
+        from google import genai
+        from google.genai import types
+        try:
+            http_options = types.HttpOptions(
+                httpx_client=get_http_client(), httpx_async_client=get_async_http_client()
+            )
+        except Exception:
+            # Older google-genai releases cannot take an external httpx client
+            http_options = None
+        with _lock:
+            if _genai_client is None:
+                _genai_client = genai.Client(http_options=http_options)
+    return _genai_client
+
+
+def get_chat_llm():
+    """Shared LangChain Gemini chat model used by the agent graph."""
+    global _chat_llm
+    if _chat_llm is None:
+        # Get Google API key from environment variable
+        google_api_key = os.getenv("GOOGLE_API_KEY")
+        if not google_api_key:
+            raise RuntimeError("GOOGLE_API_KEY environment variable not set. Please set it to your Google Generative AI API key.")
+        from langchain_google_genai import ChatGoogleGenerativeAI
+        with _lock:
+            if _chat_llm is None:
+                _chat_llm = ChatGoogleGenerativeAI(model="gemini-2.5-flash", api_key=google_api_key)
+    return _chat_llm
+
+
+def get_browser_use_client():
+    """Shared BrowserUse cloud client, reusing the pooled HTTP connections."""
+    global _browser_use_client
+    if _browser_use_client is None:
+        from browser_use_sdk import BrowserUse
+        with _lock:
+            if _browser_use_client is None:
+                _browser_use_client = BrowserUse(
+                    api_key=os.getenv("BROWSER_USE_API_KEY"),
+                    base_url=BROWSER_USE_BASE_URL,
+                    httpx_client=get_http_client(),
+                )
+    return _browser_use_client
+
+
+def get_async_browser_use_client():
+    """Shared asynchronous BrowserUse cloud client on the pooled async HTTP connections."""
+    global _async_browser_use_client
+    if _async_browser_use_client is None:
+        from browser_use_sdk import AsyncBrowserUse
+        with _lock:
+            if _async_browser_use_client is None:
+                _async_browser_use_client = AsyncBrowserUse(
+                    api_key=os.getenv("BROWSER_USE_API_KEY"),
+                    base_url=BROWSER_USE_BASE_URL,
+                    httpx_client=get_async_http_client(),
+                )
+    return _async_browser_use_client
+
+
+def get_client_metrics() -> Dict[str, Any]:
+    """Connection reuse counters of the shared HTTP pools."""
+    return {
+        "http2_enabled": HTTP2_ENABLED,
+        "sync_pool": _sync_stats.snapshot(),
+        "async_pool": _async_stats.snapshot(),
+        "clients": {
+            "genai": _genai_client is not None,
+            "chat_llm": _chat_llm is not None,
+            "browser_use": _browser_use_client is not None,
+            "browser_use_async": _async_browser_use_client is not None,
+        },
+    }
+
+
+async def close_clients():
+    """Close the shared HTTP pools (called on application shutdown)."""
+    global _http_client, _async_http_client, _genai_client, _browser_use_client, _async_browser_use_client
+    if _async_http_client is not None:
+        await _async_http_client.aclose()
+    if _http_client is not None:
+        _http_client.close()
+    _http_client = _async_http_client = _genai_client = _browser_use_client = _async_browser_use_client = None
@@ -0,0 +1,145 @@
+# db.py
+import sqlite3
+from typing import List, Sequence, Tuple
+
+DB_PATH = "memory.sqlite"
+
+# How long a connection waits for another process' write lock before failing.
+# Several uvicorn workers share the same database files.
+BUSY_TIMEOUT_SECONDS = 30.0
+
+# Each migration is (version, [statements]). Append new entries with a higher version
+# number instead of editing existing ones; init_db only runs the ones not yet applied.
+MIGRATIONS: List[Tuple[int, List[str]]] = [
+    (1, [
+        """
+        CREATE TABLE IF NOT EXISTS chat_sessions (
+            id TEXT PRIMARY KEY,
+            title TEXT NOT NULL,
+            created_at TEXT NOT NULL,
+            updated_at TEXT NOT NULL
+        )""",
+        """
+        CREATE TABLE IF NOT EXISTS chat_messages (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            session_id TEXT NOT NULL,
+            role TEXT NOT NULL,
+            content TEXT NOT NULL,
+            timestamp TEXT NOT NULL,
+            FOREIGN KEY(session_id) REFERENCES chat_sessions(id) ON DELETE CASCADE
+        )""",
+        """
+        CREATE TABLE IF NOT EXISTS agent_tasks (
+            id TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            description TEXT,
+            task TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            last_result TEXT
+        )""",
+    ]),
+    (2, [
+        """
+        CREATE TABLE IF NOT EXISTS trace_runs (
+            run_id TEXT PRIMARY KEY,
+            session_id TEXT,
+            started_at TEXT NOT NULL,
+            duration_ms REAL,
+            status TEXT
+        )""",
+        """
+        CREATE TABLE IF NOT EXISTS trace_spans (
+            run_id TEXT NOT NULL,
+            span_id TEXT NOT NULL,
+            parent_id TEXT,
+            name TEXT NOT NULL,
+            kind TEXT NOT NULL,
+            start_ms REAL NOT NULL,
+            duration_ms REAL NOT NULL,
+            attrs TEXT
+        )""",
+        "CREATE INDEX IF NOT EXISTS idx_trace_spans_run ON trace_spans(run_id)",
+        "CREATE INDEX IF NOT EXISTS idx_trace_runs_session ON trace_runs(session_id, started_at)",
+    ]),
+    (3, [
+        """
+        CREATE TABLE IF NOT EXISTS budget_overruns (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            run_id TEXT,
+            session_id TEXT,
+            reason TEXT NOT NULL,
+            tool_rounds INTEGER NOT NULL,
+            tokens_used INTEGER NOT NULL,
+            elapsed_ms REAL NOT NULL,
+            created_at TEXT NOT NULL
+        )""",
+        "CREATE INDEX IF NOT EXISTS idx_budget_overruns_created ON budget_overruns(created_at)",
+    ]),
+    (4, [
+        """
+        CREATE TABLE IF NOT EXISTS jobs (
+            id TEXT PRIMARY KEY,
+            session_id TEXT,
+            command TEXT NOT NULL,
+            cwd TEXT,
+            pid INTEGER,
+            status TEXT NOT NULL,
+            returncode INTEGER,
+            started_at TEXT NOT NULL,
+            finished_at TEXT
+        )""",
+        "CREATE INDEX IF NOT EXISTS idx_jobs_session ON jobs(session_id, started_at)",
+        "CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status)",
+    ]),
+    (5, [
+        # Old traces are deleted by age
+        "CREATE INDEX IF NOT EXISTS idx_trace_runs_started ON trace_runs(started_at)",
+    ]),
+]
+
+
+def connect(db_path=DB_PATH) -> sqlite3.Connection:
+    """Open a connection that waits for concurrent writers instead of failing with 'database is locked'."""
+    return sqlite3.connect(db_path, timeout=BUSY_TIMEOUT_SECONDS)
+
+
+def ensure_schema(db_path, migrations: Sequence[Tuple[int, List[str]]]) -> int:
+    """
+    Apply the migrations whose version is newer than the database's `user_version`.
+    When the schema is already current this is a single PRAGMA read. The database is
+    switched to WAL mode so readers in other worker processes don't block writers.
+
+    Returns:
+        int: The schema version of the database after the call.
+    """
+    latest = max((version for version, _ in migrations), default=0)
+    conn = connect(db_path)
+    conn.isolation_level = None  # manage the transaction explicitly
+    try:
+        conn.execute("PRAGMA journal_mode=WAL")
+        if conn.execute("PRAGMA user_version").fetchone()[0] >= latest:
+            return latest
+        # Take the write lock before re-reading the version so that concurrently
+        # starting workers apply each migration exactly once.
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            current = conn.execute("PRAGMA user_version").fetchone()[0]
+            for version, statements in migrations:
+                if version <= current:
+                    continue
+                for statement in statements:
+                    conn.execute(statement)
+                conn.execute(f"PRAGMA user_version = {int(version)}")
+                current = version
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return current
+    finally:
+        conn.close()
+
+
+def init_db() -> int:
+    """Create or upgrade the chat/task schema in memory.sqlite."""
+    return ensure_schema(DB_PATH, MIGRATIONS)
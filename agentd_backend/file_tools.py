@@ -1,7 +1,38 @@
 # file_tools.py
-from langchain.tools import tool
+from langchain_core.tools import tool
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+import difflib
+import fnmatch
+import mmap
 import os
-from typing import Literal
+import re
+import shutil
+import threading
+import uuid
+from typing import List, Literal, Optional, Tuple
+
+# Largest part of a file read_file returns at once; bigger files are paged with offset/length or line ranges
+READ_FILE_MAX_BYTES = int(os.getenv("AGENTD_READ_FILE_MAX_BYTES", "65536"))
+# Files at least this large are memory-mapped instead of read into memory
+READ_FILE_MMAP_THRESHOLD = 1024 * 1024
+_SCAN_CHUNK_BYTES = 1024 * 1024
+# (path, mtime_ns, size) -> line count, so paging through a big file counts its lines once
+_line_counts = {}
+# replace_in_file reads this many characters at a time; regex matches must fit in _REGEX_WINDOW
+_REPLACE_CHUNK_CHARS = 1024 * 1024
+_REGEX_WINDOW = 64 * 1024
+_REGEX_CONTEXT = 1024
+
+# Entries list_directory may visit in total to compute directory summaries
+LIST_SUMMARY_MAX_ENTRIES = 200_000
+# Largest number of operations batch_file_operations accepts in one call
+BATCH_MAX_OPERATIONS = 200
+BATCH_WORKERS = 8
+
+
+class _NoMatches(Exception):
+    pass
 
 @tool
 def create_file(path: str, content: str) -> str:
@@ -55,16 +86,108 @@ def write_file(path: str, content: str, mode: Literal['overwrite', 'append'] = '
     except Exception as e:
         return f"Error writing to file {path} in '{mode}' mode: {str(e)}"
 
+def looks_binary(sample: bytes) -> bool:
+    """Heuristic: NUL bytes or mostly non-text bytes in the first block mean binary content."""
+    if not sample:
+        return False
+    if b"\0" in sample:
+        return True
+    try:
+        sample.decode("utf-8")
+        return False
+    except UnicodeDecodeError as e:
+        # A multi-byte character cut off at the end of the sample is still text
+        if e.start >= len(sample) - 3:
+            return False
+    control = sum(1 for b in sample if b < 32 and b not in (9, 10, 12, 13))
+    return control / len(sample) > 0.1
+
+
+class _FileView:
+    """Read-only bytes view of a file: memory-mapped when large, read into memory when small."""
+
+    def __init__(self, path: str, size: int):
+        self._file = open(path, "rb")
+        self._mmap = None
+        try:
+            if size >= READ_FILE_MMAP_THRESHOLD:
+                self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+                self.data = self._mmap
+            else:
+                self.data = self._file.read()
+        except Exception:
+            self._file.close()
+            raise
+
+    def __enter__(self):
+        return self.data
+
+    def __exit__(self, *exc):
+        if self._mmap is not None:
+            self._mmap.close()
+        self._file.close()
+
+
+def _count_lines(data, size: int) -> int:
+    lines = 0
+    for start in range(0, size, _SCAN_CHUNK_BYTES):
+        lines += data[start:start + _SCAN_CHUNK_BYTES].count(b"\n")
+    if size and data[size - 1:size] != b"\n":
+        lines += 1
+    return lines
+
+
+def _line_count(path: str, st: os.stat_result, data) -> int:
+    key = (path, st.st_mtime_ns, st.st_size)
+    count = _line_counts.get(key)
+    if count is None:
+        count = _count_lines(data, st.st_size)
+        _line_counts[key] = count
+        while len(_line_counts) > 64:
+            _line_counts.pop(next(iter(_line_counts)))
+    return count
+
+
+def _line_offset(data, size: int, line: int) -> int:
+    """Byte offset where 1-based `line` starts (size if the file has fewer lines)."""
+    remaining = line - 1
+    pos = 0
+    while remaining > 0 and pos < size:
+        chunk = data[pos:pos + _SCAN_CHUNK_BYTES]
+        newlines = chunk.count(b"\n")
+        if newlines < remaining:
+            remaining -= newlines
+            pos += len(chunk)
+            continue
+        index = -1
+        for _ in range(remaining):
+            index = chunk.find(b"\n", index + 1)
+        return pos + index + 1
+    return min(pos, size)
+
+
 @tool
-def read_file(path: str) -> str:
+def read_file(path: str, offset: int = 0, length: int = 0, start_line: int = 0, end_line: int = 0,
+              changes_only: bool = False, force: bool = False) -> str:
     """
-    Reads the content of a file and returns it as a string.
+    Reads a text file. Small files are returned whole. For large files, or when a range is
+    given, only that part is returned, preceded by a header line with the file size, the
+    line count and where to continue reading. Binary files are not returned.
+    If the same part of the file was already read in this chat and has not changed since,
+    a short "unchanged" note is returned instead of the content.
 
     Args:
         path (str): The full path to the file.
+        offset (int): Byte offset to start reading at (ignored when start_line is set).
+        length (int): Maximum number of bytes to return. 0 uses the default limit.
+        start_line (int): First line to return (1-based). 0 reads by byte offset instead.
+        end_line (int): Last line to return (inclusive). 0 reads as many lines as fit in length.
+        changes_only (bool): If the file changed since you last read it, return only a unified
+                             diff against that version (e.g. to check the result of an edit).
+        force (bool): Return the content even if it is unchanged since the last read.
 
     Returns:
-        str: The content of the file, or an error message if reading fails.
+        str: The content of the file or the requested part of it, or an error message if reading fails.
     """
     try:
         if not os.path.exists(path):
@@ -72,22 +195,177 @@ def read_file(path: str) -> str:
         if not os.path.isfile(path):
             return f"Error reading file {path}: Path is not a file."
 
-        with open(path, 'r', encoding='utf-8') as f:
-            content = f.read()
-        return content
+        st = os.stat(path)
+        size = st.st_size
+        max_bytes = min(length, READ_FILE_MAX_BYTES) if length and length > 0 else READ_FILE_MAX_BYTES
+        ranged = bool(offset or length or start_line or end_line)
+        if size == 0:
+            return "" if not ranged else f"[File: {path} | 0 bytes | 0 lines]\n"
+
+        with _FileView(path, size) as data:
+            if looks_binary(data[:8192]):
+                return (f"[File: {path} | {size} bytes | binary content, not shown. "
+                        f"Use terminal tools such as file, xxd or strings to inspect it.]")
+            if not ranged and size <= max_bytes:
+                return data[:size].decode("utf-8", errors="replace")
+
+            total_lines = _line_count(path, st, data)
+            if start_line > total_lines:
+                return f"[File: {path} | {size} bytes | {total_lines} lines | start_line {start_line} is past the end of the file]"
+            if start_line > 0:
+                begin = _line_offset(data, size, start_line)
+                stop = size if end_line <= 0 else _line_offset(data, size, max(end_line, start_line) + 1)
+            else:
+                begin = min(max(0, offset), size)
+                stop = size
+            stop = min(stop, begin + max_bytes)
+            if stop < size and (start_line > 0 or not ranged):
+                # Don't cut a line in half when paging by lines or reading the default first page
+                last_newline = data.rfind(b"\n", begin, stop)
+                if last_newline >= begin:
+                    stop = last_newline + 1
+            chunk = data[begin:stop]
+
+        header = f"[File: {path} | {size} bytes | {total_lines} lines | showing bytes {begin}-{stop}"
+        if start_line > 0:
+            newlines = chunk.count(b"\n")
+            last_line = start_line + newlines - (1 if chunk.endswith(b"\n") else 0)
+            header += f" (lines {start_line}-{max(last_line, start_line)})"
+        if stop < size:
+            header += f" | more: offset={stop}"
+            if start_line > 0 and newlines:
+                header += f" or start_line={start_line + newlines}"
+        header += "]\n"
+        return header + chunk.decode("utf-8", errors="replace")
     except Exception as e:
         return f"Error reading file {path}: {str(e)}"
 
+@contextmanager
+def _atomic_write(path: str, keep_links: bool = True):
+    """
+    Yields a text file that replaces `path` only when the block completes: the content is
+    written to a temp file in the same directory, flushed to disk and renamed over `path`,
+    so readers and crashes never see a half-written file. The original's permissions are kept.
+    A symlink is written through to the file it points to. A file with several hard links
+    is instead overwritten in place once the content is complete (unless `keep_links` is
+    False), since a rename would detach it from its other names.
+    """
+    path = os.path.realpath(path)
+    directory = os.path.dirname(path)
+    while True:
+        tmp_path = os.path.join(directory, f".{os.path.basename(path)}.{uuid.uuid4().hex[:8]}.tmp")
+        try:
+            # Mode 0o666 lets the kernel apply the umask to new files, as open() would
+            fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, "O_BINARY", 0), 0o666)
+            break
+        except FileExistsError:
+            continue
+    try:
+        with open(fd, "w", encoding="utf-8", newline="") as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        if os.path.exists(path):
+            if keep_links and os.stat(path).st_nlink > 1:
+                shutil.copyfile(tmp_path, path)
+                os.remove(tmp_path)
+                return
+            shutil.copymode(path, tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+class _StreamReplacer:
+    """
+    Replaces a literal string or regex in text that arrives in chunks. Text is held back
+    only as long as a match could still continue into the next chunk: len(old) - 1
+    characters for literals, _REGEX_WINDOW characters for regexes (so a regex match must
+    fit in that window).
+    """
+
+    def __init__(self, old: str, new: str, regex: bool, max_count: int):
+        self.pattern = re.compile(old, re.MULTILINE) if regex else None
+        self.old = old
+        self.new = new
+        self.remaining = max_count if max_count > 0 else None
+        self.count = 0
+        self._buffer = ""
+        self._start = 0  # text before this index was already emitted (kept as regex look-behind context)
+
+    def _process(self, final: bool) -> str:
+        buffer = self._buffer
+        hold = _REGEX_WINDOW if self.pattern is not None else len(self.old) - 1
+        safe = len(buffer) if final else max(self._start, len(buffer) - hold)
+        out = []
+        pos = self._start
+        cut = None
+        while self.remaining is None or self.remaining > 0:
+            if self.pattern is not None:
+                match = self.pattern.search(buffer, pos)
+                if match is None:
+                    break
+                if match.start() == match.end():
+                    raise ValueError("the pattern matches an empty string")
+                if match.end() > safe:
+                    # May still grow with the next chunk
+                    cut = max(pos, min(safe, match.start()))
+                    break
+                begin, end, replacement = match.start(), match.end(), match.expand(self.new)
+            else:
+                begin = buffer.find(self.old, pos)
+                if begin < 0:
+                    break
+                end, replacement = begin + len(self.old), self.new
+            out.append(buffer[pos:begin])
+            out.append(replacement)
+            pos = end
+            self.count += 1
+            if self.remaining is not None:
+                self.remaining -= 1
+        if cut is None:
+            cut = len(buffer) if self.remaining == 0 else max(pos, safe)
+        out.append(buffer[pos:cut])
+        context = min(cut, _REGEX_CONTEXT) if self.pattern is not None else 0
+        self._buffer = buffer[cut - context:]
+        self._start = context
+        return "".join(out)
+
+    def feed(self, text: str) -> str:
+        """Add text; returns the output that is final so far."""
+        if self.remaining == 0:
+            return self.flush() + text
+        self._buffer += text
+        return self._process(final=False)
+
+    def flush(self) -> str:
+        """Returns the rest of the output; matches can't span a flush."""
+        out = self._process(final=True) if self.remaining != 0 else self._buffer[self._start:]
+        self._buffer = ""
+        self._start = 0
+        return out
+
+
 @tool
-def replace_in_file(path: str, old_string: str, new_string: str) -> str:
+def replace_in_file(path: str, old_string: str, new_string: str, regex: bool = False,
+                    max_replacements: int = 0, start_line: int = 0, end_line: int = 0) -> str:
     """
-    Replaces all occurrences of a specified 'old_string' with a 'new_string' within a file.
+    Replaces occurrences of a specified 'old_string' with a 'new_string' within a file.
     This is useful for modifying configurations or styles (e.g., changing a CSS color).
+    The file is processed in chunks and replaced atomically, so large files are fine.
 
     Args:
         path (str): The full path to the file.
-        old_string (str): The string to search for and replace.
-        new_string (str): The string to replace with.
+        old_string (str): The string (or regular expression, if regex is true) to search for.
+        new_string (str): The string to replace with. With regex, \\1 or \\g<name> insert groups.
+        regex (bool): Treat old_string as a Python regular expression (^ and $ match at line breaks).
+        max_replacements (int): Replace at most this many occurrences, in file order. 0 replaces all.
+        start_line (int): Only replace within lines from this one (1-based). 0 starts at the beginning.
+        end_line (int): Only replace within lines up to this one (inclusive). 0 goes to the end.
 
     Returns:
         str: A success message indicating replacements made, or an error message.
@@ -97,24 +375,617 @@ def replace_in_file(path: str, old_string: str, new_string: str) -> str:
             return f"Error replacing in file {path}: File does not exist."
         if not os.path.isfile(path):
             return f"Error replacing in file {path}: Path is not a file."
+        if not old_string:
+            return f"Error replacing in file {path}: old_string must not be empty."
+        try:
+            replacer = _StreamReplacer(old_string, new_string, regex, max_replacements)
+        except re.error as e:
+            return f"Error replacing in file {path}: Invalid regular expression: {e}"
 
-        # Read the file content
-        with open(path, 'r', encoding='utf-8') as f:
-            file_content = f.read()
+        scoped = start_line > 0 or end_line > 0
+        first = max(start_line, 1)
+        last = end_line if end_line > 0 else None
+        with open(path, "r", encoding="utf-8", newline="") as src, _atomic_write(path) as dst:
+            if not scoped:
+                for chunk in iter(lambda: src.read(_REPLACE_CHUNK_CHARS), ""):
+                    dst.write(replacer.feed(chunk))
+            else:
+                # Lines outside the range are copied as they are; matches can't cross the range's edges
+                block = []
+                block_chars = 0
+                for number, line in enumerate(src, 1):
+                    if number < first:
+                        dst.write(line)
+                        continue
+                    if last is not None and number > last:
+                        dst.write(replacer.feed("".join(block)))
+                        dst.write(replacer.flush())
+                        block = []
+                        dst.write(line)
+                        shutil.copyfileobj(src, dst, _REPLACE_CHUNK_CHARS)
+                        break
+                    block.append(line)
+                    block_chars += len(line)
+                    if block_chars >= _REPLACE_CHUNK_CHARS:
+                        dst.write(replacer.feed("".join(block)))
+                        block, block_chars = [], 0
+                if block:
+                    dst.write(replacer.feed("".join(block)))
+            dst.write(replacer.flush())
+            if replacer.count == 0:
+                # Nothing changed: leave the original file untouched
+                raise _NoMatches()
+    except _NoMatches:
+        where = f" lines {first}-{last or 'end'} of" if scoped else ""
+        return f"No occurrences of '{old_string}' found in{where} {path}. File not modified."
+    except UnicodeDecodeError:
+        return f"Error replacing in file {path}: File is not UTF-8 text."
+    except Exception as e:
+        return f"Error replacing in file {path}: {str(e)}"
 
-        # Perform the replacement
-        updated_content = file_content.replace(old_string, new_string)
+    return f"Successfully replaced {replacer.count} occurrence(s) of '{old_string}' with '{new_string}' in {path}."
 
-        if updated_content == file_content:
-            return f"No occurrences of '{old_string}' found in {path}. File not modified."
+_HUNK_HEADER = re.compile(r"^@@(?: -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))?)? @@")
 
-        # Write the modified content back to the file (overwriting)
-        with open(path, 'w', encoding='utf-8') as f:
-            f.write(updated_content)
 
-        return f"Successfully replaced all occurrences of '{old_string}' with '{new_string}' in {path}."
+def _parse_patch(patch: str) -> list:
+    """
+    Parse a unified diff into [{"old_path", "new_path", "hunks"}]. Hunk line counts in the
+    headers are not trusted (hand-written diffs often get them wrong); a hunk ends at the
+    next hunk or file header. Each hunk line is (tag, text, no_newline_at_end).
+    """
+    files = []
+    current = None
+    hunk = None
+    lines = patch.splitlines()
+    i = 0
+    while i < len(lines):
+        line = lines[i]
+        if line.startswith("--- ") and i + 1 < len(lines) and lines[i + 1].startswith("+++ "):
+            current = {"old_path": _patch_path(line[4:]), "new_path": _patch_path(lines[i + 1][4:]), "hunks": []}
+            files.append(current)
+            hunk = None
+            i += 2
+            continue
+        match = _HUNK_HEADER.match(line)
+        if match:
+            if current is None:
+                current = {"old_path": None, "new_path": None, "hunks": []}
+                files.append(current)
+            hunk = {"header": line, "old_start": int(match.group(1)) if match.group(1) else None,
+                    # In a hunk that removes nothing, old_start is the line the new lines follow
+                    "after": match.group(2) == "0", "lines": []}
+            current["hunks"].append(hunk)
+        elif hunk is not None:
+            if line.startswith("\\"):
+                if hunk["lines"]:
+                    tag, text, _ = hunk["lines"][-1]
+                    hunk["lines"][-1] = (tag, text, True)
+            elif line[:1] in (" ", "-", "+"):
+                hunk["lines"].append((line[0], line[1:], False))
+            elif line == "":
+                # Context lines that lost their leading space
+                hunk["lines"].append((" ", "", False))
+            elif line.startswith(("diff ", "index ", "new file", "deleted file", "similarity", "rename ")):
+                hunk = None
+        i += 1
+    for f in files:
+        for h in f["hunks"]:
+            while h["lines"] and h["lines"][-1] == (" ", "", False):
+                h["lines"].pop()
+    return [f for f in files if f["hunks"]]
+
+
+def _patch_path(header: str) -> Optional[str]:
+    path = header.split("\t")[0].strip()
+    return None if path == "/dev/null" else path
+
+
+def _resolve_patch_path(f: dict) -> Optional[str]:
+    """The file a diff entry targets, without git's a/ and b/ prefixes."""
+    path = f["new_path"] or f["old_path"]
+    if path is None or os.path.exists(path):
+        return path
+    git_style = ((f["old_path"] is None or f["old_path"].startswith("a/"))
+                 and (f["new_path"] is None or f["new_path"].startswith("b/")))
+    return path[2:] if git_style else path
+
+
+# How hunk lines are compared, from strict to loose
+_LINE_NORMALIZERS = (
+    lambda s: s,
+    lambda s: s.rstrip(),
+    lambda s: " ".join(s.split()),
+)
+
+
+def _find_hunk(keys: list, old: list, expected: int, floor: int, normalize) -> Optional[int]:
+    """Start index where `old` matches the file at or after `floor`, nearest to `expected`."""
+    want = [normalize(s) for s in old]
+    last_start = len(keys) - len(want)
+    if last_start < floor:
+        return None
+    expected = min(max(expected, floor), last_start)
+    for distance in range(0, max(expected - floor, last_start - expected) + 1):
+        for start in ((expected,) if distance == 0 else (expected - distance, expected + distance)):
+            if floor <= start <= last_start and all(normalize(keys[start + k]) == w for k, w in enumerate(want)):
+                return start
+    return None
+
+
+def _closest_region(keys: list, old: list, expected: int) -> Tuple[int, int]:
+    """(start, matching line count) of the region that best resembles `old`, searched near `expected`."""
+    if not keys or not old:
+        return 0, 0
+    want = [" ".join(s.split()) for s in old]
+    norm = [" ".join(s.split()) for s in keys]
+    span = max(2000, 2_000_000 // max(1, len(want)))
+    best = (max(0, min(expected, len(keys) - 1)), 0)
+    for start in range(max(0, expected - span), min(len(keys), expected + span)):
+        score = sum(1 for k, w in enumerate(want) if start + k < len(norm) and norm[start + k] == w)
+        if score > best[1]:
+            best = (start, score)
+    return best
+
+
+def _apply_hunks(path: str, content: str, hunks: list, fuzz: int) -> Tuple[Optional[str], list, list]:
+    """Returns (new content or None if any hunk failed, notes on applied hunks, conflict reports)."""
+    lines = content.splitlines(keepends=True)
+    newline = "\r\n" if lines and lines[0].endswith("\r\n") else "\n"
+    notes, conflicts = [], []
+    floor = 0
+    net = 0    # lines added minus removed by the hunks applied so far
+    shift = 0  # how far the previous hunk was from its stated position
+    for number, hunk in enumerate(hunks, 1):
+        body = hunk["lines"]
+        keys = [l.rstrip("\r\n") for l in lines]
+        placed = None
+        context_lead = next((i for i, (tag, _, _) in enumerate(body) if tag != " "), len(body))
+        context_trail = next((i for i, (tag, _, _) in enumerate(reversed(body)) if tag != " "), len(body))
+        tried = set()
+        for level in range(fuzz + 1):
+            # Like patch's fuzz factor: ignore up to `level` context lines at each end of the hunk,
+            # but always keep at least one, so a hunk is never placed without anything to anchor it
+            lead = min(level, max(0, context_lead - 1))
+            trail = min(level, max(0, context_trail - 1), len(body) - lead)
+            if (lead, trail) in tried:
+                continue
+            tried.add((lead, trail))
+            trimmed = body[lead:len(body) - trail]
+            old = [text for tag, text, _ in trimmed if tag != "+"]
+            stated = (hunk["old_start"] - (0 if hunk["after"] else 1) + lead + net) if hunk["old_start"] else floor
+            expected = max(0, stated + shift)
+            if not old and hunk["old_start"] is None and lines:
+                # Only added lines and no line number: nothing says where they belong
+                break
+            for strictness, normalize in enumerate(_LINE_NORMALIZERS):
+                start = _find_hunk(keys, old, expected, floor, normalize) if old else min(max(expected, floor), len(lines))
+                if start is not None:
+                    placed = (start, stated, trimmed, old, max(lead, trail), strictness)
+                    break
+            if placed is not None:
+                break
+        if placed is None:
+            old = [text for tag, text, _ in body if tag != "+"]
+            stated = (hunk["old_start"] - (0 if hunk["after"] else 1) + net) if hunk["old_start"] else floor
+            start, score = _closest_region(keys, old, max(0, stated + shift))
+            actual = keys[start:start + len(old)]
+            report = [f"Hunk {number} ({hunk['header']}) does not match {path}."]
+            if score:
+                report.append(f"Closest match at lines {start + 1}-{start + len(actual)} ({score} of {len(old)} lines equal):")
+                report.extend(difflib.unified_diff(old, actual, "expected by patch", f"{path} lines {start + 1}-{start + len(actual)}",
+                                                   lineterm="", n=len(old)))
+            elif not old:
+                report.append("It only adds lines and has neither context lines nor a line number to place them by.")
+            else:
+                report.append("None of its context or removed lines were found near the stated position.")
+            conflicts.append("\n".join(report))
+            continue
+
+        start, stated, trimmed, old, level, strictness = placed
+        replacement = []
+        index = start
+        for tag, text, no_newline in trimmed:
+            if tag == " ":
+                # Keep the file's own version of context lines
+                replacement.append(lines[index])
+                index += 1
+            elif tag == "-":
+                index += 1
+            else:
+                replacement.append(text + ("" if no_newline else newline))
+        lines[start:start + len(old)] = replacement
+        if hunk["old_start"]:
+            shift = start - stated
+        net += len(replacement) - len(old)
+        floor = start + len(replacement)
+        detail = []
+        if hunk["old_start"] and shift:
+            detail.append(f"offset {shift:+d} lines")
+        if level:
+            detail.append(f"fuzz {level}")
+        if strictness:
+            detail.append("whitespace differences ignored")
+        notes.append(f"hunk {number} applied" + (f" ({', '.join(detail)})" if detail else ""))
+
+    if conflicts:
+        return None, notes, conflicts
+    # A line that ended the file without a newline may now be followed by added lines
+    for i in range(len(lines) - 1):
+        if not lines[i].endswith("\n"):
+            lines[i] += newline
+    return "".join(lines), notes, conflicts
+
+
+@tool
+def apply_patch(patch: str, path: str = "", fuzz: int = 2) -> str:
+    """
+    Applies a unified diff (as produced by `diff -u` or `git diff`) to one or more files.
+    Prefer this over rewriting whole files: send only the changed lines with a few lines of
+    context. Hunks are located even if the line numbers are off, and with `fuzz` up to that
+    many context lines at each end of a hunk may differ (one at each end must still match,
+    so give hunks at least two lines of context). If any hunk of a file does not
+    match, no file is changed and the conflicting hunks are reported with the closest
+    matching lines in the file.
+
+    Args:
+        patch (str): The unified diff. `--- a/file` / `+++ b/file` headers name the files;
+            `--- /dev/null` creates a file and `+++ /dev/null` deletes one.
+        path (str): File to patch when the diff has no file headers or covers a single file.
+        fuzz (int): Context lines per hunk end that may be ignored when matching (0-3).
+
+    Returns:
+        str: Which hunks were applied where, or a conflict report.
+    """
+    try:
+        files = _parse_patch(patch)
+        if not files:
+            return "Error applying patch: No hunks found. Expected a unified diff with @@ hunk headers."
+        if path and len(files) > 1:
+            return "Error applying patch: The diff covers several files; omit path and use file headers."
+        fuzz = min(max(fuzz, 0), 3)
+
+        results = []  # (target, new content or None to delete, notes)
+        conflicts = []
+        for f in files:
+            target = path or _resolve_patch_path(f)
+            if not target:
+                return "Error applying patch: No file name in the diff; pass path."
+            # A /dev/null side creates or deletes the file, also when `path` names it; without
+            # file headers both sides are None
+            creating = f["old_path"] is None and f["new_path"] is not None
+            deleting = f["new_path"] is None and f["old_path"] is not None
+            if creating:
+                if os.path.exists(target) and os.path.getsize(target) > 0:
+                    conflicts.append(f"{target}: the diff creates this file, but it already exists.")
+                    continue
+                content = ""
+            else:
+                if not os.path.isfile(target):
+                    conflicts.append(f"{target}: File does not exist.")
+                    continue
+                with open(target, "r", encoding="utf-8", newline="") as src:
+                    content = src.read()
+            new_content, notes, file_conflicts = _apply_hunks(target, content, f["hunks"], fuzz)
+            if file_conflicts:
+                conflicts.extend(file_conflicts)
+                continue
+            results.append((target, None if deleting else new_content, notes))
+
+        if conflicts:
+            return ("Error applying patch: no files were modified.\n\n" + "\n\n".join(conflicts))
+
+        summary = []
+        for target, new_content, notes in results:
+            if new_content is None:
+                os.remove(target)
+                summary.append(f"{target}: deleted")
+                continue
+            directory = os.path.dirname(target)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with _atomic_write(target) as dst:
+                dst.write(new_content)
+            summary.append(f"{target}: " + "; ".join(notes))
+        return "Successfully applied patch.\n" + "\n".join(summary)
+    except UnicodeDecodeError:
+        return "Error applying patch: Target file is not UTF-8 text."
     except Exception as e:
-        return f"Error replacing in file {path}: {str(e)}"
+        return f"Error applying patch: {str(e)}"
+
+def _run_file_op(op: dict, backups: Optional[dict], created_dirs: list) -> str:
+    """
+    Carry out one batch operation; raises on failure. In atomic mode `backups` and
+    `created_dirs` record how to undo it.
+    """
+    kind, path, content = op["op"], op["path"], op.get("content", "")
+    if kind != "delete":
+        # Writes go through symlinks (see _atomic_write), so back up and restore the target
+        path = os.path.realpath(path)
+    if backups is not None and path not in backups:
+        # First change to this path in the batch: keep what was there so it can be restored
+        if os.path.isfile(path):
+            directory, name = os.path.split(path)
+            backup = os.path.join(directory, f".{name}.batch-backup-{os.getpid()}-{id(backups)}")
+            if os.path.islink(path):
+                os.symlink(os.readlink(path), backup)  # a deleted symlink comes back as the link
+            elif kind == "append" or os.stat(path).st_nlink > 1:
+                shutil.copy2(path, backup)  # modified in place, so a hard link would change with it
+            else:
+                try:
+                    os.link(path, backup)  # the original inode survives the replace/unlink
+                except OSError:
+                    shutil.copy2(path, backup)
+            backups[path] = backup
+        else:
+            backups[path] = None
+    # While `path` is still hard-linked to its backup, replace it rather than write through the link
+    linked = (bool(backups) and backups.get(path) is not None and os.path.exists(path)
+              and os.path.samefile(path, backups[path]))
+    if kind == "create":
+        directory = os.path.dirname(path)
+        missing = []
+        while directory and not os.path.isdir(directory):
+            missing.append(directory)
+            directory = os.path.dirname(directory)
+        if missing:
+            os.makedirs(missing[0], exist_ok=True)
+            created_dirs.extend(missing)
+        with _atomic_write(path, keep_links=not linked) as f:
+            f.write(content)
+        return f"{len(content.encode('utf-8'))} bytes"
+    if kind == "delete":
+        if not os.path.isfile(path):
+            raise FileNotFoundError("File does not exist.")
+        os.remove(path)
+        return "deleted"
+    if not os.path.isfile(path):
+        raise FileNotFoundError("File does not exist. Use a create operation to create a new file.")
+    if kind == "write":
+        with _atomic_write(path, keep_links=not linked) as f:
+            f.write(content)
+    else:
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(content)
+    return f"{len(content.encode('utf-8'))} bytes"
+
+
+def _restore(backups: dict, created_dirs: list):
+    for path, backup in backups.items():
+        try:
+            if backup is not None and os.path.isfile(path) and os.stat(path).st_nlink > 1 \
+                    and not os.path.samefile(path, backup):
+                # Written in place through its hard links, so restored in place too
+                shutil.copyfile(backup, path)
+                os.remove(backup)
+            elif backup is not None:
+                os.replace(backup, path)
+            elif os.path.isfile(path):
+                os.remove(path)
+        except OSError as e:
+            print(f"[File Tools] Could not restore {path}: {e}")
+    # Deepest first, so parents are empty by the time they are removed
+    for directory in sorted(set(created_dirs), key=len, reverse=True):
+        try:
+            os.rmdir(directory)
+        except OSError:
+            pass
+
+
+@tool
+def batch_file_operations(operations: List[dict], atomic: bool = False) -> str:
+    """
+    Creates, writes, appends to or deletes many files in one call, e.g. to scaffold a
+    project. Operations on different files run in parallel; operations on the same file
+    run in the given order.
+
+    Args:
+        operations (List[dict]): Items like {"op": "create", "path": "src/app.py", "content": "..."}.
+            op is "create" (new file or overwrite, parent directories are created),
+            "write" (overwrite an existing file), "append" (add to an existing file) or "delete".
+        atomic (bool): If true and any operation fails, all files are restored to how they were.
+
+    Returns:
+        str: One line per operation with its outcome, and a summary.
+    """
+    if not operations:
+        return "Error in batch file operations: No operations given."
+    if len(operations) > BATCH_MAX_OPERATIONS:
+        return f"Error in batch file operations: At most {BATCH_MAX_OPERATIONS} operations per call."
+    ops = []
+    for item in operations:
+        op = item.get("op") if isinstance(item, dict) else None
+        if op not in ("create", "write", "append", "delete") or not item.get("path"):
+            return f"Error in batch file operations: Invalid operation {item!r}. Each needs an op and a path."
+        ops.append({**item, "path": os.path.normpath(item["path"])})
+
+    # One sequential group per file keeps same-file operations in order; paths that reach
+    # the same file through symlinks are the same file
+    groups = {}
+    for index, op in enumerate(ops):
+        groups.setdefault(os.path.realpath(op["path"]), []).append(index)
+    results: List[Optional[str]] = [None] * len(ops)
+    errors: List[Optional[str]] = [None] * len(ops)
+    backups = {} if atomic else None
+    created_dirs = []
+    failure = threading.Event()
+
+    def run_group(indexes):
+        for index in indexes:
+            if atomic and failure.is_set():
+                return  # everything is rolled back anyway
+            try:
+                results[index] = _run_file_op(ops[index], backups, created_dirs)
+            except Exception as e:
+                errors[index] = str(e)
+                failure.set()
+                if atomic:
+                    return
+
+    with ThreadPoolExecutor(max_workers=min(BATCH_WORKERS, len(groups))) as pool:
+        list(pool.map(run_group, groups.values()))
+
+    failed = sum(1 for e in errors if e is not None)
+    rolled_back = atomic and failed > 0
+    if atomic:
+        if rolled_back:
+            _restore(backups, created_dirs)
+        else:
+            for backup in backups.values():
+                if backup is not None:
+                    os.remove(backup)
+
+    lines = []
+    for index, op in enumerate(ops, 1):
+        if errors[index - 1] is not None:
+            outcome = f"FAILED: {errors[index - 1]}"
+        elif results[index - 1] is None:
+            outcome = "skipped"
+        else:
+            outcome = "undone" if rolled_back else f"ok ({results[index - 1]})"
+        lines.append(f"{index}. {op['op']} {op['path']}: {outcome}")
+    if rolled_back:
+        summary = f"{failed} of {len(ops)} operations failed; all changes were rolled back."
+    else:
+        summary = f"{len(ops) - failed} of {len(ops)} operations succeeded."
+    return summary + "\n" + "\n".join(lines)
+
+def _format_size(size: int) -> str:
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024 or unit == "GB":
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+
+
+def _dir_summary(path: str, budget: list) -> str:
+    """Recursive file count and size of a directory; stops when the shared entry budget runs out."""
+    files = total = 0
+    stack = [path]
+    while stack:
+        try:
+            entries = list(os.scandir(stack.pop()))
+        except OSError:
+            continue
+        for entry in entries:
+            budget[0] -= 1
+            if budget[0] < 0:
+                return f"{files}+ files, {_format_size(total)}+"
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    files += 1
+                    total += entry.stat(follow_symlinks=False).st_size
+            except OSError:
+                continue
+    return f"{files} files, {_format_size(total)}"
+
+
+def _sorted_entries(directory: str) -> list:
+    try:
+        return sorted(os.scandir(directory), key=lambda e: e.name)
+    except OSError:
+        return []
+
+
+def _iter_tree(root: str, depth: int, include_hidden: bool, after: Tuple[str, ...]):
+    """
+    Yield (relative path parts, DirEntry) depth-first, each directory's entries sorted by
+    name, so the order matches sorting the path parts. Directories are only scanned when
+    the walk reaches them. Entries up to and including `after` (a previous listing's
+    cursor) are skipped without descending into finished subtrees.
+    """
+    stack = [(iter(_sorted_entries(root)), ())]
+    while stack:
+        entries, parts = stack[-1]
+        entry = next(entries, None)
+        if entry is None:
+            stack.pop()
+            continue
+        if not include_hidden and entry.name.startswith("."):
+            continue
+        own = parts + (entry.name,)
+        on_cursor_path = after[:len(own)] == own
+        if after and own < after and not on_cursor_path:
+            continue
+        if not on_cursor_path:
+            yield own, entry
+        try:
+            if len(own) < depth and entry.is_dir(follow_symlinks=False):
+                stack.append((iter(_sorted_entries(entry.path)), own))
+        except OSError:
+            continue
+
+
+@tool
+def list_directory(path: str = ".", depth: int = 1, glob: str = "", max_entries: int = 200,
+                   include_hidden: bool = False, summaries: bool = False, cursor: str = "") -> str:
+    """
+    Lists the files and subdirectories of a directory, optionally recursively. Prefer this
+    over ls -R or find, whose output can be huge. Listings are cut off at max_entries; pass
+    the returned cursor to continue.
+
+    Args:
+        path (str): The directory to list.
+        depth (int): How many levels to descend (1 = only the directory's own entries, at most 10).
+        glob (str): Only list files whose name matches this pattern, e.g. "*.py" (directories are always listed).
+        max_entries (int): Maximum number of entries to return (at most 1000).
+        include_hidden (bool): Include entries whose name starts with a dot.
+        summaries (bool): Show the total number of files and bytes under each listed directory.
+        cursor (str): The cursor from a previous, cut-off listing of the same directory and options.
+
+    Returns:
+        str: One line per entry (path relative to the directory, size for files), or an error message.
+    """
+    try:
+        if not os.path.exists(path):
+            return f"Error listing directory {path}: Directory does not exist."
+        if not os.path.isdir(path):
+            return f"Error listing directory {path}: Path is not a directory."
+        depth = min(max(depth, 1), 10)
+        max_entries = min(max(max_entries, 1), 1000)
+        after = tuple(cursor.split("/")) if cursor else ()
+        summary_budget = [LIST_SUMMARY_MAX_ENTRIES]
+
+        lines = []
+        dirs = files = 0
+        last = None
+        more = False
+        for parts, entry in _iter_tree(path, depth, include_hidden, after):
+            try:
+                is_dir = entry.is_dir(follow_symlinks=False)
+                if not is_dir and glob and not fnmatch.fnmatch(entry.name, glob):
+                    continue
+                if len(lines) >= max_entries:
+                    more = True
+                    break
+                rel = "/".join(parts)
+                if entry.is_symlink():
+                    line = f"{rel} -> {os.readlink(entry.path)}"
+                elif is_dir:
+                    line = f"{rel}/"
+                    if summaries:
+                        line += f"  ({_dir_summary(entry.path, summary_budget)})"
+                    dirs += 1
+                else:
+                    line = f"{rel}  {_format_size(entry.stat(follow_symlinks=False).st_size)}"
+                    files += 1
+            except OSError:
+                continue
+            lines.append(line)
+            last = parts
+
+        header = f"[Directory: {os.path.abspath(path)} | depth {depth} | {dirs} directories, {files} files shown"
+        if cursor:
+            header += f" | continuing after {cursor}"
+        if more:
+            header += f" | more entries: cursor=\"{'/'.join(last)}\""
+        header += "]"
+        if not lines:
+            return header + "\n(no entries)"
+        return header + "\n" + "\n".join(lines)
+    except Exception as e:
+        return f"Error listing directory {path}: {str(e)}"
 
 @tool
 def delete_file(path: str) -> str:
@@ -141,5 +1012,5 @@ def delete_file(path: str) -> str:
 
 # Helper function to get all tools from this module
 def get_file_tools():
-    return [create_file, write_file, read_file, replace_in_file, delete_file]
+    return [create_file, write_file, read_file, list_directory, replace_in_file, apply_patch, batch_file_operations, delete_file]
 
@@ -0,0 +1,317 @@
+# jobs.py
+"""
+Background jobs: long-running commands (builds, installs, backups) started detached from
+the agent turn. The agent gets a job ID right away and can later check, tail or cancel
+the job. Each job is run by a small runner process that writes the command's output to
+log files and its exit code to a file, so jobs keep running and finish cleanly even if
+the server restarts; their records live in the `jobs` table.
+"""
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+import psutil
+from langchain_core.tools import tool
+
+from .db import connect
+from .resource_limits import with_limits
+from .run_context import current_session_id, emit_event
+from .shell_pool import shell_pool
+
+JOBS_DIR = os.getenv("AGENTD_JOBS_DIR", os.path.join(tempfile.gettempdir(), "agentd-jobs"))
+MAX_TAIL_LINES = 500
+_TAIL_READ_BYTES = 256 * 1024
+
+# Runs the command, sends its output to the log files and records the exit code via an
+# atomic rename, so a reader never sees a half-written code
+_RUNNER = """
+import os, subprocess, sys
+job_dir, command = sys.argv[1], sys.argv[2]
+with open(os.path.join(job_dir, "stdout.log"), "ab") as out, open(os.path.join(job_dir, "stderr.log"), "ab") as err:
+    code = subprocess.call(command, shell=True, stdin=subprocess.DEVNULL, stdout=out, stderr=err)
+with open(os.path.join(job_dir, "exit_code.tmp"), "w") as f:
+    f.write(str(code))
+os.replace(os.path.join(job_dir, "exit_code.tmp"), os.path.join(job_dir, "exit_code"))
+"""
+
+_COLUMNS = ("id", "session_id", "command", "cwd", "pid", "status", "returncode", "started_at", "finished_at")
+# Runner processes started by this server, kept so finished ones are reaped
+_processes: Dict[str, subprocess.Popen] = {}
+
+
+def _job_dir(job_id: str) -> str:
+    return os.path.join(JOBS_DIR, job_id)
+
+
+def _row_to_job(row) -> Dict[str, Any]:
+    return dict(zip(_COLUMNS, row))
+
+
+def _load(job_id: str) -> Optional[Dict[str, Any]]:
+    conn = connect()
+    try:
+        row = conn.execute(f"SELECT {', '.join(_COLUMNS)} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    finally:
+        conn.close()
+    return _row_to_job(row) if row else None
+
+
+def _finish(job_id: str, status: str, returncode: Optional[int]):
+    conn = connect()
+    try:
+        with conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, returncode = ?, finished_at = ? WHERE id = ? AND status = 'running'",
+                (status, returncode, datetime.utcnow().isoformat(), job_id),
+            )
+    finally:
+        conn.close()
+
+
+def _read_exit_code(job_id: str) -> Optional[int]:
+    try:
+        with open(os.path.join(_job_dir(job_id), "exit_code")) as f:
+            return int(f.read().strip())
+    except (OSError, ValueError):
+        return None
+
+
+def _runner_alive(job: Dict[str, Any]) -> bool:
+    """True if the job's runner process still exists (and is not a different process reusing the PID)."""
+    process = _processes.get(job["id"])
+    if process is not None:
+        return process.poll() is None
+    try:
+        proc = psutil.Process(job["pid"])
+        started = datetime.fromisoformat(job["started_at"]).replace(tzinfo=timezone.utc).timestamp()
+        # The runner was created right before the row was written
+        return proc.status() != psutil.STATUS_ZOMBIE and abs(proc.create_time() - started) < 5
+    except (psutil.Error, TypeError, ValueError):
+        return False
+
+
+def _refresh(job: Dict[str, Any]) -> Dict[str, Any]:
+    """Bring a running job's record up to date with its runner; returns the current record."""
+    if job["status"] != "running":
+        return job
+    code = _read_exit_code(job["id"])
+    if code is None and _runner_alive(job):
+        return job
+    if code is None:
+        # The runner may have written the code between the two checks
+        code = _read_exit_code(job["id"])
+    if code is None:
+        _finish(job["id"], "lost", None)
+    else:
+        _finish(job["id"], "succeeded" if code == 0 else "failed", code)
+    _processes.pop(job["id"], None)
+    return _load(job["id"]) or job
+
+
+def start_job(command: str, cwd: Optional[str] = None, session_id: Optional[str] = None) -> Dict[str, Any]:
+    """Launch `command` detached from the server and record it; returns the job record."""
+    job_id = uuid.uuid4().hex[:12]
+    job_dir = _job_dir(job_id)
+    os.makedirs(job_dir, exist_ok=True)
+    if os.name == "posix":
+        detach = {"start_new_session": True}
+    else:
+        detach = {"creationflags": subprocess.CREATE_NEW_PROCESS_GROUP | subprocess.DETACHED_PROCESS}
+    started_at = datetime.utcnow().isoformat()
+    process = subprocess.Popen(
+        [sys.executable, "-c", _RUNNER, job_dir, with_limits(command)],
+        cwd=cwd or None,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        **detach,
+    )
+    _processes[job_id] = process
+    job = {"id": job_id, "session_id": session_id, "command": command, "cwd": cwd or os.getcwd(),
+           "pid": process.pid, "status": "running", "returncode": None, "started_at": started_at, "finished_at": None}
+    conn = connect()
+    try:
+        with conn:
+            conn.execute(f"INSERT INTO jobs ({', '.join(_COLUMNS)}) VALUES ({', '.join('?' * len(_COLUMNS))})",
+                         tuple(job[c] for c in _COLUMNS))
+    finally:
+        conn.close()
+    print(f"[Jobs] Started job {job_id} (pid {process.pid}): {command}")
+    return job
+
+
+def get_job(job_id: str) -> Optional[Dict[str, Any]]:
+    job = _load(job_id)
+    return _refresh(job) if job else None
+
+
+def list_jobs(session_id: Optional[str] = None, limit: int = 50) -> List[Dict[str, Any]]:
+    conn = connect()
+    try:
+        if session_id:
+            rows = conn.execute(f"SELECT {', '.join(_COLUMNS)} FROM jobs WHERE session_id = ? "
+                                "ORDER BY started_at DESC LIMIT ?", (session_id, limit)).fetchall()
+        else:
+            rows = conn.execute(f"SELECT {', '.join(_COLUMNS)} FROM jobs ORDER BY started_at DESC LIMIT ?",
+                                (limit,)).fetchall()
+    finally:
+        conn.close()
+    return [_refresh(_row_to_job(row)) for row in rows]
+
+
+def tail_output(job_id: str, stream: str = "stdout", lines: int = 50) -> Optional[Dict[str, Any]]:
+    """Last `lines` lines of a job's stdout or stderr, or None if the job does not exist."""
+    job = get_job(job_id)
+    if job is None:
+        return None
+    path = os.path.join(_job_dir(job_id), f"{stream}.log")
+    try:
+        total = os.path.getsize(path)
+        with open(path, "rb") as f:
+            f.seek(max(0, total - _TAIL_READ_BYTES))
+            data = f.read()
+    except FileNotFoundError:
+        total, data = 0, b""
+    text = data.decode("utf-8", errors="replace").splitlines()
+    lines = max(1, min(lines, MAX_TAIL_LINES))
+    return {"job": job, "stream": stream, "total_bytes": total, "lines": text[-lines:]}
+
+
+def cancel_job(job_id: str) -> Optional[Dict[str, Any]]:
+    """Kill a running job's whole process tree; returns the updated record, or None if unknown."""
+    job = get_job(job_id)
+    if job is None or job["status"] != "running":
+        return job
+    try:
+        if os.name == "posix":
+            os.killpg(job["pid"], signal.SIGKILL)
+        else:
+            for child in psutil.Process(job["pid"]).children(recursive=True):
+                child.kill()
+            psutil.Process(job["pid"]).kill()
+    except (ProcessLookupError, PermissionError, psutil.Error):
+        pass
+    process = _processes.pop(job_id, None)
+    if process is not None:
+        process.wait()
+    _finish(job_id, "cancelled", None)
+    print(f"[Jobs] Cancelled job {job_id}")
+    return _load(job_id)
+
+
+def reconcile_jobs() -> int:
+    """
+    Update jobs recorded as running whose runner exited while the server was down.
+    Called at startup; returns the number of jobs that are still running.
+    """
+    conn = connect()
+    try:
+        rows = conn.execute(f"SELECT {', '.join(_COLUMNS)} FROM jobs WHERE status = 'running'").fetchall()
+    finally:
+        conn.close()
+    still_running = sum(1 for row in rows if _refresh(_row_to_job(row))["status"] == "running")
+    if rows:
+        print(f"[Jobs] Reconciled {len(rows)} job(s), {still_running} still running")
+    return still_running
+
+
+def _job_summary(job: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: job[k] for k in ("id", "command", "status", "returncode", "started_at", "finished_at")}
+
+
+@tool
+def start_background_job(command: str, cwd: str = "") -> dict:
+    """
+    Starts a long-running shell command (build, package install, backup, server) in the
+    background and returns its job ID immediately, without waiting for it to finish.
+    Use job_status, tail_job_output and cancel_background_job to follow it up.
+
+    Args:
+        command (str): The shell command to run.
+        cwd (str): Directory to run it in. Empty uses the current directory of this chat's
+            shell (where earlier `cd` commands left it); a relative path is taken from there.
+
+    Returns:
+        dict: The job ID and the job's initial status.
+    """
+    session_id = current_session_id.get()
+    # Jobs run where the chat's terminal commands would, not in the server's directory
+    shell_cwd = shell_pool.cwd(session_id) or os.getcwd()
+    cwd = os.path.normpath(os.path.join(shell_cwd, os.path.expanduser(cwd))) if cwd else shell_cwd
+    if not os.path.isdir(cwd):
+        return {"status": "error", "message": f"Directory not found: {cwd}"}
+    try:
+        job = start_job(command, cwd, session_id)
+    except OSError as e:
+        return {"status": "error", "message": f"Could not start job: {e}"}
+    emit_event({"type": "tool_output", "tool": "start_background_job", "stream": "command",
+                "line": f"[job {job['id']}] {command}"})
+    return {"status": "success", "job_id": job["id"], "job": _job_summary(job),
+            "message": f"Job {job['id']} started in the background."}
+
+
+@tool
+def job_status(job_id: str = "") -> dict:
+    """
+    Reports the status of a background job, or lists the jobs of this chat when no ID is given.
+
+    Args:
+        job_id (str): The job ID returned by start_background_job. Empty lists all jobs of this chat.
+
+    Returns:
+        dict: status (running, succeeded, failed, cancelled or lost), return code and times of the job(s).
+    """
+    if not job_id:
+        return {"status": "success", "jobs": [_job_summary(j) for j in list_jobs(current_session_id.get(), 20)]}
+    job = get_job(job_id)
+    if job is None:
+        return {"status": "error", "message": f"No job with ID {job_id}."}
+    return {"status": "success", "job": _job_summary(job)}
+
+
+@tool
+def tail_job_output(job_id: str, stream: str = "stdout", lines: int = 50) -> dict:
+    """
+    Returns the last lines of a background job's output.
+
+    Args:
+        job_id (str): The job ID returned by start_background_job.
+        stream (str): "stdout" or "stderr".
+        lines (int): Number of lines from the end (at most 500).
+
+    Returns:
+        dict: The job's status and the last output lines.
+    """
+    if stream not in ("stdout", "stderr"):
+        return {"status": "error", "message": "stream must be \"stdout\" or \"stderr\"."}
+    tail = tail_output(job_id, stream, lines)
+    if tail is None:
+        return {"status": "error", "message": f"No job with ID {job_id}."}
+    return {"status": "success", "job": _job_summary(tail["job"]), "total_bytes": tail["total_bytes"],
+            "output": "\n".join(tail["lines"])}
+
+
+@tool
+def cancel_background_job(job_id: str) -> dict:
+    """
+    Stops a running background job and all processes it started.
+
+    Args:
+        job_id (str): The job ID returned by start_background_job.
+
+    Returns:
+        dict: The job's final status.
+    """
+    job = cancel_job(job_id)
+    if job is None:
+        return {"status": "error", "message": f"No job with ID {job_id}."}
+    return {"status": "success", "job": _job_summary(job)}
+
+
+def get_job_tools() -> list:
+    return [start_background_job, job_status, tail_job_output, cancel_background_job]
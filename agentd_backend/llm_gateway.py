@@ -0,0 +1,200 @@
+# llm_gateway.py
+import asyncio
+import os
+import random
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, TypeVar
+
+from .tracing import span
+
+T = TypeVar("T")
+
+# HTTP / gRPC-equivalent status codes worth retrying
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+RETRYABLE_NAMES = {
+    "ResourceExhausted", "TooManyRequests", "ServiceUnavailable", "DeadlineExceeded",
+    "InternalServerError", "GatewayTimeout", "ServerError", "Aborted",
+    "TimeoutException", "ConnectError", "ReadError", "RemoteProtocolError",
+}
+RETRYABLE_MARKERS = ("429", "RESOURCE_EXHAUSTED", "UNAVAILABLE", "rate limit", "overloaded", "503")
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket refilled continuously at `rate_per_minute`.
+
+    `reserve` always succeeds and returns how long the caller has to wait before using
+    the reservation; the balance may go negative, so callers queue up in order instead
+    of failing when the budget is exhausted.
+    """
+
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else rate_per_minute
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, amount: float) -> float:
+        if self.rate <= 0:
+            return 0.0
+        amount = min(amount, self.capacity)
+        with self._lock:
+            self._refill()
+            self.tokens -= amount
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def adjust(self, delta: float):
+        """Debit (positive) or refund (negative) tokens once the real cost is known."""
+        if self.rate <= 0 or not delta:
+            return
+        with self._lock:
+            self._refill()
+            self.tokens = min(self.capacity, self.tokens - delta)
+
+
+def is_retryable(exc: BaseException) -> bool:
+    """Rate limits, timeouts and transient server/network errors are retried."""
+    for attr in ("status_code", "code", "status"):
+        value = getattr(exc, attr, None)
+        try:
+            if value is not None and int(value) in RETRYABLE_STATUS:
+                return True
+        except (TypeError, ValueError):
+            pass
+    if any(cls.__name__ in RETRYABLE_NAMES for cls in type(exc).__mro__):
+        return True
+    text = str(exc)
+    return any(marker in text for marker in RETRYABLE_MARKERS)
+
+
+class LLMGateway:
+    """
+    Wraps LLM calls with requests-per-minute and tokens-per-minute budgets and retries
+    transient failures with jittered exponential backoff. Time spent queued on the
+    budgets and sleeping between retries is reported by `metrics()`.
+    """
+
+    def __init__(self, rpm: float, tpm: float, max_retries: int = 4,
+                 backoff_base: float = 1.0, backoff_max: float = 30.0):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._stats = {
+            "calls": 0, "retries": 0, "failures": 0, "throttled_calls": 0,
+            "queued_seconds": 0.0, "backoff_seconds": 0.0, "tokens": 0, "last_error": None,
+        }
+        self._stats_lock = threading.Lock()
+
+    def _count(self, **updates):
+        with self._stats_lock:
+            for key, value in updates.items():
+                if key == "last_error":
+                    self._stats[key] = value
+                else:
+                    self._stats[key] += value
+
+    def _reserve(self, estimated_tokens: int) -> float:
+        wait = max(self.requests.reserve(1), self.tokens.reserve(estimated_tokens))
+        if wait > 0:
+            self._count(throttled_calls=1, queued_seconds=wait)
+        return wait
+
+    def _backoff(self, attempt: int) -> float:
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+        self._count(retries=1, backoff_seconds=delay)
+        return delay
+
+    def _settle(self, result: Any, estimated_tokens: int, usage_of: Optional[Callable[[Any], Optional[int]]]):
+        actual = None
+        if usage_of is not None:
+            try:
+                actual = usage_of(result)
+            except Exception:
+                actual = None
+        if actual:
+            self.tokens.adjust(actual - estimated_tokens)
+        self._count(tokens=actual or estimated_tokens)
+
+    async def call(self, fn: Callable[[], Awaitable[T]], *, name: str = "llm", estimated_tokens: int = 1000,
+                   usage_of: Optional[Callable[[T], Optional[int]]] = None) -> T:
+        """Run `fn()` (a coroutine factory) within the budgets, retrying transient errors."""
+        self._count(calls=1)
+        for attempt in range(self.max_retries + 1):
+            wait = self._reserve(estimated_tokens)
+            if wait > 0:
+                with span(f"throttle:{name}", "throttle", wait_ms=round(wait * 1000, 1)):
+                    await asyncio.sleep(wait)
+            try:
+                result = await fn()
+            except Exception as e:
+                if attempt >= self.max_retries or not is_retryable(e):
+                    self._count(failures=1, last_error=repr(e)[:300])
+                    raise
+                delay = self._backoff(attempt)
+                print(f"[LLM Gateway] {name} failed ({e!r}); retry {attempt + 1}/{self.max_retries} in {delay:.1f}s")
+                with span(f"backoff:{name}", "throttle", attempt=attempt + 1, wait_ms=round(delay * 1000, 1)):
+                    await asyncio.sleep(delay)
+                continue
+            self._settle(result, estimated_tokens, usage_of)
+            return result
+
+    def call_sync(self, fn: Callable[[], T], *, name: str = "llm", estimated_tokens: int = 1000,
+                  usage_of: Optional[Callable[[T], Optional[int]]] = None) -> T:
+        """Blocking variant of `call` for synchronous code paths."""
+        self._count(calls=1)
+        for attempt in range(self.max_retries + 1):
+            wait = self._reserve(estimated_tokens)
+            if wait > 0:
+                time.sleep(wait)
+            try:
+                result = fn()
+            except Exception as e:
+                if attempt >= self.max_retries or not is_retryable(e):
+                    self._count(failures=1, last_error=repr(e)[:300])
+                    raise
+                delay = self._backoff(attempt)
+                print(f"[LLM Gateway] {name} failed ({e!r}); retry {attempt + 1}/{self.max_retries} in {delay:.1f}s")
+                time.sleep(delay)
+                continue
+            self._settle(result, estimated_tokens, usage_of)
+            return result
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["queued_seconds"] = round(stats["queued_seconds"], 3)
+        stats["backoff_seconds"] = round(stats["backoff_seconds"], 3)
+        stats["throttled_seconds"] = round(stats["queued_seconds"] + stats["backoff_seconds"], 3)
+        stats["limits"] = {"rpm": self.requests.rate * 60, "tpm": self.tokens.rate * 60}
+        return stats
+
+
+def estimate_tokens(text: str, expected_output: int = 512) -> int:
+    """Rough token estimate (~4 characters per token) used to reserve TPM budget up front."""
+    return len(text) // 4 + expected_output
+
+
+def usage_metadata_tokens(message) -> Optional[int]:
+    """Total tokens reported by a LangChain chat model response."""
+    usage = getattr(message, "usage_metadata", None) or {}
+    return usage.get("total_tokens")
+
+
+# One gateway per process for all Gemini calls, since they share the project quota.
+# With several workers each process enforces these limits on its own.
+gateway = LLMGateway(
+    rpm=float(os.getenv("AGENTD_LLM_RPM", "1000")),
+    tpm=float(os.getenv("AGENTD_LLM_TPM", "1000000")),
+    max_retries=int(os.getenv("AGENTD_LLM_MAX_RETRIES", "4")),
+    backoff_base=float(os.getenv("AGENTD_LLM_BACKOFF_BASE", "1.0")),
+    backoff_max=float(os.getenv("AGENTD_LLM_BACKOFF_MAX", "30")),
+)
@@ -2,7 +2,7 @@ from fastapi import APIRouter, HTTPException
 from typing import Dict, Any
 import json
 from pathlib import Path
-from .agentD_2 import initialize_agent,invoke_agent
+from .zapier_tools import get_mcp_status
 router = APIRouter()
 
 def get_config_path() -> Path:
@@ -51,6 +51,11 @@ async def get_mcp_config():
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error reading MCP configuration: {str(e)}")
 
+@router.get("/mcp_status")
+async def mcp_status():
+    """Get MCP readiness: connection state and tool count for each configured server."""
+    return get_mcp_status()
+
 @router.post("/mcp_config")
 async def update_mcp_config(config: Dict[str, Any]):
     """Update the MCP configuration."""
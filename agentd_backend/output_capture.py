@@ -0,0 +1,180 @@
+# output_capture.py
+import os
+import tempfile
+import time
+import uuid
+from typing import Optional
+
+from langchain_core.tools import tool
+
+from .run_context import emit_event
+
+# Bytes of a command's stdout/stderr kept in memory and returned to the model
+HEAD_BYTES = int(os.getenv("AGENTD_OUTPUT_HEAD_BYTES", "8192"))
+TAIL_BYTES = int(os.getenv("AGENTD_OUTPUT_TAIL_BYTES", "8192"))
+# Longer outputs are spooled here in full so they can be paged with read_command_output
+OUTPUT_DIR = os.getenv("AGENTD_OUTPUT_DIR", os.path.join(tempfile.gettempdir(), "agentd-output"))
+OUTPUT_RETENTION_SECONDS = float(os.getenv("AGENTD_OUTPUT_RETENTION", "3600"))
+MAX_PAGE_BYTES = 64 * 1024
+# Lines per stream forwarded live to the UI; the rest is only captured
+STREAM_MAX_LINES = int(os.getenv("AGENTD_STREAM_MAX_LINES", "200"))
+
+
+def new_output_id() -> str:
+    return uuid.uuid4().hex[:12]
+
+
+def _spill_path(output_id: str, stream: str) -> str:
+    return os.path.join(OUTPUT_DIR, f"{output_id}.{stream}")
+
+
+def _sweep_old_outputs():
+    """Delete spooled outputs older than the retention period."""
+    cutoff = time.time() - OUTPUT_RETENTION_SECONDS
+    try:
+        entries = list(os.scandir(OUTPUT_DIR))
+    except FileNotFoundError:
+        return
+    for entry in entries:
+        try:
+            if entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+        except OSError:
+            pass
+
+
+class BoundedCapture:
+    """
+    Captures one output stream keeping at most HEAD_BYTES + TAIL_BYTES in memory. Once the
+    output outgrows that, everything is spooled to a file under OUTPUT_DIR and only the
+    head and the tail are kept in memory.
+    """
+
+    def __init__(self, output_id: str, stream: str, head_bytes: int = HEAD_BYTES, tail_bytes: int = TAIL_BYTES):
+        self.output_id = output_id
+        self.stream = stream
+        self.head_bytes = head_bytes
+        self.tail_bytes = tail_bytes
+        self.total_bytes = 0
+        self._buffer = bytearray()  # whole output while it fits
+        self._head = b""
+        self._tail = bytearray()
+        self._spill = None
+
+    @property
+    def truncated(self) -> bool:
+        return self._spill is not None
+
+    @property
+    def omitted_bytes(self) -> int:
+        return max(0, self.total_bytes - self.head_bytes - self.tail_bytes) if self.truncated else 0
+
+    @property
+    def spill_path(self) -> Optional[str]:
+        return _spill_path(self.output_id, self.stream) if self._spill is not None else None
+
+    def write(self, data: bytes):
+        if not data:
+            return
+        self.total_bytes += len(data)
+        if self._spill is None:
+            self._buffer += data
+            if len(self._buffer) <= self.head_bytes + self.tail_bytes:
+                return
+            os.makedirs(OUTPUT_DIR, exist_ok=True)
+            _sweep_old_outputs()
+            self._spill = open(_spill_path(self.output_id, self.stream), "wb")
+            self._spill.write(self._buffer)
+            self._head = bytes(self._buffer[:self.head_bytes])
+            self._tail = self._buffer[-self.tail_bytes:] if self.tail_bytes else bytearray()
+            self._buffer = bytearray()
+            return
+        self._spill.write(data)
+        if self.tail_bytes:
+            self._tail += data
+            del self._tail[:-self.tail_bytes]
+
+    def close(self):
+        if self._spill is not None and not self._spill.closed:
+            self._spill.close()
+
+    def text(self) -> str:
+        """The captured output, with the middle replaced by a marker when it was truncated."""
+        if not self.truncated:
+            return self._buffer.decode("utf-8", errors="replace")
+        head = self._head.decode("utf-8", errors="replace")
+        tail = bytes(self._tail).decode("utf-8", errors="replace")
+        marker = (f"\n... [{self.omitted_bytes} of {self.total_bytes} bytes omitted; page through the full output with "
+                  f"read_command_output(output_id=\"{self.output_id}\", stream=\"{self.stream}\")] ...\n")
+        return head + marker + tail
+
+
+class StreamForwarder:
+    """Feeds a command's output stream into its capture and streams the first lines as `tool_output` events."""
+
+    def __init__(self, capture: BoundedCapture, tool_name: str = "execute_shell_command", max_lines: int = STREAM_MAX_LINES):
+        self.capture = capture
+        self.tool_name = tool_name
+        self.max_lines = max_lines
+        self._partial = b""
+        self._lines = 0
+
+    def _forward(self, line: bytes):
+        self._lines += 1
+        if self._lines <= self.max_lines:
+            emit_event({"type": "tool_output", "tool": self.tool_name, "stream": self.capture.stream,
+                        "line": line.decode("utf-8", errors="replace").rstrip("\r")})
+        elif self._lines == self.max_lines + 1:
+            emit_event({"type": "tool_output", "tool": self.tool_name, "stream": self.capture.stream,
+                        "line": f"... (more {self.capture.stream} is captured but not streamed)"})
+
+    def feed(self, data: bytes):
+        if not data:
+            return
+        self.capture.write(data)
+        if self._lines > self.max_lines:
+            return
+        *lines, partial = (self._partial + data).split(b"\n")
+        for line in lines:
+            self._forward(line)
+        self._partial = partial[-MAX_PAGE_BYTES:]
+
+    def flush(self):
+        if self._partial and self._lines <= self.max_lines:
+            self._forward(self._partial)
+        self._partial = b""
+
+
+@tool
+def read_command_output(output_id: str, stream: str = "stdout", offset: int = 0, length: int = 16384) -> dict:
+    """
+    Reads part of the full output of an earlier terminal command whose output was truncated.
+
+    Args:
+        output_id (str): The output_id reported in the truncated command result.
+        stream (str): "stdout" or "stderr".
+        offset (int): Byte offset to start reading at.
+        length (int): Number of bytes to read (at most 65536).
+
+    Returns:
+        dict: The requested content, the byte range, the total size and whether the end was reached.
+    """
+    if stream not in ("stdout", "stderr") or not output_id.isalnum():
+        return {"status": "error", "message": "Invalid output_id or stream."}
+    path = _spill_path(output_id, stream)
+    try:
+        total = os.path.getsize(path)
+        with open(path, "rb") as f:
+            f.seek(max(0, offset))
+            data = f.read(max(0, min(length, MAX_PAGE_BYTES)))
+    except FileNotFoundError:
+        return {"status": "error", "message": f"No stored {stream} for output_id {output_id} (it may have expired)."}
+    end = max(0, offset) + len(data)
+    return {
+        "status": "success",
+        "content": data.decode("utf-8", errors="replace"),
+        "offset": max(0, offset),
+        "next_offset": end,
+        "total_bytes": total,
+        "eof": end >= total,
+    }
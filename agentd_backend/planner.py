@@ -0,0 +1,89 @@
+# planner.py
+import json
+import os
+import re
+from typing import Any, Dict, List, Optional
+
+# Opt-in: enabled for every request with AGENTD_PLANNER=1, or per request with "plan": true
+PLANNER_ENABLED = os.getenv("AGENTD_PLANNER", "0").lower() in ("1", "true", "yes")
+MAX_SUBTASKS = int(os.getenv("AGENTD_PLANNER_MAX_SUBTASKS", "6"))
+SUBTASK_MAX_ROUNDS = int(os.getenv("AGENTD_SUBTASK_MAX_ROUNDS", "5"))
+
+PLANNER_PROMPT = """You are planning how an OS agent will carry out a user request.
+
+Split the request into at most {max_subtasks} self-contained sub-tasks. Each sub-task is done by a
+separate worker that can use the terminal, file tools, web browsing and external service tools,
+but only sees its own sub-task text and the results of the sub-tasks it depends on.
+Sub-tasks that do not need each other's results must not depend on each other, so they can run
+in parallel. If the request is a single step or a simple question, return one sub-task.
+
+Respond with JSON only, no prose, in this format:
+{{"subtasks": [{{"id": "s1", "task": "...", "depends_on": []}}, {{"id": "s2", "task": "...", "depends_on": ["s1"]}}]}}
+
+User request:
+{request}"""
+
+SUBTASK_PREAMBLE = (
+    "You are working on one sub-task of a larger request. Complete only this sub-task and "
+    "reply with a concise summary of what you did and found, including any values later steps need."
+)
+
+SYNTHESIZE_INSTRUCTION = (
+    "The request was split into sub-tasks that have now been carried out. Their results are below. "
+    "Do not call any tools. Using these results, give the user the final answer to their request.\n\n{results}"
+)
+
+
+def parse_plan(text: str) -> Optional[List[Dict[str, Any]]]:
+    """
+    Parse the planner's JSON into a list of {id, task, depends_on}. Unknown or self
+    dependencies are dropped. Returns None when the output is not a usable plan.
+    """
+    match = re.search(r"\{.*\}", text or "", re.DOTALL)
+    if not match:
+        return None
+    try:
+        data = json.loads(match.group(0))
+    except json.JSONDecodeError:
+        return None
+    raw = data.get("subtasks") if isinstance(data, dict) else None
+    if not isinstance(raw, list):
+        return None
+
+    subtasks = []
+    for i, item in enumerate(raw[:MAX_SUBTASKS]):
+        if not isinstance(item, dict) or not str(item.get("task", "")).strip():
+            continue
+        subtasks.append({
+            "id": str(item.get("id") or f"s{i + 1}"),
+            "task": str(item["task"]).strip(),
+            "depends_on": [str(d) for d in item.get("depends_on") or []],
+        })
+    ids = {s["id"] for s in subtasks}
+    for s in subtasks:
+        s["depends_on"] = [d for d in s["depends_on"] if d in ids and d != s["id"]]
+    return subtasks or None
+
+
+def ready_subtasks(plan: List[Dict[str, Any]], results: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Sub-tasks not yet done whose dependencies are all done. If nothing is ready although
+    sub-tasks remain, the plan has a cycle and all remaining sub-tasks are released.
+    """
+    pending = [s for s in plan if s["id"] not in results]
+    ready = [s for s in pending if all(d in results for d in s["depends_on"])]
+    return ready or pending
+
+
+def dependency_context(subtask: Dict[str, Any], results: Dict[str, Any]) -> str:
+    """Results of the sub-tasks `subtask` depends on, formatted for its prompt."""
+    lines = [f"- {results[d]['task']}: {results[d]['result']}" for d in subtask["depends_on"] if d in results]
+    return "Results of earlier sub-tasks:\n" + "\n".join(lines) if lines else ""
+
+
+def format_results(plan: List[Dict[str, Any]], results: Dict[str, Any]) -> str:
+    lines = []
+    for s in plan:
+        outcome = results.get(s["id"], {}).get("result", "Not carried out.")
+        lines.append(f"Sub-task {s['id']}: {s['task']}\nResult: {outcome}")
+    return "\n\n".join(lines)
@@ -1,12 +1,11 @@
 import os
-from google import genai
 from dotenv import load_dotenv
 import time
+from .clients import get_genai_client
+from .llm_gateway import estimate_tokens, gateway
 load_dotenv()
 
-client = genai.Client()
-
-def generate_progress_steps(prompt, max_steps=6, mcp_active=False):
+def _build_progress_prompt(prompt, max_steps=6, mcp_active=False):
     if mcp_active:
         # For MCP operations, use more steps as they involve external services
         max_steps = 8
@@ -39,11 +38,9 @@ Rules:
 - Output as a numbered list only
 """
 
-    response = client.models.generate_content(
-        model="gemini-2.5-flash",
-        contents=system_prompt
-    )
+    return system_prompt
 
+def _parse_steps(response):
     steps = []
     for line in response.text.splitlines():
         line = line.strip()
@@ -52,3 +49,28 @@ Rules:
             
 
     return steps
+
+def generate_progress_steps(prompt, max_steps=6, mcp_active=False):
+    system_prompt = _build_progress_prompt(prompt, max_steps, mcp_active)
+    response = gateway.call_sync(
+        lambda: get_genai_client().models.generate_content(
+            model="gemini-2.5-flash",
+            contents=system_prompt
+        ),
+        name="progress_steps",
+        estimated_tokens=estimate_tokens(system_prompt, expected_output=200),
+    )
+    return _parse_steps(response)
+
+async def agenerate_progress_steps(prompt, max_steps=6, mcp_active=False):
+    """Async variant used by the agent loop, so throttling and retries don't block it."""
+    system_prompt = _build_progress_prompt(prompt, max_steps, mcp_active)
+    response = await gateway.call(
+        lambda: get_genai_client().aio.models.generate_content(
+            model="gemini-2.5-flash",
+            contents=system_prompt
+        ),
+        name="progress_steps",
+        estimated_tokens=estimate_tokens(system_prompt, expected_output=200),
+    )
+    return _parse_steps(response)
@@ -15,10 +15,20 @@ SYSTEM_PROMPT = (
     "1. File System Operations: Use file tools for direct file creation, reading, modification, or deletion. "
     "If the user asks to generate code and save it, generate the code first and then write it to a file. "
     "If the user asks to modify existing content, read the file if needed and then update it accordingly. "
+    "To change part of an existing file, use apply_patch with a unified diff of only the changed lines "
+    "instead of writing the whole file again. "
+    "To check a file after editing it, read it again with read_file(changes_only=true) to get only what changed. "
+    "To create, write or delete several files, for example when scaffolding a project, use one "
+    "batch_file_operations call instead of one call per file. "
+    "To find where something is in a directory or codebase, use search_files rather than grep through the terminal "
+    "or reading files one by one. "
+    "To see what a directory contains, use list_directory rather than ls -R or find. "
 
     "2. Terminal Commands: Use terminal commands for system inspection, navigation, permissions, "
     "software management, network diagnostics, or any task best handled through command line utilities. "
     "Infer and execute appropriate commands when system information is required. "
+    "For commands that take minutes, such as builds, package installs or backups, use start_background_job "
+    "and check on them with job_status or tail_job_output instead of waiting for them. "
 
     "3. External Service Integrations: Use available integration tools for interacting with external services "
     "such as email, messaging, cloud services, automation platforms, or third party applications. "
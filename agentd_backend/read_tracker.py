@@ -0,0 +1,151 @@
+# read_tracker.py
+"""
+Remembers what `read_file` returned to the model, so a re-read of an unchanged file is
+answered with a short marker instead of the full content again, and a re-read of a
+changed file can be answered with a diff against the version the model already has.
+
+Reads are tracked per conversation scope: the chat session, or one sub-task of a
+planned turn (sub-tasks have their own message history and never saw the main chat's
+reads). The wrapper sits outside the tool result cache, so a memoized result is
+compared like a fresh one.
+"""
+import difflib
+import functools
+import hashlib
+import inspect
+import os
+import threading
+from collections import OrderedDict
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from .run_context import current_session_id
+
+READ_TRACKING_ENABLED = os.getenv("AGENTD_READ_TRACKING", "1").lower() in ("1", "true", "yes")
+# Content kept to diff against; the least recently read files are forgotten first
+READ_TRACKING_MAX_BYTES = int(os.getenv("AGENTD_READ_TRACKING_MAX_BYTES", str(32 * 1024 * 1024)))
+
+# Set while a planned sub-task runs; its reads are tracked apart from the session's
+current_read_scope: ContextVar[Optional[str]] = ContextVar("current_read_scope", default=None)
+
+# read_file arguments that only steer the tracking; the wrapped function gets their defaults
+_TRACKING_ARGS = ("changes_only", "force")
+# read_file results that are not file content (errors, binary notices)
+_UNTRACKED_PREFIXES = ("Error reading file ",)
+
+
+def _digest(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8", errors="surrogatepass")).hexdigest()
+
+
+def _is_content(result: Any) -> bool:
+    return isinstance(result, str) and not result.startswith(_UNTRACKED_PREFIXES) and "| binary content, not shown." not in result
+
+
+class ReadTracker:
+    """LRU of (scope, path, range) -> (hash, text) of the last result returned, bounded by text size."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._entries: "OrderedDict[Tuple[str, str, str], Tuple[str, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._totals = {"reads": 0, "unchanged": 0, "diffs": 0, "full": 0, "evictions": 0}
+
+    def _drop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.bytes -= len(entry[1])
+
+    def swap(self, key: Tuple[str, str, str], text: str) -> Tuple[Optional[str], Optional[str], str]:
+        """Record `text` as the last read of `key`; returns the previous (hash, text) and the new hash."""
+        digest = _digest(text)
+        with self._lock:
+            previous = self._entries.get(key)
+            self._drop(key)
+            if len(text) <= self.max_bytes:
+                self._entries[key] = (digest, text)
+                self.bytes += len(text)
+                while self.bytes > self.max_bytes:
+                    self._drop(next(iter(self._entries)))
+                    self._totals["evictions"] += 1
+        return (previous[0], previous[1], digest) if previous else (None, None, digest)
+
+    def count(self, outcome: str):
+        with self._lock:
+            self._totals["reads"] += 1
+            self._totals[outcome] += 1
+
+    def forget(self, scope: str):
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == scope]:
+                self._drop(key)
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self._totals, "entries": len(self._entries), "bytes": self.bytes, "max_bytes": self.max_bytes}
+
+
+read_tracker = ReadTracker(READ_TRACKING_MAX_BYTES)
+
+
+def _scope() -> Optional[str]:
+    return current_read_scope.get() or current_session_id.get()
+
+
+def _respond(path: str, previous_digest, previous_text, digest: str, text: str, changes_only: bool) -> str:
+    if previous_digest == digest:
+        marker = (f"[File: {path} | unchanged since you last read it with these arguments; "
+                  f"its content is in your earlier read_file result. Pass force=true to get it again.]")
+        if len(marker) < len(text):
+            read_tracker.count("unchanged")
+            return marker
+    if changes_only and previous_text is not None:
+        diff = "".join(difflib.unified_diff(
+            previous_text.splitlines(keepends=True), text.splitlines(keepends=True),
+            "last read", "current", n=2,
+        ))
+        # A rewrite is cheaper to send whole than as a diff
+        if len(diff) < len(text):
+            read_tracker.count("diffs")
+            return f"[File: {path} | changed since you last read it; unified diff against that version:]\n{diff}"
+    read_tracker.count("full")
+    return text
+
+
+def _track(func: Callable) -> Callable:
+    signature = inspect.signature(func)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        bound = signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        call_args = dict(bound.arguments)
+        changes_only = bool(call_args.get("changes_only"))
+        force = bool(call_args.get("force"))
+        for name in _TRACKING_ARGS:
+            if name in call_args:
+                call_args[name] = signature.parameters[name].default
+        result = func(**call_args)
+        scope = _scope()
+        if scope is None or not _is_content(result):
+            return result
+        path = call_args.get("path", "")
+        range_key = ",".join(str(call_args.get(k, 0)) for k in ("offset", "length", "start_line", "end_line"))
+        previous_digest, previous_text, digest = read_tracker.swap((scope, os.path.abspath(path), range_key), result)
+        if force:
+            read_tracker.count("full")
+            return result
+        return _respond(path, previous_digest, previous_text, digest, result, changes_only)
+
+    return wrapper
+
+
+def with_read_tracking(tool: Any) -> Any:
+    """Return the read_file tool with read tracking applied; other tools are returned as they are."""
+    name = getattr(tool, "name", None) or getattr(tool, "__name__", None)
+    if not READ_TRACKING_ENABLED or name != "read_file":
+        return tool
+    if callable(getattr(tool, "func", None)):
+        return tool.model_copy(update={"func": _track(tool.func)})
+    return _track(tool)
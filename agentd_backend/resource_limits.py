@@ -0,0 +1,189 @@
+# resource_limits.py
+"""
+Per-command resource limits and usage accounting for agent-launched shell commands.
+
+Limits are applied by the command's shell to itself (ulimit, renice) before it runs
+the command, so they are inherited by everything the command starts. This avoids
+preexec_fn, which is unsafe in a server that always has threads running. Soft and hard
+limits are set together, so the command cannot raise them again. Usage is measured by
+sampling the command's process tree with psutil; CPU time of processes that already
+exited is taken from the parent's accumulated children times where the parent outlives
+the command (the persistent session shell).
+"""
+import asyncio
+import os
+import time
+from typing import Any, Dict, Optional
+
+import psutil
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# 0 = unlimited. CPU seconds and address space apply to each process of the command.
+CMD_CPU_SECONDS = int(os.getenv("AGENTD_CMD_CPU_SECONDS", "0"))
+CMD_MAX_MEMORY_MB = int(os.getenv("AGENTD_CMD_MAX_MEMORY_MB", "0"))
+CMD_MAX_OPEN_FILES = int(os.getenv("AGENTD_CMD_MAX_OPEN_FILES", "0"))
+# Niceness added to commands, e.g. 10 so a busy build can't starve the API server (0 = unchanged)
+CMD_NICE = int(os.getenv("AGENTD_CMD_NICE", "0"))
+USAGE_SAMPLE_INTERVAL = float(os.getenv("AGENTD_CMD_SAMPLE_INTERVAL", "0.2"))
+
+# Exit statuses of a command killed by SIGXCPU (signal as seen by asyncio, or 128 + signal from a shell)
+_SIGXCPU = 24
+CPU_LIMIT_RETURNCODES = (-_SIGXCPU, 128 + _SIGXCPU)
+
+
+def _capped(kind: int, value: int) -> int:
+    """`value` capped at the hard limit commands inherit from this process (raising it would fail)."""
+    _, hard = resource.getrlimit(kind)
+    return value if hard == resource.RLIM_INFINITY else min(value, hard)
+
+
+def nice_prelude() -> str:
+    """Shell command that lowers the priority of the shell running it; empty if CMD_NICE is 0."""
+    if resource is None or not CMD_NICE:
+        return ""
+    return f"renice -n {int(CMD_NICE)} -p $$ >/dev/null 2>&1; "
+
+
+def rlimit_prelude() -> str:
+    """
+    Shell commands that set the configured rlimits (soft and hard) of the shell running
+    them; empty where rlimits don't exist or none are set. A long-lived shell must run
+    them in a subshell per command, as hard limits can't be raised again afterwards.
+    """
+    if resource is None:
+        return ""
+    parts = []
+    if CMD_CPU_SECONDS:
+        # The hard limit is a second later, so the command gets SIGXCPU (and is reported as
+        # over its CPU limit) before the kernel's SIGKILL
+        hard = _capped(resource.RLIMIT_CPU, CMD_CPU_SECONDS + 1)
+        parts.append(f"ulimit -S -t {min(CMD_CPU_SECONDS, hard)}; ulimit -H -t {hard}")
+    if CMD_MAX_MEMORY_MB:
+        # RLIMIT_RSS is not enforced by Linux; the address space limit is the closest rlimit (ulimit counts KiB)
+        parts.append(f"ulimit -v {_capped(resource.RLIMIT_AS, CMD_MAX_MEMORY_MB * 1024 * 1024) // 1024}")
+    if CMD_MAX_OPEN_FILES:
+        parts.append(f"ulimit -n {_capped(resource.RLIMIT_NOFILE, CMD_MAX_OPEN_FILES)}")
+    return "".join(f"{part}; " for part in parts)
+
+
+def limit_prelude() -> str:
+    """Priority and rlimit commands to run before a command, so everything after inherits them."""
+    return nice_prelude() + rlimit_prelude()
+
+
+def with_limits(command: str) -> str:
+    """`command` preceded by the limit prelude, for a fresh `sh -c`."""
+    prelude = limit_prelude()
+    return f"{prelude}{command}" if prelude else command
+
+
+def configured_limits() -> Dict[str, Any]:
+    return {
+        "cpu_seconds": CMD_CPU_SECONDS or None,
+        "max_memory_mb": CMD_MAX_MEMORY_MB or None,
+        "max_open_files": CMD_MAX_OPEN_FILES or None,
+        "nice": CMD_NICE,
+    }
+
+
+def _children_cpu(proc: psutil.Process) -> float:
+    try:
+        times = proc.cpu_times()
+        return times.children_user + times.children_system
+    except psutil.Error:
+        return 0.0
+
+
+class UsageMonitor:
+    """
+    Samples the process tree under `pid` while a command runs and keeps the CPU seconds,
+    peak RSS and I/O bytes it used. With `include_root=False` the root process itself (a
+    long-lived shell) is not counted, only what it ran since the monitor started.
+    """
+
+    def __init__(self, pid: int, include_root: bool = True, interval: float = USAGE_SAMPLE_INTERVAL):
+        self.include_root = include_root
+        self.interval = interval
+        try:
+            self._root = psutil.Process(pid)
+        except psutil.Error:
+            self._root = None
+        self._children_cpu_start = _children_cpu(self._root) if self._root else 0.0
+        # Processes already running under the root (e.g. started in the background by an
+        # earlier command in the same shell) are not part of this command
+        self._preexisting = set()
+        if self._root is not None and not include_root:
+            try:
+                self._preexisting = {p.pid for p in self._root.children(recursive=True)}
+            except psutil.Error:
+                pass
+        self._cpu: Dict[int, float] = {}
+        self._io: Dict[int, tuple] = {}
+        self._children_cpu = 0.0
+        self.peak_rss_bytes = 0
+        self._started = time.monotonic()
+        self._task: Optional[asyncio.Task] = None
+
+    def sample(self):
+        if self._root is None:
+            return
+        try:
+            procs = [p for p in self._root.children(recursive=True) if p.pid not in self._preexisting]
+        except psutil.Error:
+            procs = []
+        if self.include_root:
+            procs.append(self._root)
+        rss = 0
+        for proc in procs:
+            try:
+                with proc.oneshot():
+                    times = proc.cpu_times()
+                    rss += proc.memory_info().rss
+                    self._cpu[proc.pid] = times.user + times.system
+                    try:
+                        io = proc.io_counters()
+                        self._io[proc.pid] = (io.read_bytes, io.write_bytes)
+                    except (psutil.Error, AttributeError, NotImplementedError):
+                        pass
+            except psutil.Error:
+                continue
+        self.peak_rss_bytes = max(self.peak_rss_bytes, rss)
+        self._children_cpu = max(self._children_cpu, _children_cpu(self._root) - self._children_cpu_start)
+
+    async def _run(self):
+        while True:
+            await asyncio.to_thread(self.sample)
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> "UsageMonitor":
+        if self._root is not None:
+            self._task = asyncio.create_task(self._run())
+        return self
+
+    def cancel(self):
+        if self._task is not None:
+            self._task.cancel()
+
+    async def stop(self) -> Dict[str, Any]:
+        """Stop sampling and return the usage summary."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        await asyncio.to_thread(self.sample)
+        # Processes the root already reaped are covered exactly by its accumulated children times
+        root_cpu = self._cpu.get(self._root.pid, 0.0) if self._root is not None else 0.0
+        cpu = max(self._children_cpu + root_cpu, sum(self._cpu.values()))
+        return {
+            "wall_seconds": round(time.monotonic() - self._started, 3),
+            "cpu_seconds": round(cpu, 3),
+            "peak_rss_bytes": self.peak_rss_bytes,
+            "read_bytes": sum(r for r, _ in self._io.values()),
+            "write_bytes": sum(w for _, w in self._io.values()),
+        }
@@ -0,0 +1,117 @@
+# response_cache.py
+import asyncio
+import hashlib
+import os
+import re
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+from .shell_pool import PERSISTENT_SHELL_ENABLED
+from .tool_cache import VOLATILE_TOOLS, is_read_only_call
+from .tool_selector import tool_description, tool_name
+
+# Opt-in: enabled for every request with AGENTD_RESPONSE_CACHE=1, or per request with "cache": true
+RESPONSE_CACHE_ENABLED = os.getenv("AGENTD_RESPONSE_CACHE", "0").lower() in ("1", "true", "yes")
+RESPONSE_CACHE_TTL = float(os.getenv("AGENTD_RESPONSE_CACHE_TTL", "60"))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("AGENTD_RESPONSE_CACHE_MAX_ENTRIES", "256"))
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Case-, whitespace- and trailing-punctuation-insensitive form of a prompt."""
+    return re.sub(r"\s+", " ", prompt).strip().lower().rstrip("?!. ")
+
+
+def toolset_fingerprint(tools: Iterable[Any]) -> str:
+    """Hash of the names and descriptions of the tools the agent can call."""
+    parts = sorted(f"{tool_name(t)}:{tool_description(t)}" for t in tools)
+    return hashlib.sha256("\n".join(parts).encode("utf-8")).hexdigest()[:16]
+
+
+def cache_key(prompt: str, fingerprint: str, session_id: Optional[str] = None) -> str:
+    """
+    With persistent session shells, commands like ls or pwd answer for the session's own
+    working directory and environment, so answers are only shared within a session.
+    """
+    scope = session_id if PERSISTENT_SHELL_ENABLED else ""
+    return hashlib.sha256(f"{fingerprint}\n{scope}\n{normalize_prompt(prompt)}".encode("utf-8")).hexdigest()
+
+
+def turn_tool_calls(messages: List[Any]) -> List[Dict[str, Any]]:
+    """Tool calls made by the model since the latest user message."""
+    starts = [i for i, m in enumerate(messages) if isinstance(m, HumanMessage)]
+    turn = messages[starts[-1]:] if starts else messages
+    return [call for m in turn if isinstance(m, AIMessage) for call in (m.tool_calls or [])]
+
+
+def is_cacheable_turn(messages: List[Any]) -> bool:
+    """
+    A turn is cacheable when it inspected the system with read-only tools only. Turns
+    without any tool call are not cached: their answer may depend on the conversation.
+    Neither are turns that polled background jobs, whose state changes by itself.
+    """
+    calls = turn_tool_calls(messages)
+    return bool(calls) and all(is_read_only_call(call) and call.get("name") not in VOLATILE_TOOLS for call in calls)
+
+
+class ResponseCache:
+    """
+    TTL + LRU cache of final agent responses with single-flight coalescing: while a run
+    for a key is in flight, identical requests wait for its result instead of starting
+    their own run.
+    """
+
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._stats = {"hits": 0, "misses": 0, "coalesced": 0, "stores": 0, "uncacheable": 0, "evictions": 0}
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return entry[1]
+        if entry is not None:
+            del self._entries[key]
+        self._stats["misses"] += 1
+        return None
+
+    def put(self, key: str, value: Dict[str, Any]):
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        self._stats["stores"] += 1
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    def begin(self, key: str) -> Tuple[asyncio.Future, bool]:
+        """Join the in-flight run for `key`; returns (future, is_leader)."""
+        future = self._inflight.get(key)
+        if future is not None:
+            self._stats["coalesced"] += 1
+            return future, False
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        return future, True
+
+    def end(self, key: str, value: Optional[Dict[str, Any]]):
+        """Finish the leader's run: cache `value` (None = not cacheable) and wake the waiters."""
+        future = self._inflight.pop(key, None)
+        if value is not None:
+            self.put(key, value)
+        else:
+            self._stats["uncacheable"] += 1
+        if future is not None and not future.done():
+            future.set_result(value)
+
+    def metrics(self) -> Dict[str, Any]:
+        return {**self._stats, "entries": len(self._entries), "in_flight": len(self._inflight),
+                "ttl_seconds": self.ttl, "max_entries": self.max_entries}
+
+
+response_cache = ResponseCache(RESPONSE_CACHE_TTL, RESPONSE_CACHE_MAX_ENTRIES)
@@ -0,0 +1,17 @@
+# run_context.py
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Optional
+
+# Set by invoke_agent for the duration of one agent turn. Context variables are copied
+# into the tasks and executor threads LangGraph uses, so tools and callbacks can read them.
+current_run_id: ContextVar[Optional[str]] = ContextVar("current_run_id", default=None)
+current_session_id: ContextVar[Optional[str]] = ContextVar("current_session_id", default=None)
+# Receives events (e.g. streamed command output) that invoke_agent forwards to the SSE stream
+current_event_sink: ContextVar[Optional[Callable[[Dict[str, Any]], None]]] = ContextVar("current_event_sink", default=None)
+
+
+def emit_event(event: Dict[str, Any]):
+    """Send an event to the current turn's stream; does nothing outside of a turn."""
+    sink = current_event_sink.get()
+    if sink is not None:
+        sink(event)
@@ -0,0 +1,266 @@
+# search_tool.py
+"""
+Content search over a directory tree for the agent, instead of ad-hoc `grep -r` pipelines
+or repeated read_file calls. The tree is walked with os.scandir, honouring .gitignore and
+.ignore files, and files are searched on a thread pool (file reads release the GIL).
+"""
+import fnmatch
+import os
+import re
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Iterator, List, Optional, Tuple
+
+from langchain_core.tools import tool
+
+from .file_tools import looks_binary
+
+SEARCH_WORKERS = int(os.getenv("AGENTD_SEARCH_WORKERS", str(min(16, (os.cpu_count() or 4) * 2))))
+# Files larger than this are skipped (logs and data dumps; page them with read_file instead)
+SEARCH_MAX_FILE_BYTES = int(os.getenv("AGENTD_SEARCH_MAX_FILE_BYTES", str(8 * 1024 * 1024)))
+MAX_MATCHES_PER_FILE = 20
+MAX_LINE_CHARS = 200
+IGNORE_FILES = (".gitignore", ".ignore")
+# Never useful to search, and usually huge
+SKIP_DIRS = {".git", ".hg", ".svn", "node_modules", "__pycache__", ".venv", "venv", ".mypy_cache", ".pytest_cache"}
+
+
+def _glob_to_regex(pattern: str) -> str:
+    out = []
+    i = 0
+    while i < len(pattern):
+        if pattern.startswith("**/", i):
+            out.append("(?:.*/)?")
+            i += 3
+        elif pattern.startswith("**", i):
+            out.append(".*")
+            i += 2
+        elif pattern[i] == "*":
+            out.append("[^/]*")
+            i += 1
+        elif pattern[i] == "?":
+            out.append("[^/]")
+            i += 1
+        elif pattern[i] == "[":
+            end = pattern.find("]", i + 1)
+            if end < 0:
+                out.append(re.escape(pattern[i]))
+                i += 1
+            else:
+                body = pattern[i + 1:end].replace("\\", "\\\\")
+                out.append("[" + ("^" + body[1:] if body.startswith("!") else body) + "]")
+                i = end + 1
+        else:
+            out.append(re.escape(pattern[i]))
+            i += 1
+    return "".join(out)
+
+
+class _IgnoreRules:
+    """The patterns of one ignore file, matched against paths relative to its directory."""
+
+    def __init__(self, base: str, lines: List[str]):
+        self.base = base
+        self.rules = []  # (regex, negated, directories_only, anchored)
+        for line in lines:
+            line = line.rstrip("\n").rstrip()
+            if not line or line.startswith("#"):
+                continue
+            negated = line.startswith("!")
+            if negated:
+                line = line[1:]
+            dir_only = line.endswith("/")
+            line = line.rstrip("/")
+            anchored = "/" in line
+            line = line.lstrip("/")
+            if line:
+                self.rules.append((re.compile(_glob_to_regex(line) + r"\Z"), negated, dir_only, anchored))
+
+    @classmethod
+    def load(cls, directory: str) -> Optional["_IgnoreRules"]:
+        lines = []
+        for name in IGNORE_FILES:
+            try:
+                with open(os.path.join(directory, name), encoding="utf-8", errors="replace") as f:
+                    lines.extend(f.readlines())
+            except OSError:
+                continue
+        return cls(directory, lines) if lines else None
+
+    def match(self, path: str, is_dir: bool) -> Optional[bool]:
+        """True/False if a rule decides whether `path` is ignored, None if none applies."""
+        rel = os.path.relpath(path, self.base).replace(os.sep, "/")
+        name = rel.rsplit("/", 1)[-1]
+        decision = None
+        for regex, negated, dir_only, anchored in self.rules:
+            if dir_only and not is_dir:
+                continue
+            if regex.match(rel if anchored else name):
+                decision = not negated
+        return decision
+
+
+def _is_ignored(path: str, is_dir: bool, rules: Tuple[_IgnoreRules, ...]) -> bool:
+    ignored = False
+    for r in rules:  # deeper ignore files override shallower ones
+        decision = r.match(path, is_dir)
+        if decision is not None:
+            ignored = decision
+    return ignored
+
+
+def _walk(root: str, glob: str, use_ignores: bool, counts: dict) -> Iterator[str]:
+    """Yield the files under `root` that should be searched, without following symlinked directories."""
+    stack = [(root, ())]
+    while stack:
+        directory, rules = stack.pop()
+        if use_ignores:
+            own = _IgnoreRules.load(directory)
+            if own is not None:
+                rules = rules + (own,)
+        try:
+            entries = sorted(os.scandir(directory), key=lambda e: e.name)
+        except OSError:
+            continue
+        subdirs = []
+        for entry in entries:
+            try:
+                is_dir = entry.is_dir(follow_symlinks=False)
+                if is_dir:
+                    if entry.name == ".git" or (use_ignores and entry.name in SKIP_DIRS):
+                        continue
+                    if use_ignores and _is_ignored(entry.path, True, rules):
+                        continue
+                    subdirs.append(entry.path)
+                elif entry.is_file():
+                    if use_ignores and _is_ignored(entry.path, False, rules):
+                        continue
+                    if glob and not fnmatch.fnmatch(entry.name, glob):
+                        continue
+                    if entry.stat().st_size > SEARCH_MAX_FILE_BYTES:
+                        counts["skipped_large"] += 1
+                        continue
+                    yield entry.path
+            except OSError:
+                continue
+        stack.extend((d, rules) for d in reversed(subdirs))
+
+
+def _search_file(path: str, matcher: re.Pattern, limit: int) -> Tuple[Optional[List[str]], bool]:
+    """(matching lines as "path:line: text", or None if the file is binary; True if capped)."""
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except OSError:
+        return [], False
+    if looks_binary(data[:8192]):
+        return None, False
+    text = data.decode("utf-8", errors="replace")
+    found = []
+    line_no = 1
+    scanned = 0
+    last_line = 0
+    for match in matcher.finditer(text):
+        line_no += text.count("\n", scanned, match.start())
+        scanned = match.start()
+        if line_no == last_line:
+            continue  # one result per line
+        last_line = line_no
+        begin = text.rfind("\n", 0, match.start()) + 1
+        end = text.find("\n", match.start())
+        line = text[begin:end if end >= 0 else len(text)].rstrip("\r")
+        if len(line) > MAX_LINE_CHARS:
+            # Show the part around the match
+            start = max(0, match.start() - begin - MAX_LINE_CHARS // 2)
+            line = ("..." if start else "") + line[start:start + MAX_LINE_CHARS] + "..."
+        found.append(f"{path}:{line_no}: {line}")
+        if len(found) >= limit:
+            return found, True
+    return found, False
+
+
+@tool
+def search_files(pattern: str, path: str = ".", regex: bool = False, ignore_case: bool = False,
+                 glob: str = "", max_results: int = 100, include_ignored: bool = False) -> dict:
+    """
+    Searches the text files under a directory for a string or regular expression and returns
+    the matching lines with their line numbers. Files ignored by .gitignore/.ignore, VCS and
+    dependency directories (node_modules, virtualenvs) and binary files are skipped.
+
+    Args:
+        pattern (str): Text to search for (or a Python regular expression if regex is true).
+        path (str): Directory (or single file) to search.
+        regex (bool): Treat pattern as a regular expression.
+        ignore_case (bool): Case-insensitive search.
+        glob (str): Only search files whose name matches this pattern, e.g. "*.py".
+        max_results (int): Maximum number of matching lines to return (at most 1000).
+        include_ignored (bool): Also search files and directories that would normally be skipped.
+
+    Returns:
+        dict: Matches as "path:line: text", plus how many files were searched and whether the list was cut off.
+    """
+    if not pattern:
+        return {"status": "error", "message": "pattern must not be empty."}
+    if not os.path.exists(path):
+        return {"status": "error", "message": f"Path does not exist: {path}"}
+    try:
+        matcher = re.compile(pattern if regex else re.escape(pattern), re.MULTILINE | (re.IGNORECASE if ignore_case else 0))
+    except re.error as e:
+        return {"status": "error", "message": f"Invalid regular expression: {e}"}
+    max_results = max(1, min(max_results, 1000))
+
+    counts = {"searched": 0, "binary": 0, "skipped_large": 0}
+    files = iter([path]) if os.path.isfile(path) else _walk(path, glob, not include_ignored, counts)
+    results = {}
+    total = 0
+    truncated = False
+    lock = threading.Lock()
+
+    def search(file_path):
+        found, capped = _search_file(file_path, matcher, MAX_MATCHES_PER_FILE)
+        with lock:
+            counts["searched"] += 1
+            if found is None:
+                counts["binary"] += 1
+            return file_path, found or [], capped
+
+    # Keep a bounded number of files in flight so the walk stops early once enough matches are found
+    with ThreadPoolExecutor(max_workers=SEARCH_WORKERS) as pool:
+        pending = set()
+        exhausted = False
+        while not exhausted or pending:
+            while not exhausted and len(pending) < SEARCH_WORKERS * 4 and total < max_results:
+                next_file = next(files, None)
+                if next_file is None:
+                    exhausted = True
+                else:
+                    pending.add(pool.submit(search, next_file))
+            if not pending:
+                break
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                file_path, found, capped = future.result()
+                if found:
+                    results[file_path] = found
+                    total += len(found)
+                    truncated = truncated or capped
+            if total >= max_results:
+                truncated = truncated or not exhausted or bool(pending)
+                for future in pending:
+                    future.cancel()
+                break
+
+    matches = [line for file_path in sorted(results) for line in results[file_path]]
+    if len(matches) > max_results:
+        matches, truncated = matches[:max_results], True
+    return {
+        "status": "success",
+        "matches": matches,
+        "files_matched": len(results),
+        "files_searched": counts["searched"],
+        "binary_files_skipped": counts["binary"],
+        "large_files_skipped": counts["skipped_large"],
+        "truncated": truncated,
+        "message": (f"Showing the first {len(matches)} matches; narrow the search with path, glob or a more specific pattern."
+                    if truncated else f"{len(matches)} matching lines in {len(results)} files."),
+    }
@@ -0,0 +1,77 @@
+# session_lock.py
+import asyncio
+import hashlib
+import os
+import tempfile
+import time
+from contextlib import asynccontextmanager
+from typing import Dict
+
+import portalocker
+
+LOCK_DIR = os.getenv("AGENTD_LOCK_DIR", os.path.join(tempfile.gettempdir(), "agentd-locks"))
+LOCK_TIMEOUT = float(os.getenv("AGENTD_SESSION_LOCK_TIMEOUT", "600"))
+# Seconds between attempts to take a file lock held by another worker
+LOCK_POLL_INTERVAL = 0.05
+
+# In-process locks, so coroutines of the same worker queue up without polling the file lock
+_local_locks: Dict[str, asyncio.Lock] = {}
+_local_refs: Dict[str, int] = {}
+
+
+def _lock_path(name: str) -> str:
+    os.makedirs(LOCK_DIR, exist_ok=True)
+    digest = hashlib.sha1(name.encode("utf-8")).hexdigest()
+    return os.path.join(LOCK_DIR, f"{digest}.lock")
+
+
+@asynccontextmanager
+async def session_lock(thread_id: str, timeout: float = LOCK_TIMEOUT):
+    """
+    Serialize agent turns for one chat thread across coroutines and worker processes.
+
+    An asyncio.Lock orders turns inside this worker; an exclusive file lock (portalocker)
+    orders them across uvicorn workers sharing the same host. The file lock is polled
+    without blocking, so a turn cancelled while it waits never takes the lock afterwards.
+
+    Raises:
+        TimeoutError: If the thread stays locked by another turn for longer than `timeout`.
+    """
+    key = str(thread_id)
+    local = _local_locks.setdefault(key, asyncio.Lock())
+    _local_refs[key] = _local_refs.get(key, 0) + 1
+    try:
+        async with local:
+            lock = portalocker.Lock(_lock_path(key), mode="a", timeout=0, fail_when_locked=True)
+            deadline = time.monotonic() + timeout
+            while True:
+                try:
+                    lock.acquire()
+                    break
+                except portalocker.exceptions.LockException:
+                    if time.monotonic() >= deadline:
+                        raise TimeoutError(f"Chat session {key} is busy with another request.")
+                    await asyncio.sleep(LOCK_POLL_INTERVAL)
+            try:
+                yield
+            finally:
+                lock.release()
+    finally:
+        _local_refs[key] -= 1
+        if _local_refs[key] == 0:
+            del _local_refs[key]
+            _local_locks.pop(key, None)
+
+
+def try_acquire_process_lock(name: str):
+    """
+    Take a non-blocking exclusive lock that is held for as long as the returned object is
+    kept alive. Returns None if another process already holds it. Used to elect the single
+    worker that runs host-wide background jobs such as the metrics logger.
+    """
+    lock = portalocker.Lock(_lock_path(name), mode="a", timeout=0, fail_when_locked=True)
+    try:
+        lock.acquire()
+    except portalocker.exceptions.LockException:
+        return None
+    return lock
@@ -0,0 +1,279 @@
+# shell_pool.py
+"""
+Long-lived shell processes, one per chat session.
+
+Commands are written to the session's shell and their end is detected by a sentinel line
+printed after them on stdout (with the exit status) and on stderr, so the working
+directory, exported variables and activated virtualenvs carry over between calls and no
+new shell has to be started per command. When rlimits are configured, each command runs
+in a subshell that applies them, and only its working directory and exported variables
+are carried back to the session's shell (not shell functions, aliases or unexported
+variables).
+"""
+import asyncio
+import os
+import shlex
+import shutil
+import signal
+import tempfile
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+import psutil
+
+from .resource_limits import UsageMonitor, nice_prelude, rlimit_prelude
+
+PERSISTENT_SHELL_ENABLED = (
+    os.name == "posix" and os.getenv("AGENTD_PERSISTENT_SHELL", "1").lower() in ("1", "true", "yes")
+)
+SHELL_POOL_SIZE = int(os.getenv("AGENTD_SHELL_POOL_SIZE", "16"))
+SHELL_IDLE_TIMEOUT = float(os.getenv("AGENTD_SHELL_IDLE_TIMEOUT", "600"))
+READ_CHUNK_BYTES = 64 * 1024
+
+
+def _shell_argv():
+    bash = shutil.which("bash")
+    return [bash, "--noprofile", "--norc"] if bash else ["/bin/sh"]
+
+
+async def _read_until(stream, marker: bytes, forwarder) -> Optional[bytes]:
+    """
+    Forward a stream's bytes until `marker`; returns the rest of the marker's line, or
+    None if the stream ended first. Bytes that could be the start of the marker are held
+    back so the sentinel never reaches the capture.
+    """
+    pending = b""
+    keep = len(marker) - 1
+    while True:
+        data = await stream.read(READ_CHUNK_BYTES)
+        if not data:
+            forwarder.feed(pending)
+            forwarder.flush()
+            return None
+        pending += data
+        index = pending.find(marker)
+        if index >= 0:
+            forwarder.feed(pending[:index])
+            forwarder.flush()
+            rest = pending[index + len(marker):]
+            while b"\n" not in rest:
+                more = await stream.read(64)
+                if not more:
+                    break
+                rest += more
+            return rest.split(b"\n", 1)[0]
+        if len(pending) > keep:
+            forwarder.feed(pending[:-keep])
+            pending = pending[-keep:]
+
+
+class ShellWorker:
+    """One shell process in its own process group, running one command at a time."""
+
+    def __init__(self, process):
+        self.process = process
+        self.lock = asyncio.Lock()
+        self.last_used = time.monotonic()
+        self.commands = 0
+        # Where a limited command's subshell leaves its directory and environment for the shell
+        self.state_path = os.path.join(tempfile.gettempdir(), f"agentd-shell-{uuid.uuid4().hex}")
+
+    @classmethod
+    async def start(cls) -> "ShellWorker":
+        process = await asyncio.create_subprocess_exec(
+            *_shell_argv(),
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            start_new_session=True,
+        )
+        prelude = nice_prelude()
+        if prelude:
+            # The shell lowers its own priority once; every command inherits it
+            process.stdin.write(f"{prelude}\n".encode("utf-8"))
+            await process.stdin.drain()
+        return cls(process)
+
+    @property
+    def alive(self) -> bool:
+        return self.process.returncode is None
+
+    @property
+    def busy(self) -> bool:
+        return self.lock.locked()
+
+    def kill(self):
+        try:
+            os.killpg(self.process.pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            pass
+
+    async def close(self):
+        if self.alive:
+            self.kill()
+            await self.process.wait()
+        for suffix in (".cwd", ".env"):
+            try:
+                os.remove(self.state_path + suffix)
+            except OSError:
+                pass
+
+    def _script(self, command: str, sentinel: str) -> str:
+        # eval keeps syntax errors in `command` from leaving the shell waiting for more input;
+        # stdin is the command channel, so the command itself reads from /dev/null
+        run = f"eval {shlex.quote(command)} < /dev/null"
+        limits = rlimit_prelude()
+        if limits:
+            # Hard limits set in the shell itself would stay lowered for every later command
+            cwd_file, env_file = (shlex.quote(self.state_path + s) for s in (".cwd", ".env"))
+            run = (
+                f": > {cwd_file}\n"
+                f"( {limits}{run}; __agentd_status=$?; export -p > {env_file}; pwd > {cwd_file}; "
+                f"exit $__agentd_status )\n"
+                f"__agentd_status=$?\n"
+                f"if [ -s {cwd_file} ]; then . {env_file} 2>/dev/null; cd -- \"$(cat {cwd_file})\" 2>/dev/null; fi\n"
+                f"(exit $__agentd_status)"
+            )
+        return (
+            f"{run}\n"
+            f"printf '\\n{sentinel}:%s\\n' \"$?\"\n"
+            f"printf '\\n{sentinel}\\n' >&2\n"
+        )
+
+    async def run(self, command: str, timeout: float, out, err) -> Tuple[int, bool, Dict[str, Any]]:
+        """Run one command; returns (returncode, timed_out, usage). The shell is killed on timeout."""
+        sentinel = f"__AGENTD_DONE_{uuid.uuid4().hex}__"
+        script = self._script(command, sentinel)
+        self.commands += 1
+        monitor = UsageMonitor(self.process.pid, include_root=False).start()
+        try:
+            self.process.stdin.write(script.encode("utf-8"))
+            await self.process.stdin.drain()
+
+            async def collect():
+                return await asyncio.gather(
+                    _read_until(self.process.stdout, f"\n{sentinel}:".encode(), out),
+                    _read_until(self.process.stderr, f"\n{sentinel}".encode(), err),
+                )
+
+            status, _ = await asyncio.wait_for(collect(), timeout)
+        except asyncio.TimeoutError:
+            usage = await monitor.stop()
+            self.kill()
+            await self.process.wait()
+            return self.process.returncode, True, usage
+        except (asyncio.CancelledError, BrokenPipeError, ConnectionResetError):
+            self.kill()
+            monitor.cancel()
+            raise
+        finally:
+            self.last_used = time.monotonic()
+
+        usage = await monitor.stop()
+        if status is None:
+            # The command ended the shell (e.g. `exit 3`)
+            return await self.process.wait(), False, usage
+        try:
+            return int(status.strip() or b"0"), False, usage
+        except ValueError:
+            return -2, False, usage
+
+
+class ShellPool:
+    """Session-keyed shell workers with LRU eviction at `max_size` and idle eviction."""
+
+    def __init__(self, max_size: int, idle_timeout: float):
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self._workers: "OrderedDict[str, ShellWorker]" = OrderedDict()
+        self._reaper: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+        self._stats = {"started": 0, "reused": 0, "evicted_idle": 0, "evicted_lru": 0, "fallbacks": 0}
+
+    async def _evict_idle(self):
+        now = time.monotonic()
+        for session, worker in list(self._workers.items()):
+            if not worker.busy and (not worker.alive or now - worker.last_used > self.idle_timeout):
+                self._workers.pop(session, None)
+                self._stats["evicted_idle"] += 1
+                await worker.close()
+
+    async def _reap(self):
+        while self._workers:
+            await asyncio.sleep(max(1.0, self.idle_timeout / 2))
+            await self._evict_idle()
+        self._reaper = None
+
+    async def _worker_for(self, session: str) -> Optional[ShellWorker]:
+        worker = self._workers.get(session)
+        if worker is not None and worker.alive:
+            self._workers.move_to_end(session)
+            self._stats["reused"] += 1
+            return worker
+        self._workers.pop(session, None)
+        while len(self._workers) >= self.max_size:
+            idle = next((s for s, w in self._workers.items() if not w.busy), None)
+            if idle is None:
+                return None
+            self._stats["evicted_lru"] += 1
+            await self._workers.pop(idle).close()
+        worker = await ShellWorker.start()
+        self._workers[session] = worker
+        self._stats["started"] += 1
+        if self._reaper is None:
+            self._reaper = asyncio.create_task(self._reap())
+        return worker
+
+    async def run(self, session: Optional[str], command: str, timeout: float, out, err) -> Optional[Tuple[int, bool, Dict[str, Any]]]:
+        """
+        Run `command` in the session's shell; returns (returncode, timed_out, usage), or None when
+        no persistent shell can be used and the caller should run the command one-shot.
+        """
+        if not PERSISTENT_SHELL_ENABLED or session is None:
+            return None
+        async with self._lock:
+            worker = await self._worker_for(session)
+        if worker is None:
+            self._stats["fallbacks"] += 1
+            return None
+        # Commands of one session run in order, like they would in a terminal
+        async with worker.lock:
+            try:
+                return await worker.run(command, timeout, out, err)
+            finally:
+                if not worker.alive and self._workers.get(session) is worker:
+                    self._workers.pop(session, None)
+
+    def cwd(self, session: Optional[str]) -> Optional[str]:
+        """Working directory of the session's shell (where a `cd` left it), or None if it has none."""
+        worker = self._workers.get(session) if session is not None else None
+        if worker is None or not worker.alive:
+            return None
+        try:
+            return psutil.Process(worker.process.pid).cwd()
+        except psutil.Error:
+            return None
+
+    async def close_all(self):
+        if self._reaper is not None:
+            self._reaper.cancel()
+            self._reaper = None
+        workers = list(self._workers.values())
+        self._workers.clear()
+        for worker in workers:
+            await worker.close()
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "enabled": PERSISTENT_SHELL_ENABLED,
+            "workers": len(self._workers),
+            "busy": sum(1 for w in self._workers.values() if w.busy),
+            "max_size": self.max_size,
+            "idle_timeout_seconds": self.idle_timeout,
+            **self._stats,
+        }
+
+
+shell_pool = ShellPool(SHELL_POOL_SIZE, SHELL_IDLE_TIMEOUT)
@@ -3,21 +3,18 @@ import subprocess
 import platform
 import os
 import time
-import sqlite3
 import json
 from datetime import datetime, timedelta
 from typing import Dict, Any, List
 from pathlib import Path
+from .db import connect, ensure_schema
 
 # Database setup
 DB_PATH = Path("system_metrics.db")
 
-def init_database():
-    """Initialize the database for storing system metrics."""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
-    cursor.execute('''
+METRICS_MIGRATIONS = [
+    (1, [
+        '''
         CREATE TABLE IF NOT EXISTS system_metrics (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
@@ -31,17 +28,36 @@ def init_database():
             network_bytes_recv INTEGER,
             disk_read_bytes INTEGER,
             disk_write_bytes INTEGER
-        )
-    ''')
-    
-    # Create index for faster queries
-    cursor.execute('''
+        )''',
+        # Create index for faster queries
+        '''
         CREATE INDEX IF NOT EXISTS idx_timestamp 
-        ON system_metrics(timestamp)
-    ''')
-    
-    conn.commit()
-    conn.close()
+        ON system_metrics(timestamp)''',
+    ]),
+    (2, [
+        '''
+        CREATE TABLE IF NOT EXISTS command_usage (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+            session_id TEXT,
+            command TEXT NOT NULL,
+            returncode INTEGER,
+            wall_seconds REAL,
+            cpu_seconds REAL,
+            peak_rss_bytes INTEGER,
+            read_bytes INTEGER,
+            write_bytes INTEGER,
+            limit_hit TEXT
+        )''',
+        '''
+        CREATE INDEX IF NOT EXISTS idx_command_usage_timestamp
+        ON command_usage(timestamp)''',
+    ]),
+]
+
+def init_database():
+    """Create or upgrade the database for storing system metrics."""
+    return ensure_schema(DB_PATH, METRICS_MIGRATIONS)
 
 def log_system_metrics():
     """Log current system metrics to database."""
@@ -52,7 +68,7 @@ def log_system_metrics():
         network = psutil.net_io_counters()
         disk_io = psutil.disk_io_counters()
         
-        conn = sqlite3.connect(DB_PATH)
+        conn = connect(DB_PATH)
         cursor = conn.cursor()
         
         cursor.execute('''
@@ -82,6 +98,61 @@ def log_system_metrics():
         print(f"Error logging system metrics: {e}")
         return False
 
+def log_command_usage(session_id: str, command: str, returncode: int, usage: Dict[str, Any]):
+    """Record the resources one agent-launched command used."""
+    conn = connect(DB_PATH)
+    try:
+        with conn:
+            conn.execute('''
+                INSERT INTO command_usage
+                (timestamp, session_id, command, returncode, wall_seconds, cpu_seconds,
+                 peak_rss_bytes, read_bytes, write_bytes, limit_hit)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (
+                datetime.now().isoformat(),
+                session_id,
+                command[:1000],
+                returncode,
+                usage.get('wall_seconds'),
+                usage.get('cpu_seconds'),
+                usage.get('peak_rss_bytes'),
+                usage.get('read_bytes'),
+                usage.get('write_bytes'),
+                usage.get('limit_hit'),
+            ))
+    finally:
+        conn.close()
+
+def get_command_usage(limit: int = 50) -> Dict[str, Any]:
+    """Most recent command usage records plus totals over the last 24 hours."""
+    conn = connect(DB_PATH)
+    try:
+        rows = conn.execute('''
+            SELECT timestamp, session_id, command, returncode, wall_seconds, cpu_seconds,
+                   peak_rss_bytes, read_bytes, write_bytes, limit_hit
+            FROM command_usage ORDER BY id DESC LIMIT ?
+        ''', (limit,)).fetchall()
+        totals = conn.execute('''
+            SELECT COUNT(*), SUM(cpu_seconds), MAX(peak_rss_bytes), SUM(read_bytes), SUM(write_bytes),
+                   SUM(CASE WHEN limit_hit IS NOT NULL THEN 1 ELSE 0 END)
+            FROM command_usage WHERE timestamp >= ?
+        ''', ((datetime.now() - timedelta(days=1)).isoformat(),)).fetchone()
+    finally:
+        conn.close()
+    keys = ('timestamp', 'session_id', 'command', 'returncode', 'wall_seconds', 'cpu_seconds',
+            'peak_rss_bytes', 'read_bytes', 'write_bytes', 'limit_hit')
+    return {
+        'commands': [dict(zip(keys, row)) for row in rows],
+        'last_24h': {
+            'commands': totals[0],
+            'cpu_seconds': totals[1] or 0,
+            'max_peak_rss_bytes': totals[2] or 0,
+            'read_bytes': totals[3] or 0,
+            'write_bytes': totals[4] or 0,
+            'limits_hit': totals[5] or 0,
+        },
+    }
+
 def estimate_power_consumption(metrics: Dict[str, Any]) -> float:
     """Estimate power consumption based on CPU and memory usage."""
     # Simple estimation: CPU usage * 0.8 + Memory usage * 0.2
@@ -95,7 +166,7 @@ def estimate_power_consumption(metrics: Dict[str, Any]) -> float:
 def get_historical_metrics(time_range: str) -> List[Dict[str, Any]]:
     """Get historical system metrics for the specified time range."""
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = connect(DB_PATH)
         cursor = conn.cursor()
         
         # Calculate time range
@@ -326,6 +397,3 @@ def get_detailed_system_info() -> Dict[str, Any]:
     except Exception as e:
         print(f"Error getting detailed system info: {e}")
         return {}
-
-# Initialize database on module import
-init_database() 
\ No newline at end of file
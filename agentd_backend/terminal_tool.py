@@ -1,14 +1,120 @@
+import asyncio
+import os
+import signal
 import subprocess
 import platform
 import json
+import re
+import shlex
 
+from .output_capture import BoundedCapture, StreamForwarder, new_output_id
+from .resource_limits import CPU_LIMIT_RETURNCODES, UsageMonitor, configured_limits, with_limits
+from .run_context import current_session_id, emit_event
+from .shell_pool import READ_CHUNK_BYTES, shell_pool
+from .system_metrics import log_command_usage
 
-def execute_shell_command(command: str, requires_admin: bool = False):
+# Default wall-clock limit for one command (seconds); the model can pass a different timeout
+SHELL_TIMEOUT = float(os.getenv("AGENTD_SHELL_TIMEOUT", "600"))
+
+# Commands that only inspect the system. Used to decide whether a command's output may
+# be cached; anything with redirection, substitution or chaining is never read-only.
+READ_ONLY_COMMANDS = {
+    "cat", "date", "df", "dir", "du", "echo", "file", "free", "grep", "head", "hostname",
+    "id", "ls", "lsblk", "lscpu", "nproc", "ps", "pwd", "stat", "systeminfo", "tail",
+    "tasklist", "type", "uname", "uptime", "ver", "wc", "which", "whoami",
+}
+# Arguments that turn an otherwise read-only command into one that changes the system
+_MUTATING_ARGS = {"date": ("-s", "--set"), "hostname": ("",)}
+_UNSAFE_SHELL_SYNTAX = re.compile(r"[;&<>`\n]|\$\(")
+
+
+def is_read_only_command(command: str) -> bool:
+    """True if every stage of a (possibly piped) command is an allowlisted inspection command."""
+    if not command.strip() or _UNSAFE_SHELL_SYNTAX.search(command):
+        return False
+    for stage in command.split("|"):
+        try:
+            argv = shlex.split(stage)
+        except ValueError:
+            return False
+        if not argv or argv[0] not in READ_ONLY_COMMANDS:
+            return False
+        if any(arg.startswith(prefix) for arg in argv[1:] for prefix in _MUTATING_ARGS.get(argv[0], ())):
+            return False
+    return True
+
+
+async def _pump(stream, forwarder: StreamForwarder):
+    while True:
+        data = await stream.read(READ_CHUNK_BYTES)
+        if not data:
+            break
+        forwarder.feed(data)
+    forwarder.flush()
+
+
+def _kill_process_tree(process, own_group: bool):
+    try:
+        if own_group and os.name == "posix":
+            os.killpg(process.pid, signal.SIGKILL)
+        else:
+            process.kill()
+    except ProcessLookupError:
+        pass
+
+
+async def _run_one_shot(full_command: str, timeout: float, own_group: bool,
+                        out: StreamForwarder, err: StreamForwarder):
+    """Run a command in a fresh shell; returns (returncode, timed_out, usage)."""
+    if os.name == "posix":
+        # sudo keeps the server's priority and limits so it can still prompt
+        group_kwargs = {"start_new_session": own_group}
+        if own_group:
+            full_command = with_limits(full_command)
+    else:
+        group_kwargs = {"creationflags": subprocess.CREATE_NEW_PROCESS_GROUP}
+    process = await asyncio.create_subprocess_shell(
+        full_command,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+        **group_kwargs,
+    )
+    monitor = UsageMonitor(process.pid).start()
+
+    async def collect():
+        await asyncio.gather(_pump(process.stdout, out), _pump(process.stderr, err))
+        await process.wait()
+
+    try:
+        await asyncio.wait_for(collect(), timeout)
+    except asyncio.TimeoutError:
+        usage = await monitor.stop()
+        _kill_process_tree(process, own_group)
+        await process.wait()
+        return process.returncode, True, usage
+    except asyncio.CancelledError:
+        _kill_process_tree(process, own_group)
+        monitor.cancel()
+        raise
+    return process.returncode, False, await monitor.stop()
+
+
+async def execute_shell_command(command: str, requires_admin: bool = False, timeout: float = 0):
     """
-    Executes a shell command and captures its output.
-    ... (rest of your docstring) ...
+    Executes a shell command and captures its output. Output lines are streamed to the
+    user while the command runs.
+
+    Args:
+        command (str): The shell command to run.
+        requires_admin (bool): Run the command with sudo (Linux/macOS).
+        timeout (float): Seconds after which the command and all its child processes are
+            killed. 0 uses the server default.
+
+    Returns:
+        dict: status, stdout, stderr, returncode, message and events of the execution.
     """
     current_os = platform.system()
+    timeout = timeout if timeout and timeout > 0 else SHELL_TIMEOUT
     events = []
     
     def add_event(event_type, content):
@@ -32,37 +138,81 @@ def execute_shell_command(command: str, requires_admin: bool = False):
 
     add_event('command', f"Executing: {full_command}")
 
+    # The command gets its own process group so a timeout kills its children too. sudo
+    # stays in the server's session so it can still prompt for a password.
+    own_group = not (requires_admin and current_os in ["Linux", "Darwin"])
+
+    # Only the head and tail of long outputs are kept in memory; the rest is spooled to disk
+    output_id = new_output_id()
+    stdout_capture = BoundedCapture(output_id, "stdout")
+    stderr_capture = BoundedCapture(output_id, "stderr")
+
     try:
-        process = subprocess.run(
-            full_command,
-            shell=True,
-            capture_output=True,
-            text=True,
-            check=False  # Don't raise CalledProcessError for non-zero exit codes
-        )
-
-        add_event('output', f"Return Code: {process.returncode}")
-        if process.stdout.strip():
-            add_event('output', f"STDOUT:\n{process.stdout.strip()}")
-        if process.stderr.strip():
-            add_event('error', f"STDERR:\n{process.stderr.strip()}")
-
-        if process.returncode == 0:
+        emit_event({"type": "tool_output", "tool": "execute_shell_command", "stream": "command", "line": full_command})
+        try:
+            outcome = None
+            if not requires_admin:
+                # Run in the session's long-lived shell so cd and exported variables carry over
+                outcome = await shell_pool.run(current_session_id.get(), command, timeout,
+                                               StreamForwarder(stdout_capture), StreamForwarder(stderr_capture))
+            persistent = outcome is not None
+            if outcome is None:
+                outcome = await _run_one_shot(full_command, timeout, own_group,
+                                              StreamForwarder(stdout_capture), StreamForwarder(stderr_capture))
+            returncode, timed_out, usage = outcome
+        finally:
+            stdout_capture.close()
+            stderr_capture.close()
+
+        stdout = stdout_capture.text().strip()
+        stderr = stderr_capture.text().strip()
+        if timed_out:
+            stderr = (stderr + "\n" if stderr else "") + f"Command timed out after {timeout:g} seconds and was killed."
+            if persistent:
+                stderr += " The session's shell was restarted, so its working directory and environment were reset."
+        limit_hit = "wall_clock" if timed_out else ("cpu_time" if returncode in CPU_LIMIT_RETURNCODES else None)
+        if limit_hit == "cpu_time":
+            stderr = (stderr + "\n" if stderr else "") + f"Command was killed after using its CPU time limit of {configured_limits()['cpu_seconds']} seconds."
+        usage = {**usage, "limit_hit": limit_hit, "limits": {**configured_limits(), "wall_seconds": timeout}}
+        try:
+            await asyncio.to_thread(log_command_usage, current_session_id.get(), command, returncode, usage)
+        except Exception as e:
+            print(f"[Terminal] Error recording command usage: {e}")
+
+        # Output is returned once in stdout/stderr; events only record its size
+        add_event('output', f"Return Code: {returncode}")
+        add_event('output', f"STDOUT: {stdout_capture.total_bytes} bytes" + (" (truncated)" if stdout_capture.truncated else ""))
+        if stderr_capture.total_bytes or timed_out:
+            add_event('error', f"STDERR: {stderr_capture.total_bytes} bytes" + (" (truncated)" if stderr_capture.truncated else ""))
+        output_info = {
+            'stdout_bytes': stdout_capture.total_bytes,
+            'stderr_bytes': stderr_capture.total_bytes,
+            'truncated_bytes': stdout_capture.omitted_bytes + stderr_capture.omitted_bytes,
+        }
+        if stdout_capture.truncated or stderr_capture.truncated:
+            output_info['output_id'] = output_id
+
+        if returncode == 0 and not timed_out:
             result = {
                 'status': 'success',
-                'stdout': process.stdout.strip(),
-                'stderr': process.stderr.strip(),
-                'returncode': process.returncode,
+                'stdout': stdout,
+                'stderr': stderr,
+                'returncode': returncode,
                 'message': f"Command executed successfully on {current_os}.",
+                **output_info,
+                'usage': usage,
                 'events': events
             }
         else:
             result = {
                 'status': 'error',
-                'stdout': process.stdout.strip(),
-                'stderr': process.stderr.strip(),
-                'returncode': process.returncode,
-                'message': f"Command failed with exit code {process.returncode} on {current_os}.",
+                'stdout': stdout,
+                'stderr': stderr,
+                'returncode': returncode,
+                'message': (f"Command timed out after {timeout:g} seconds on {current_os}." if timed_out
+                            else f"Command failed with exit code {returncode} on {current_os}."),
+                **output_info,
+                'usage': usage,
                 'events': events
             }
         
@@ -89,4 +239,9 @@ def execute_shell_command(command: str, requires_admin: bool = False):
             'events': events
         }
         add_event('error', error_result['stderr'])
-        return error_result
\ No newline at end of file
+        return error_result
+
+
+def execute_shell_command_sync(command: str, requires_admin: bool = False, timeout: float = 0):
+    """Blocking wrapper around execute_shell_command for scripts outside the server."""
+    return asyncio.run(execute_shell_command(command, requires_admin, timeout))
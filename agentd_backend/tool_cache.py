@@ -0,0 +1,221 @@
+# tool_cache.py
+"""
+Per-session memoization of idempotent tool calls.
+
+`read_file` results are reused while the file's mtime and size are unchanged; allowlisted
+read-only shell commands are reused for a short TTL. Any round of tool calls that may
+change something (writes, non-allowlisted commands, MCP tools) drops the session's
+cached results, since they may describe state that no longer holds.
+"""
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from .run_context import current_session_id
+from .terminal_tool import is_read_only_command
+
+TOOL_CACHE_ENABLED = os.getenv("AGENTD_TOOL_CACHE", "1").lower() in ("1", "true", "yes")
+TOOL_CACHE_MAX_BYTES = int(os.getenv("AGENTD_TOOL_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))
+SHELL_CACHE_TTL = float(os.getenv("AGENTD_TOOL_CACHE_SHELL_TTL", "10"))
+
+# Tools whose calls never change anything; the shell tool is read-only only for allowlisted commands
+READ_ONLY_TOOLS = {"read_file", "read_command_output", "job_status", "tail_job_output", "search_files", "list_directory"}
+# Read-only tools whose results change on their own (running jobs) or belong to one chat;
+# turns that use them must not be answered from the response cache
+VOLATILE_TOOLS = {"job_status", "tail_job_output"}
+
+
+def is_read_only_call(call: Dict[str, Any]) -> bool:
+    """True if a tool call (name + args, as in AIMessage.tool_calls) cannot change any state."""
+    name = call.get("name")
+    args = call.get("args") or {}
+    if name in READ_ONLY_TOOLS:
+        return True
+    if name == "execute_shell_command":
+        return not args.get("requires_admin") and is_read_only_command(args.get("command", ""))
+    return False
+
+
+def _file_signature(path: str) -> Optional[Tuple[int, int]]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+def _size_of(value: Any) -> int:
+    if isinstance(value, str):
+        return len(value)
+    return len(json.dumps(value, default=str))
+
+
+class ToolResultCache:
+    """
+    LRU cache of tool results keyed by (session, tool, arguments), bounded by the total
+    size of the cached results.
+    """
+
+    def __init__(self, max_bytes: int, shell_ttl: float):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max(1, max_bytes // 8)
+        self.shell_ttl = shell_ttl
+        self.bytes = 0
+        # key -> (validator, expires_at, size, result)
+        self._entries: "OrderedDict[Tuple[str, str, str], Tuple[Any, float, int, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, int]] = {}
+        self._totals = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "invalidations": 0}
+
+    def _count(self, tool: str, key: str):
+        self._totals[key] += 1
+        per_tool = self._stats.setdefault(tool, {"hits": 0, "misses": 0})
+        if key in per_tool:
+            per_tool[key] += 1
+
+    def _drop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.bytes -= entry[2]
+
+    def get(self, session: str, tool: str, args_key: str, validator: Any) -> Tuple[bool, Any]:
+        key = (session, tool, args_key)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == validator and entry[1] > time.monotonic():
+                self._entries.move_to_end(key)
+                self._count(tool, "hits")
+                return True, entry[3]
+            if entry is not None:
+                self._drop(key)
+            self._count(tool, "misses")
+            return False, None
+
+    def put(self, session: str, tool: str, args_key: str, validator: Any, ttl: float, result: Any):
+        size = _size_of(result)
+        if size > self.max_entry_bytes:
+            return
+        key = (session, tool, args_key)
+        with self._lock:
+            self._drop(key)
+            self._entries[key] = (validator, time.monotonic() + ttl, size, result)
+            self.bytes += size
+            self._totals["stores"] += 1
+            while self.bytes > self.max_bytes and self._entries:
+                self._drop(next(iter(self._entries)))
+                self._totals["evictions"] += 1
+
+    def invalidate(self, session: str, tool: Optional[str] = None):
+        """Drop a session's entries (optionally only those of one tool)."""
+        with self._lock:
+            keys = [k for k in self._entries if k[0] == session and (tool is None or k[1] == tool)]
+            for key in keys:
+                self._drop(key)
+            if keys:
+                self._totals["invalidations"] += 1
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                **self._totals,
+                "entries": len(self._entries),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "by_tool": {tool: dict(stats) for tool, stats in self._stats.items()},
+            }
+
+
+tool_cache = ToolResultCache(TOOL_CACHE_MAX_BYTES, SHELL_CACHE_TTL)
+
+
+def _read_file_policy(args: Dict[str, Any]):
+    signature = _file_signature(args.get("path", ""))
+    return (signature, float("inf")) if signature is not None else None
+
+
+def _shell_policy(args: Dict[str, Any]):
+    if is_read_only_call({"name": "execute_shell_command", "args": args}):
+        return (None, tool_cache.shell_ttl)
+    return None
+
+
+def _shell_result_ok(result: Any) -> bool:
+    return isinstance(result, dict) and result.get("status") == "success"
+
+
+# tool name -> (policy(args) -> (validator, ttl) or None if not cacheable, result filter)
+CACHE_POLICIES: Dict[str, Tuple[Callable, Callable[[Any], bool]]] = {
+    "read_file": (_read_file_policy, lambda result: True),
+    "execute_shell_command": (_shell_policy, _shell_result_ok),
+}
+
+
+def _memoize(name: str, func: Callable) -> Callable:
+    policy, keep = CACHE_POLICIES[name]
+    signature = inspect.signature(func)
+
+    def lookup(args, kwargs):
+        """Returns (hit, result, store) where store(result) caches a fresh result."""
+        session = current_session_id.get()
+        bound = signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        call_args = dict(bound.arguments)
+        cacheable = policy(call_args) if session is not None else None
+        if cacheable is None:
+            return False, None, lambda result: None
+        validator, ttl = cacheable
+        args_key = json.dumps(call_args, sort_keys=True, default=str)
+        hit, result = tool_cache.get(session, name, args_key, validator)
+
+        def store(result):
+            if keep(result):
+                tool_cache.put(session, name, args_key, validator, ttl, result)
+        return hit, result, store
+
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            hit, result, store = lookup(args, kwargs)
+            if hit:
+                return result
+            result = await func(*args, **kwargs)
+            store(result)
+            return result
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        hit, result, store = lookup(args, kwargs)
+        if hit:
+            return result
+        result = func(*args, **kwargs)
+        store(result)
+        return result
+
+    return wrapper
+
+
+def with_result_cache(tool: Any) -> Any:
+    """Return `tool` with memoization applied if it has a cache policy (LangChain tools or plain functions)."""
+    if not TOOL_CACHE_ENABLED:
+        return tool
+    name = getattr(tool, "name", None) or getattr(tool, "__name__", None)
+    if name not in CACHE_POLICIES:
+        return tool
+    if callable(getattr(tool, "func", None)):
+        return tool.model_copy(update={"func": _memoize(name, tool.func)})
+    return _memoize(name, tool)
+
+
+def invalidate_for_calls(tool_calls) -> bool:
+    """Drop the current session's cached results if any of the calls may change state."""
+    session = current_session_id.get()
+    if session is None or all(is_read_only_call(call) for call in tool_calls):
+        return False
+    tool_cache.invalidate(session)
+    return True
@@ -0,0 +1,120 @@
+# tool_selector.py
+import math
+import re
+from collections import Counter
+from typing import Iterable, List, Sequence
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+# Very common words that would otherwise match almost every tool description
+_STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "can", "do", "for", "from",
+    "get", "how", "i", "in", "is", "it", "me", "my", "of", "on", "or", "please",
+    "the", "this", "to", "use", "using", "what", "with", "you", "your",
+}
+
+_USER_REQUEST_MARKER = "User request:"
+
+
+def tool_name(tool) -> str:
+    """Return the name of a LangChain tool or a plain function tool."""
+    return getattr(tool, "name", None) or getattr(tool, "__name__", str(tool))
+
+
+def tool_description(tool) -> str:
+    """Return the description of a LangChain tool or a plain function tool."""
+    return getattr(tool, "description", None) or (getattr(tool, "__doc__", None) or "")
+
+
+def tokenize(text: str) -> List[str]:
+    """Split text into lowercase search terms, breaking snake_case and camelCase names."""
+    text = re.sub(r"([a-z0-9])([A-Z])", r"\1 \2", text or "")
+    terms = re.findall(r"[a-z0-9]+", text.lower())
+    return [t for t in terms if len(t) > 1 and t not in _STOPWORDS]
+
+
+class ToolSelector:
+    """
+    Picks the subset of tools that is relevant to the current turn.
+
+    A BM25 keyword index over tool names and descriptions is built once. Tools named in
+    `always_include` (the built-in terminal/file/browse tools) are always selected; the
+    remaining tools (typically MCP tools) are ranked against the latest user request and
+    only the `top_k` best matches are bound to the LLM.
+    """
+
+    def __init__(self, tools: Sequence, always_include: Iterable[str] = (), top_k: int = 12):
+        self.tools = list(tools)
+        self.top_k = top_k
+        self.always_include = set(always_include)
+        self._by_name = {tool_name(t): t for t in self.tools}
+        self._candidates = [t for t in self.tools if tool_name(t) not in self.always_include]
+
+        # Build the BM25 index (names are weighted by repeating them)
+        self._docs = []
+        for tool in self._candidates:
+            name_terms = tokenize(tool_name(tool))
+            self._docs.append(Counter(name_terms * 3 + tokenize(tool_description(tool))))
+        self._avg_len = (sum(sum(d.values()) for d in self._docs) / len(self._docs)) if self._docs else 0.0
+        doc_freq = Counter(term for doc in self._docs for term in doc)
+        n = len(self._docs)
+        self._idf = {term: math.log(1 + (n - df + 0.5) / (df + 0.5)) for term, df in doc_freq.items()}
+
+    @property
+    def enabled(self) -> bool:
+        """Selection only pays off when there are more candidates than we would bind anyway."""
+        return len(self._candidates) > self.top_k
+
+    def _score(self, doc: Counter, query_terms: List[str], k1: float = 1.2, b: float = 0.75) -> float:
+        doc_len = sum(doc.values())
+        score = 0.0
+        for term in query_terms:
+            freq = doc.get(term)
+            if not freq:
+                continue
+            norm = freq + k1 * (1 - b + b * doc_len / (self._avg_len or 1))
+            score += self._idf.get(term, 0.0) * freq * (k1 + 1) / norm
+        return score
+
+    def rank(self, query: str) -> List[str]:
+        """Return candidate tool names matching the query, best first."""
+        query_terms = set(tokenize(query))
+        scored = []
+        for tool, doc in zip(self._candidates, self._docs):
+            score = self._score(doc, query_terms)
+            if score > 0:
+                scored.append((score, tool_name(tool)))
+        scored.sort(key=lambda item: item[0], reverse=True)
+        return [name for _, name in scored[: self.top_k]]
+
+    def select(self, messages: Sequence) -> list:
+        """Return the tools to bind for the turn that ends with `messages`."""
+        if not self.enabled:
+            return self.tools
+
+        # Only the current turn matters: everything after the latest user message
+        turn_start = 0
+        for i in range(len(messages) - 1, -1, -1):
+            if isinstance(messages[i], HumanMessage):
+                turn_start = i
+                break
+        turn = list(messages[turn_start:])
+
+        query = ""
+        if turn and isinstance(turn[0], HumanMessage):
+            query = str(turn[0].content)
+            # The system prompt is prepended to the request, keep only the user's part
+            if _USER_REQUEST_MARKER in query:
+                query = query.split(_USER_REQUEST_MARKER, 1)[1]
+
+        selected = set(self.always_include)
+        selected.update(self.rank(query))
+
+        # Keep tools that were already called during this turn available for follow-up calls
+        for msg in turn:
+            if isinstance(msg, AIMessage):
+                for call in msg.tool_calls or []:
+                    if call.get("name") in self._by_name:
+                        selected.add(call["name"])
+
+        return [t for t in self.tools if tool_name(t) in selected]
@@ -0,0 +1,268 @@
+# tracing.py
+import asyncio
+import json
+import os
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from .db import connect
+from .run_context import current_run_id
+
+# Spans are buffered in memory while a run is active and written in one batch when it ends
+_active_runs: Dict[str, Dict[str, Any]] = {}
+_current_span: ContextVar[Optional[str]] = ContextVar("current_span", default=None)
+
+MAX_ATTR_CHARS = 300
+# Traces of runs older than this are deleted (0 = keep them forever); each process checks
+# at most once per TRACE_PRUNE_INTERVAL seconds, when it writes a run
+TRACE_RETENTION_DAYS = float(os.getenv("AGENTD_TRACE_RETENTION_DAYS", "7"))
+TRACE_PRUNE_INTERVAL = 3600.0
+_last_prune = 0.0
+
+
+def _short(value: Any) -> Any:
+    if isinstance(value, (int, float, bool)) or value is None:
+        return value
+    text = value if isinstance(value, str) else json.dumps(value, default=str)
+    return text if len(text) <= MAX_ATTR_CHARS else text[:MAX_ATTR_CHARS] + "..."
+
+
+def start_run(session_id: Optional[str]) -> str:
+    """Begin collecting spans for a new agent run and make it the current run."""
+    run_id = uuid.uuid4().hex
+    _active_runs[run_id] = {
+        "session_id": session_id,
+        "started_at": datetime.utcnow().isoformat(),
+        "t0": time.perf_counter(),
+        "spans": [],
+    }
+    current_run_id.set(run_id)
+    return run_id
+
+
+def _open_span(run_id: str, name: str, kind: str, parent_id: Optional[str], attrs: Dict[str, Any]) -> Dict[str, Any]:
+    span = {
+        "span_id": uuid.uuid4().hex[:16],
+        "parent_id": parent_id,
+        "name": name,
+        "kind": kind,
+        "start": time.perf_counter(),
+        "duration": None,
+        "attrs": {k: _short(v) for k, v in attrs.items()},
+    }
+    _active_runs[run_id]["spans"].append(span)
+    return span
+
+
+def _close_span(span: Dict[str, Any], **attrs):
+    span["duration"] = time.perf_counter() - span["start"]
+    span["attrs"].update({k: _short(v) for k, v in attrs.items()})
+
+
+@contextmanager
+def span(name: str, kind: str = "internal", **attrs):
+    """
+    Record a span for the current run. Works in sync and async code; does nothing when
+    no run is active. Yields the span's attribute dict so callers can add attributes.
+    """
+    run_id = current_run_id.get()
+    if run_id not in _active_runs:
+        yield {}
+        return
+    record = _open_span(run_id, name, kind, _current_span.get(), attrs)
+    token = _current_span.set(record["span_id"])
+    try:
+        yield record["attrs"]
+    except BaseException as e:
+        record["attrs"]["error"] = _short(repr(e))
+        raise
+    finally:
+        _current_span.reset(token)
+        _close_span(record)
+
+
+class TraceCallbackHandler(BaseCallbackHandler):
+    """
+    LangChain callback handler that turns graph node, chat model and tool callbacks
+    into spans of the given run.
+    """
+
+    run_inline = True  # cheap bookkeeping, don't hop to an executor
+
+    def __init__(self, run_id: str):
+        self.run_id = run_id
+        self._spans: Dict[uuid.UUID, Dict[str, Any]] = {}
+
+    def _start(self, lc_run_id, parent_run_id, name, kind, **attrs):
+        if self.run_id not in _active_runs:
+            return
+        parent = self._spans.get(parent_run_id) if parent_run_id else None
+        parent_id = parent["span_id"] if parent else _current_span.get()
+        self._spans[lc_run_id] = _open_span(self.run_id, name, kind, parent_id, attrs)
+
+    def _end(self, lc_run_id, **attrs):
+        record = self._spans.pop(lc_run_id, None)
+        if record is not None:
+            _close_span(record, **attrs)
+
+    def on_chain_start(self, serialized, inputs, *, run_id, parent_run_id=None, metadata=None, name=None, **kwargs):
+        # Only graph nodes are interesting, not every runnable inside them
+        node = (metadata or {}).get("langgraph_node")
+        if node and name == node:
+            self._start(run_id, parent_run_id, node, "node", step=(metadata or {}).get("langgraph_step"))
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error=repr(error))
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, parent_run_id=None, metadata=None, **kwargs):
+        model = (metadata or {}).get("ls_model_name") or (serialized or {}).get("name", "chat_model")
+        self._start(run_id, parent_run_id, f"llm:{model}", "llm",
+                    input_messages=sum(len(batch) for batch in messages))
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        usage = {}
+        try:
+            message = response.generations[0][0].message
+            usage = getattr(message, "usage_metadata", None) or {}
+        except (IndexError, AttributeError):
+            pass
+        self._end(run_id,
+                  input_tokens=usage.get("input_tokens"),
+                  output_tokens=usage.get("output_tokens"),
+                  total_tokens=usage.get("total_tokens"))
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error=repr(error))
+
+    def on_tool_start(self, serialized, input_str, *, run_id, parent_run_id=None, name=None, inputs=None, **kwargs):
+        tool = name or (serialized or {}).get("name", "tool")
+        self._start(run_id, parent_run_id, f"tool:{tool}", "tool", args=inputs if inputs is not None else input_str)
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error=repr(error))
+
+
+def _write_run(run_id: str, run: Dict[str, Any], status: str, duration: float):
+    t0 = run["t0"]
+    rows = [
+        (
+            run_id, s["span_id"], s["parent_id"], s["name"], s["kind"],
+            round((s["start"] - t0) * 1000, 3),
+            round((s["duration"] if s["duration"] is not None else duration - (s["start"] - t0)) * 1000, 3),
+            json.dumps({k: v for k, v in s["attrs"].items() if v is not None}) if s["attrs"] else None,
+        )
+        for s in run["spans"]
+    ]
+    conn = connect()
+    try:
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO trace_runs (run_id, session_id, started_at, duration_ms, status) VALUES (?, ?, ?, ?, ?)",
+                (run_id, run["session_id"], run["started_at"], round(duration * 1000, 3), status),
+            )
+            conn.executemany(
+                "INSERT INTO trace_spans (run_id, span_id, parent_id, name, kind, start_ms, duration_ms, attrs) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            _prune_old_runs(conn)
+    finally:
+        conn.close()
+
+
+def _prune_old_runs(conn):
+    """Delete the runs (and their spans) that are past TRACE_RETENTION_DAYS, if a check is due."""
+    global _last_prune
+    now = time.monotonic()
+    if TRACE_RETENTION_DAYS <= 0 or (_last_prune and now - _last_prune < TRACE_PRUNE_INTERVAL):
+        return
+    _last_prune = now
+    cutoff = (datetime.utcnow() - timedelta(days=TRACE_RETENTION_DAYS)).isoformat()
+    conn.execute("DELETE FROM trace_spans WHERE run_id IN (SELECT run_id FROM trace_runs WHERE started_at < ?)", (cutoff,))
+    deleted = conn.execute("DELETE FROM trace_runs WHERE started_at < ?", (cutoff,)).rowcount
+    if deleted:
+        print(f"[Tracing] Deleted traces of {deleted} runs older than {TRACE_RETENTION_DAYS:g} days")
+
+
+async def finish_run(run_id: str, status: str = "ok"):
+    """Stop collecting spans for a run and persist them (off the event loop)."""
+    run = _active_runs.pop(run_id, None)
+    if run is None:
+        return
+    duration = time.perf_counter() - run["t0"]
+    try:
+        await asyncio.to_thread(_write_run, run_id, run, status, duration)
+    except Exception as e:
+        print(f"[Tracing] Error saving trace for run {run_id}: {e}")
+
+
+def get_trace(run_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Load a run's spans in a waterfall-ready shape: spans ordered by start offset with their
+    nesting depth, plus total time per span kind and per span name.
+    """
+    conn = connect()
+    try:
+        run = conn.execute(
+            "SELECT run_id, session_id, started_at, duration_ms, status FROM trace_runs WHERE run_id = ?", (run_id,)
+        ).fetchone()
+        if run is None:
+            return None
+        rows = conn.execute(
+            "SELECT span_id, parent_id, name, kind, start_ms, duration_ms, attrs FROM trace_spans "
+            "WHERE run_id = ? ORDER BY start_ms", (run_id,)
+        ).fetchall()
+    finally:
+        conn.close()
+
+    spans: List[Dict[str, Any]] = []
+    depth: Dict[str, int] = {}
+    for span_id, parent_id, name, kind, start_ms, duration_ms, attrs in rows:
+        depth[span_id] = depth.get(parent_id, -1) + 1 if parent_id else 0
+        spans.append({
+            "span_id": span_id,
+            "parent_id": parent_id,
+            "name": name,
+            "kind": kind,
+            "depth": depth[span_id],
+            "start_ms": start_ms,
+            "end_ms": round(start_ms + duration_ms, 3),
+            "duration_ms": duration_ms,
+            "attrs": json.loads(attrs) if attrs else {},
+        })
+
+    by_kind: Dict[str, Dict[str, float]] = {}
+    by_name: Dict[str, Dict[str, float]] = {}
+    for s in spans:
+        for key, table in ((s["kind"], by_kind), (s["name"], by_name)):
+            entry = table.setdefault(key, {"count": 0, "total_ms": 0.0})
+            entry["count"] += 1
+            entry["total_ms"] = round(entry["total_ms"] + s["duration_ms"], 3)
+
+    tokens = {"input_tokens": 0, "output_tokens": 0}
+    for s in spans:
+        if s["kind"] == "llm":
+            for key in tokens:
+                tokens[key] += s["attrs"].get(key) or 0
+
+    return {
+        "run_id": run[0],
+        "session_id": run[1],
+        "started_at": run[2],
+        "duration_ms": run[3],
+        "status": run[4],
+        "spans": spans,
+        "breakdown": {"by_kind": by_kind, "by_name": by_name, "llm_tokens": tokens},
+    }
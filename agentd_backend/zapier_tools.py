@@ -1,19 +1,18 @@
 # zapier_tools.py
+from __future__ import annotations
+
 import asyncio
 import os
 import json
+import time
 from pathlib import Path
-from typing import List
-from langchain_core.tools import BaseTool
-
-# Try to import MCP-related modules, but don't fail if they're not available
-try:
-    from mcp_use.client import MCPClient
-    from mcp_use.adapters import LangChainAdapter
-    MCP_AVAILABLE = True
-except ImportError:
-    MCP_AVAILABLE = False
-    print("MCP modules not available. Running without MCP tools.")
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional
+
+if TYPE_CHECKING:
+    from langchain_core.tools import BaseTool
+
+# MCP-related modules are imported on first use (see _load_mcp); don't fail if they're not available
+MCP_AVAILABLE = None
 
 from dotenv import load_dotenv
 
@@ -22,6 +21,8 @@ load_dotenv()
 _mcp_client = None
 _mcp_adapter = None
 _initialized_mcp_tools: List[BaseTool] = []
+_mcp_status: Dict[str, Dict[str, Any]] = {}
+_mcp_done = False
 
 # def ensure_mcp_config():
 #     """Ensure the MCP configuration file exists with proper structure."""
@@ -47,68 +48,117 @@ _initialized_mcp_tools: List[BaseTool] = []
 #             json.dump(default_config, f, indent=2)
 #     return config_path
 
-async def initialize_and_get_mcp_tools() -> List[BaseTool]:
+def _load_mcp() -> bool:
+    """Import the MCP client libraries on first use. Returns False if they are not installed."""
+    global MCP_AVAILABLE, MCPClient, LangChainAdapter
+    if MCP_AVAILABLE is None:
+        try:
+            from mcp_use.client import MCPClient
+            from mcp_use.adapters import LangChainAdapter
+            MCP_AVAILABLE = True
+        except ImportError:
+            MCP_AVAILABLE = False
+            print("MCP modules not available. Running without MCP tools.")
+    return MCP_AVAILABLE
+
+def get_mcp_config_path() -> Path:
+    """Path of the MCP server configuration file."""
+    # Get config path relative to project root (OS_AGENT directory)
+    return Path(__file__).parent.parent.parent / "browser_mcp.json"
+
+def get_mcp_status() -> Dict[str, Any]:
     """
-    Initializes the MCPClient and LangChainAdapter to create and return
-    the raw list of Zapier tools directly. This function should be called once.
+    Report MCP readiness: per-server connection state and the number of tools loaded.
+    `ready` becomes True once every configured server has either connected or failed.
     """
-    global _mcp_client, _mcp_adapter, _initialized_mcp_tools
+    servers = {name: dict(info) for name, info in _mcp_status.items()}
+    return {
+        "available": MCP_AVAILABLE,
+        "ready": _mcp_done,
+        "tool_count": len(_initialized_mcp_tools),
+        "servers": servers,
+    }
 
-    # If MCP is not available, return empty list
-    if not MCP_AVAILABLE:
+async def connect_mcp_servers(on_tools_ready: Optional[Callable[[List[BaseTool]], Any]] = None) -> List[BaseTool]:
+    """
+    Connects to every configured MCP server concurrently. As soon as one server is
+    connected its (de-duplicated) tools are passed to `on_tools_ready`, so callers can
+    start using them without waiting for slower servers.
+    """
+    global _mcp_client, _mcp_adapter, _mcp_done
+
+    if not _load_mcp():
         print("MCP tools not available. Continuing without MCP functionality.")
+        _mcp_done = True
         return []
 
-    if not _initialized_mcp_tools:
-        print("Initializing MCP Client and getting raw Zapier tools...")
-        
+    try:
+        _mcp_client = MCPClient.from_config_file(get_mcp_config_path())
+        _mcp_adapter = LangChainAdapter()
+        server_names = _mcp_client.get_server_names()
+    except Exception as e:
+        print(f"Error initializing MCP tools: {e}")
+        _mcp_done = True
+        return []
+
+    for name in server_names:
+        _mcp_status[name] = {"status": "pending", "tool_count": 0, "error": None}
+
+    async def connect(name: str):
+        _mcp_status[name]["status"] = "connecting"
+        started = time.monotonic()
         try:
-            # Ensure config file exists
-            # Get config path relative to project root (OS_AGENT directory)
-            config_path = Path(__file__).parent.parent.parent / "browser_mcp.json"
-            
-            # Load and validate config
-            # with open(config_path, 'r') as f:
-            #     config = json.load(f)
-            
-            # # Ensure proper configuration
-            # if "mcpServers" not in config:
-            #     print("Warning: Invalid MCP configuration: missing mcpServers")
-            #     return []
-                
-            # for server_name, server_config in config["mcpServers"].items():
-            #     if "type" not in server_config:
-            #         print(f"Warning: Invalid server configuration for {server_name}: missing type")
-            #         return []
-            #     if "command" not in server_config:
-            #         print(f"Warning: Invalid server configuration for {server_name}: missing command")
-            #         return []
-            
-            # # Save updated config
-            # with open(config_path, 'w') as f:
-            #     json.dump(config, f, indent=2)
-            
-            _mcp_client = MCPClient.from_config_file(config_path)
-            _mcp_adapter = LangChainAdapter()
-            all_tools = await _mcp_adapter.create_tools(_mcp_client)
-            
-            # Filter out duplicate tools by name
-            seen_names = set()
-            _initialized_mcp_tools = []
-            for tool in all_tools:
-                if tool.name not in seen_names:
-                    seen_names.add(tool.name)
-                    _initialized_mcp_tools.append(tool)
-                else:
-                    print(f"Skipping duplicate tool: {tool.name}")
-            
-            print(f"Discovered {len(_initialized_mcp_tools)} unique Zapier tools.")
+            session = await _mcp_client.create_session(name)
+            tools = await _mcp_adapter.load_tools_for_connector(session.connector)
         except Exception as e:
-            print(f"Error initializing MCP tools: {e}")
-            # Return empty list if initialization fails
-            return []
-            
-    return _initialized_mcp_tools
+            print(f"Error connecting to MCP server '{name}': {e}")
+            _mcp_status[name].update(status="error", error=str(e))
+            return
+
+        # Filter out duplicate tools by name
+        seen_names = {tool.name for tool in _initialized_mcp_tools}
+        new_tools = []
+        for tool in tools:
+            if tool.name not in seen_names:
+                seen_names.add(tool.name)
+                new_tools.append(tool)
+            else:
+                print(f"Skipping duplicate tool: {tool.name}")
+        _initialized_mcp_tools.extend(new_tools)
 
+        if on_tools_ready and new_tools:
+            # A failing callback (e.g. the graph recompile) only fails this server
+            try:
+                result = on_tools_ready(new_tools)
+                if asyncio.iscoroutine(result):
+                    await result
+            except Exception as e:
+                print(f"Error adding tools of MCP server '{name}': {e}")
+                for tool in new_tools:
+                    _initialized_mcp_tools.remove(tool)
+                _mcp_status[name].update(status="error", error=str(e))
+                return
 
+        _mcp_status[name].update(
+            status="ready",
+            tool_count=len(new_tools),
+            connect_seconds=round(time.monotonic() - started, 2),
+        )
+        print(f"MCP server '{name}' ready with {len(new_tools)} tools.")
 
+    try:
+        await asyncio.gather(*(connect(name) for name in server_names))
+    finally:
+        _mcp_done = True
+    print(f"Discovered {len(_initialized_mcp_tools)} unique MCP tools.")
+    return _initialized_mcp_tools
+
+async def initialize_and_get_mcp_tools() -> List[BaseTool]:
+    """
+    Initializes the MCPClient and LangChainAdapter to create and return
+    the raw list of Zapier tools directly. This function should be called once.
+    """
+    if not _mcp_done and not _mcp_status:
+        print("Initializing MCP Client and getting raw Zapier tools...")
+        await connect_mcp_servers()
+    return _initialized_mcp_tools
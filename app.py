@@ -6,77 +6,91 @@ from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
 import asyncio
 import json
-import sqlite3
 import os
+import importlib
 from pathlib import Path
 from typing import Dict, Any, List
 from datetime import datetime
 from contextlib import asynccontextmanager
 
 # Import backend components
-from agentd_backend.agentD_2 import initialize_agent, invoke_agent, summarize_chat_history
+# The agent module pulls in LangChain/LangGraph and the Gemini SDK, so it is imported
+# lazily (see get_agent_module) to keep the server import cheap.
+from agentd_backend.db import connect, init_db
 from agentd_backend.mcp_config import router as mcp_router
+from agentd_backend.session_lock import try_acquire_process_lock
 from agentd_backend.system_metrics import (
     get_system_metrics, 
     get_detailed_system_info, 
     log_system_metrics, 
-    get_historical_metrics
+    get_historical_metrics,
+    init_database as init_metrics_db
 )
 
-# --- Database Initialization ---
-DB_PATH = "memory.sqlite"
+# --- Agent Initialization ---
+_agent_init_task = None
+# Error of the last failed initialization attempt, reported by /api/health
+_agent_init_error = None
 
-def init_db():
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    # Chat Tables
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS chat_sessions (
-        id TEXT PRIMARY KEY,
-        title TEXT NOT NULL,
-        created_at TEXT NOT NULL,
-        updated_at TEXT NOT NULL
-    )""")
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS chat_messages (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        session_id TEXT NOT NULL,
-        role TEXT NOT NULL,
-        content TEXT NOT NULL,
-        timestamp TEXT NOT NULL,
-        FOREIGN KEY(session_id) REFERENCES chat_sessions(id) ON DELETE CASCADE
-    )""")
-    # Agent Tasks Table
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS agent_tasks (
-        id TEXT PRIMARY KEY,
-        name TEXT NOT NULL,
-        description TEXT,
-        task TEXT NOT NULL,
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        last_result TEXT
-    )""")
-    conn.commit()
-    conn.close()
-
-init_db()
+async def _load_and_initialize_agent():
+    global _agent_init_error
+    try:
+        # Import off the event loop so requests are served while the SDKs load
+        agent_module = await asyncio.to_thread(importlib.import_module, "agentd_backend.agentD_2")
+        await agent_module.initialize_agent()
+    except Exception as e:
+        _agent_init_error = f"{type(e).__name__}: {e}"
+        print(f"[Agent] Initialization failed: {_agent_init_error}")
+        raise
+    _agent_init_error = None
+    return agent_module
+
+def _init_failed(task) -> bool:
+    return task.done() and (task.cancelled() or task.exception() is not None)
+
+async def get_agent_module():
+    """
+    Return the agent module, waiting for the initialization if it is still running. If the
+    last attempt failed, a new one is started, so a transient error doesn't need a restart.
+    """
+    global _agent_init_task
+    if _agent_init_task is None or _init_failed(_agent_init_task):
+        _agent_init_task = asyncio.create_task(_load_and_initialize_agent())
+    return await _agent_init_task
 
 # --- Background Tasks ---
 async def periodic_metrics_logger(interval_seconds: int = 60):
+    # With several workers only the one holding the lock logs; the others retry each
+    # interval so logging resumes if that worker exits.
+    leader_lock = None
     while True:
-        try:
-            log_system_metrics()
-        except Exception as e:
-            print(f"[Periodic Logger] Error: {e}")
+        if leader_lock is None:
+            leader_lock = try_acquire_process_lock("metrics-logger")
+        if leader_lock is not None:
+            try:
+                log_system_metrics()
+            except Exception as e:
+                print(f"[Periodic Logger] Error: {e}")
         await asyncio.sleep(interval_seconds)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    global _agent_init_task
+    init_db()
+    init_metrics_db()
+    # Jobs whose runner exited while the server was down are marked finished or lost
+    from agentd_backend.jobs import reconcile_jobs
+    await asyncio.to_thread(reconcile_jobs)
     print("Initializing LangGraph agent...")
-    await initialize_agent()
-    asyncio.create_task(periodic_metrics_logger(60))
+    _agent_init_task = asyncio.create_task(_load_and_initialize_agent())
+    metrics_task = asyncio.create_task(periodic_metrics_logger(60))
     yield
     print("Application shutting down...")
+    metrics_task.cancel()
+    if _agent_init_task.done() and not _agent_init_task.cancelled() and _agent_init_task.exception() is None:
+        await _agent_init_task.result().shutdown_agent()
+    else:
+        _agent_init_task.cancel()
 
 app = FastAPI(lifespan=lifespan)
 
@@ -101,11 +115,91 @@ app.include_router(mcp_router, prefix="/api")
 
 # --- API Routes ---
 
+@app.get("/api/health")
+async def health():
+    task = _agent_init_task
+    if task is None or not task.done():
+        agent_status = "initializing"
+    elif _init_failed(task):
+        agent_status = "failed"
+    else:
+        agent_status = "ready"
+    return {
+        "status": "ok" if agent_status != "failed" else "degraded",
+        "agent_ready": agent_status == "ready",
+        "agent_status": agent_status,
+        # Set when the last attempt failed; the next chat request retries the initialization
+        "agent_error": _agent_init_error if agent_status == "failed" else None,
+    }
+
 # 1. System Metrics
 @app.get("/api/system-metrics")
 async def get_metrics():
     return JSONResponse(content=get_system_metrics())
 
+@app.get("/api/client-metrics")
+async def client_metrics():
+    """Connection reuse counters of the shared HTTP client pools and LLM throttling stats."""
+    from agentd_backend.clients import get_client_metrics
+    from agentd_backend.llm_gateway import gateway
+    return JSONResponse(content={**get_client_metrics(), "llm_gateway": gateway.metrics()})
+
+@app.get("/api/cache-metrics")
+async def cache_metrics():
+    """Hit/miss counters of the response cache, the per-session tool result cache and read_file tracking."""
+    from agentd_backend.response_cache import response_cache
+    from agentd_backend.tool_cache import tool_cache
+    from agentd_backend.read_tracker import read_tracker
+    return JSONResponse(content={"response_cache": response_cache.metrics(), "tool_cache": tool_cache.metrics(),
+                                 "read_tracking": read_tracker.metrics()})
+
+@app.get("/api/shell-workers")
+async def shell_workers():
+    """Size and reuse counters of the persistent per-session shell pool."""
+    from agentd_backend.shell_pool import shell_pool
+    return JSONResponse(content=shell_pool.metrics())
+
+@app.get("/api/command-usage")
+async def command_usage(limit: int = 50):
+    """CPU seconds, peak RSS and I/O of recent agent-launched commands, plus 24h totals."""
+    from agentd_backend.system_metrics import get_command_usage
+    from agentd_backend.resource_limits import configured_limits
+    usage = await asyncio.to_thread(get_command_usage, limit)
+    return JSONResponse(content={**usage, "limits": configured_limits()})
+
+# Background jobs
+@app.get("/api/jobs")
+async def list_background_jobs(session_id: str = None, limit: int = 50):
+    """Background jobs, newest first, optionally only those of one chat session."""
+    from agentd_backend.jobs import list_jobs
+    return JSONResponse(content={"jobs": await asyncio.to_thread(list_jobs, session_id, limit)})
+
+@app.get("/api/jobs/{job_id}")
+async def get_background_job(job_id: str):
+    from agentd_backend.jobs import get_job
+    job = await asyncio.to_thread(get_job, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return JSONResponse(content=job)
+
+@app.get("/api/jobs/{job_id}/output")
+async def get_background_job_output(job_id: str, stream: str = "stdout", lines: int = 100):
+    from agentd_backend.jobs import tail_output
+    if stream not in ("stdout", "stderr"):
+        raise HTTPException(status_code=400, detail="stream must be stdout or stderr")
+    tail = await asyncio.to_thread(tail_output, job_id, stream, lines)
+    if tail is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return JSONResponse(content=tail)
+
+@app.post("/api/jobs/{job_id}/cancel")
+async def cancel_background_job(job_id: str):
+    from agentd_backend.jobs import cancel_job
+    job = await asyncio.to_thread(cancel_job, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return JSONResponse(content=job)
+
 @app.get("/api/historical-metrics/{time_range}")
 async def get_historical(time_range: str):
     return JSONResponse(content={"metrics": get_historical_metrics(time_range), "time_range": time_range})
@@ -115,17 +209,40 @@ async def get_historical(time_range: str):
 async def chat_endpoint(payload: Dict[str, Any]):
     session_id = payload.get("session_id")
     user_message = payload.get("message")
+    from agentd_backend.budgets import make_budget
+    try:
+        make_budget(payload.get("budget"))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid budget: {e}")
     
+    agent_module = await get_agent_module()
+
     async def event_generator():
         config = {"configurable": {"thread_id": session_id}}
-        async for event in invoke_agent(user_message, config):
+        async for event in agent_module.invoke_agent(user_message, config, use_cache=payload.get("cache"),
+                                                    budget=payload.get("budget"), plan=payload.get("plan")):
             yield f"data: {json.dumps(event)}\n\n"
             
     return StreamingResponse(event_generator(), media_type="text/event-stream")
 
+@app.get("/api/runs/{run_id}/trace")
+async def get_run_trace(run_id: str):
+    """Span waterfall and per-kind latency breakdown of one agent run."""
+    from agentd_backend.tracing import get_trace  # pulls in langchain_core, keep it off the import path
+    trace = await asyncio.to_thread(get_trace, run_id)
+    if trace is None:
+        raise HTTPException(status_code=404, detail="Run not found")
+    return JSONResponse(content=trace)
+
+@app.get("/api/budget-overruns")
+async def list_budget_overruns(limit: int = 50):
+    """Most recent turns that hit a tool-round, time or token budget."""
+    from agentd_backend.budgets import get_overruns
+    return JSONResponse(content={"overruns": await asyncio.to_thread(get_overruns, limit)})
+
 @app.get("/api/chat_sessions")
 async def list_sessions(type: str = None):
-    conn = sqlite3.connect(DB_PATH)
+    conn = connect()
     cursor = conn.cursor()
     cursor.execute("SELECT id, title, created_at, updated_at FROM chat_sessions ORDER BY updated_at DESC")
     all_sessions = [{"id": r[0], "title": r[1], "created_at": r[2], "updated_at": r[3]} for r in cursor.fetchall()]
@@ -142,7 +259,7 @@ async def list_sessions(type: str = None):
 
 @app.get("/api/chat_sessions/{session_id}")
 async def get_chat_session_messages(session_id: str):
-    conn = sqlite3.connect(DB_PATH)
+    conn = connect()
     cursor = conn.cursor()
     cursor.execute("SELECT id, role, content, timestamp FROM chat_messages WHERE session_id = ? ORDER BY timestamp ASC", (session_id,))
     messages = [
@@ -166,7 +283,7 @@ async def create_chat_session(request: Request):
         # Use title if provided, else use first_message, else fallback
         title = payload.get("title") or payload.get("first_message") or payload.get("message") or "Untitled Chat"
         now = datetime.utcnow().isoformat()
-        conn = sqlite3.connect(DB_PATH)
+        conn = connect()
         cursor = conn.cursor()
         cursor.execute("INSERT INTO chat_sessions (id, title, created_at, updated_at) VALUES (?, ?, ?, ?)", (session_id, title, now, now))
         conn.commit()
@@ -178,7 +295,7 @@ async def create_chat_session(request: Request):
 
 @app.delete("/api/chat_sessions/{session_id}")
 async def delete_chat_session(session_id: str):
-    conn = sqlite3.connect(DB_PATH)
+    conn = connect()
     cursor = conn.cursor()
     cursor.execute("DELETE FROM chat_sessions WHERE id = ?", (session_id,))
     cursor.execute("DELETE FROM chat_messages WHERE session_id = ?", (session_id,))
@@ -194,7 +311,7 @@ async def add_chat_message(payload: Dict[str, Any]):
     timestamp = payload.get("timestamp", datetime.utcnow().isoformat())
     if not (session_id and role and content):
         raise HTTPException(status_code=400, detail="Missing session_id, role, or content.")
-    conn = sqlite3.connect(DB_PATH)
+    conn = connect()
     cursor = conn.cursor()
     cursor.execute("INSERT INTO chat_messages (session_id, role, content, timestamp) VALUES (?, ?, ?, ?)", (session_id, role, content, timestamp))
     cursor.execute("UPDATE chat_sessions SET updated_at = ? WHERE id = ?", (timestamp, session_id))
@@ -216,7 +333,8 @@ async def summarize_chat(request: Dict[str, Any]):
         if not messages:
             return JSONResponse(content={"summary": "Untitled Chat"})
 
-        summary = await summarize_chat_history(messages)
+        agent_module = await get_agent_module()
+        summary = await agent_module.summarize_chat_history(messages)
         return JSONResponse(content={"summary": summary})
     except Exception as e:
         print(f"Error summarizing chat: {e}")
@@ -249,7 +367,7 @@ async def update_zapier_mcp(payload: Dict[str, Any]):
 # 4. Agent Tasks
 @app.get("/api/agent_tasks")
 async def get_agent_tasks():
-    conn = sqlite3.connect(DB_PATH)
+    conn = connect()
     cursor = conn.cursor()
     cursor.execute("SELECT id, name, description, task, created_at, last_result FROM agent_tasks ORDER BY created_at DESC")
     tasks = [{"id": r[0], "name": r[1], "description": r[2], "task": r[3], "created_at": r[4], "last_result": r[5]} for r in cursor.fetchall()]
@@ -266,7 +384,7 @@ async def create_agent_task(payload: Dict[str, Any]):
     now = datetime.utcnow().isoformat()
     description = payload.get("description", "")
     
-    conn = sqlite3.connect(DB_PATH)
+    conn = connect()
     cursor = conn.cursor()
     cursor.execute("INSERT INTO agent_tasks (id, name, description, task, created_at) VALUES (?, ?, ?, ?, ?)", 
                    (task_id, name, description, task, now))
@@ -289,7 +407,7 @@ async def update_agent_task(task_id: str, payload: Dict[str, Any]):
     if not name or not task:
         raise HTTPException(status_code=400, detail="Name and task are required")
     
-    conn = sqlite3.connect(DB_PATH)
+    conn = connect()
     cursor = conn.cursor()
     cursor.execute("UPDATE agent_tasks SET name = ?, description = ?, task = ? WHERE id = ?", 
                    (name, payload.get("description"), task, task_id))
@@ -304,7 +422,7 @@ async def update_agent_task(task_id: str, payload: Dict[str, Any]):
 
 @app.delete("/api/agent_tasks/{task_id}")
 async def delete_agent_task(task_id: str):
-    conn = sqlite3.connect(DB_PATH)
+    conn = connect()
     cursor = conn.cursor()
     cursor.execute("DELETE FROM agent_tasks WHERE id = ?", (task_id,))
     conn.commit()
@@ -319,4 +437,12 @@ async def serve_frontend(request: Request, full_path: str):
     return templates.TemplateResponse("index.html", {"request": request})
 
 if __name__ == "__main__":
-    uvicorn.run("app:app", host="127.0.0.1", port=8000, reload=True)
\ No newline at end of file
+    # AGENTD_WORKERS > 1 runs several worker processes; each initializes its own agent and
+    # MCP connections, and they coordinate through SQLite (WAL) and per-session file locks.
+    workers = int(os.getenv("AGENTD_WORKERS", "1"))
+    host = os.getenv("AGENTD_HOST", "127.0.0.1")
+    port = int(os.getenv("AGENTD_PORT", "8000"))
+    if workers > 1:
+        uvicorn.run("app:app", host=host, port=port, workers=workers)
+    else:
+        uvicorn.run("app:app", host=host, port=port, reload=True)
\ No newline at end of file
@@ -0,0 +1,275 @@
+"""
+Offline end-to-end benchmark for the AGENTD agent.
+
+Gemini is replaced by a deterministic scripted chat model that replays the tool-call
+transcripts in benchmarks/transcripts.json, and the progress-step client by a canned
+stub (both registered in agentd_backend.clients). Everything else is real: /api/chat, the LangGraph graph, ToolNode and the tools,
+the SQLite checkpointer and the SSE stream. No network access or API keys are needed.
+
+Reported per run:
+  * per-turn latency percentiles (request sent -> final "response" event)
+  * time to the first SSE event
+  * checkpoint bytes written (checkpoints + writes tables), total and per turn
+  * event-loop stalls measured by a 5 ms ticker
+
+Usage (from the repository root):
+    python benchmarks/agent_bench.py --turns 20 --concurrency 4
+"""
+import argparse
+import asyncio
+import json
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import List, Optional
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+
+class ScriptedChatModel(BaseChatModel):
+    """
+    Chat model that replays scripted transcripts. The transcript is picked by matching
+    its prompt against the latest user message; the step is the number of AI messages
+    already produced since that message.
+    """
+
+    transcripts: List[dict]
+    workdir: str = ""
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted"
+
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+    def _next_message(self, messages) -> AIMessage:
+        turn_start = max(i for i, m in enumerate(messages) if isinstance(m, HumanMessage))
+        request = str(messages[turn_start].content)
+        step = sum(1 for m in messages[turn_start:] if isinstance(m, AIMessage))
+
+        transcript = next((t for t in self.transcripts if t["prompt"] in request), None)
+        if transcript is None:
+            return AIMessage(content="No scripted transcript for this request.")
+        steps = transcript["steps"]
+        spec = json.loads(json.dumps(steps[min(step, len(steps) - 1)]).replace("{workdir}", self.workdir))
+
+        input_tokens = sum(len(str(m.content)) for m in messages) // 4
+        content = spec.get("content", "")
+        usage = {"input_tokens": input_tokens, "output_tokens": len(content) // 4 + 1,
+                 "total_tokens": input_tokens + len(content) // 4 + 1}
+        tool_calls = [
+            {"name": call["name"], "args": call["args"], "id": f"{transcript['name']}-{step}-{i}", "type": "tool_call"}
+            for i, call in enumerate(spec.get("tool_calls", []))
+        ]
+        return AIMessage(content=content, tool_calls=tool_calls, usage_metadata=usage)
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        return ChatResult(generations=[ChatGeneration(message=self._next_message(messages))])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        return self._generate(messages, stop=stop, run_manager=run_manager, **kwargs)
+
+
+class _FakeProgressResponse:
+    text = "1. Understanding the request\n2. Choosing tools\n3. Running tools\n4. Preparing the answer"
+
+
+class FakeProgressClient:
+    """Stands in for google.genai.Client in progress_gemini."""
+
+    class models:
+        @staticmethod
+        def generate_content(model=None, contents=None, **kwargs):
+            return _FakeProgressResponse()
+
+    class aio:
+        class models:
+            @staticmethod
+            async def generate_content(model=None, contents=None, **kwargs):
+                return _FakeProgressResponse()
+
+
+class LoopStallMonitor:
+    """Measures how late a 5 ms ticker wakes up, i.e. how long the event loop was blocked."""
+
+    def __init__(self, interval: float = 0.005, threshold: float = 0.02):
+        self.interval = interval
+        self.threshold = threshold
+        self.max_lag = 0.0
+        self.stalled_seconds = 0.0
+        self.stalls = 0
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self):
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            lag = time.perf_counter() - started - self.interval
+            self.max_lag = max(self.max_lag, lag)
+            if lag > self.threshold:
+                self.stalls += 1
+                self.stalled_seconds += lag
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+
+def checkpoint_bytes(db_path: str) -> int:
+    conn = sqlite3.connect(db_path)
+    try:
+        total = 0
+        for query in (
+            "SELECT COALESCE(SUM(LENGTH(checkpoint) + LENGTH(metadata)), 0) FROM checkpoints",
+            "SELECT COALESCE(SUM(LENGTH(value)), 0) FROM writes",
+        ):
+            try:
+                total += conn.execute(query).fetchone()[0]
+            except sqlite3.OperationalError:
+                pass  # tables are created lazily by the checkpointer
+        return total
+    finally:
+        conn.close()
+
+
+def percentiles(values: List[float]) -> dict:
+    if not values:
+        return {}
+    ordered = sorted(values)
+
+    def pct(p):
+        return round(ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))] * 1000, 2)
+
+    return {"p50_ms": pct(50), "p90_ms": pct(90), "p99_ms": pct(99), "max_ms": round(ordered[-1] * 1000, 2),
+            "mean_ms": round(statistics.mean(ordered) * 1000, 2)}
+
+
+async def run_benchmark(args) -> dict:
+    import httpx
+
+    transcripts = json.loads(Path(args.transcripts).read_text())
+    workdir = os.getcwd()
+
+    # Register the fake LLM and progress client before the agent is initialized
+    from agentd_backend import agentD_2, clients
+    clients._chat_llm = ScriptedChatModel(transcripts=transcripts, workdir=workdir)
+    clients._genai_client = FakeProgressClient()
+    agentD_2.PROGRESS_STEP_DELAY = 0.0
+
+    import uvicorn
+    import app as app_module
+
+    latencies, first_events, per_scenario = [], [], {}
+    monitor = LoopStallMonitor()
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    # Serve the real app over a local socket in this event loop, so SSE chunks are
+    # observed as they are flushed and loop stalls include the server's own work.
+    server = uvicorn.Server(uvicorn.Config(app_module.app, host="127.0.0.1", port=args.port, log_level="warning"))
+    serve_task = asyncio.create_task(server.serve())
+    while not server.started:
+        if serve_task.done():
+            serve_task.result()
+        await asyncio.sleep(0.01)
+    port = server.servers[0].sockets[0].getsockname()[1]
+
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=None) as client:
+            await app_module.get_agent_module()
+            bytes_before = checkpoint_bytes("memory.sqlite")
+
+            async def one_turn(turn: int, transcript: dict):
+                session_id = f"bench-session-{turn % args.sessions}"
+                async with semaphore:
+                    started = time.perf_counter()
+                    first = None
+                    async with client.stream("POST", "/api/chat", json={"session_id": session_id, "message": transcript["prompt"], "cache": args.cache}) as resp:
+                        async for line in resp.aiter_lines():
+                            if not line.startswith("data: "):
+                                continue
+                            if first is None:
+                                first = time.perf_counter() - started
+                            if json.loads(line[6:]).get("type") == "response":
+                                break
+                    elapsed = time.perf_counter() - started
+                latencies.append(elapsed)
+                first_events.append(first or elapsed)
+                per_scenario.setdefault(transcript["name"], []).append(elapsed)
+
+            # Warm-up turn (imports, graph compilation caches, table creation)
+            await one_turn(-1, transcripts[0])
+            latencies.clear(); first_events.clear(); per_scenario.clear()
+
+            monitor.start()
+            started = time.perf_counter()
+            await asyncio.gather(*(one_turn(i, transcripts[i % len(transcripts)]) for i in range(args.turns)))
+            wall = time.perf_counter() - started
+            await monitor.stop()
+
+            written = checkpoint_bytes("memory.sqlite") - bytes_before
+    finally:
+        server.should_exit = True
+        await serve_task
+
+    return {
+        "turns": args.turns,
+        "concurrency": args.concurrency,
+        "sessions": args.sessions,
+        "cache": args.cache,
+        "wall_s": round(wall, 3),
+        "turns_per_s": round(args.turns / wall, 2) if wall else None,
+        "latency": percentiles(latencies),
+        "first_event": percentiles(first_events),
+        "latency_by_transcript": {name: percentiles(v) for name, v in per_scenario.items()},
+        "checkpoint_bytes": {"total": written, "per_turn": written // max(1, args.turns)},
+        "event_loop": {
+            "max_stall_ms": round(monitor.max_lag * 1000, 2),
+            "stalls_over_20ms": monitor.stalls,
+            "stalled_ms": round(monitor.stalled_seconds * 1000, 2),
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--sessions", type=int, default=4, help="number of chat sessions turns are spread over")
+    parser.add_argument("--port", type=int, default=0, help="port for the in-process server (0 = any free port)")
+    parser.add_argument("--cache", action="store_true", help="send requests with the response cache enabled")
+    parser.add_argument("--transcripts", default=str(ROOT / "benchmarks" / "transcripts.json"))
+    parser.add_argument("--record", help="append the result as a JSON line to this file")
+    args = parser.parse_args()
+    args.transcripts = str(Path(args.transcripts).resolve())
+    record = str(Path(args.record).resolve()) if args.record else None
+
+    os.environ.setdefault("GOOGLE_API_KEY", "benchmark-placeholder")
+    # Run in a scratch directory so the benchmark gets fresh memory.sqlite / metrics databases
+    with tempfile.TemporaryDirectory(prefix="agentd-bench-") as workdir:
+        os.chdir(workdir)
+        result = asyncio.run(run_benchmark(args))
+
+    print(json.dumps(result, indent=2))
+    if record:
+        with open(record, "a") as f:
+            f.write(json.dumps(result) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+"""
+Local stand-in for the BrowserUse cloud API, and an offline check of browse_web_cloud.
+
+The stub serves the task endpoints the SDK uses (create, get, status, stop). A task
+produces one step every --step-seconds and finishes after --steps steps; tasks whose
+text contains "[hang]" never finish. Run it on its own and point the backend at it:
+
+    python benchmarks/browser_use_stub.py --serve --port 8765
+    BROWSER_USE_BASE_URL=http://127.0.0.1:8765/api/v2 BROWSER_USE_API_KEY=stub python app.py
+
+Without --serve it starts the stub in-process and runs three scenarios against the real
+tool: a task that completes (steps are streamed), a task that hits the deadline and a
+turn that is cancelled; both of the latter must stop the remote task. Event-loop stalls
+are measured throughout, since the tool must never block the loop while it waits.
+
+Usage (from the repository root):
+    python benchmarks/browser_use_stub.py
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from fastapi import FastAPI, HTTPException
+
+from agent_bench import LoopStallMonitor
+
+
+def create_stub_app(steps: int, step_seconds: float) -> FastAPI:
+    app = FastAPI()
+    app.state.tasks = {}
+
+    def now():
+        return datetime.now(timezone.utc).isoformat()
+
+    def view(task):
+        elapsed = time.monotonic() - task["started"]
+        done = task["stopped_at"] is not None
+        count = int(elapsed / step_seconds)
+        if not task["hang"]:
+            count = min(count, steps)
+        if done:
+            count = min(count, task["steps_at_stop"])
+        status = "stopped" if done else ("finished" if not task["hang"] and count >= steps else "started")
+        return {
+            "id": task["id"], "sessionId": task["session_id"], "llm": task["llm"], "task": task["task"],
+            "status": status, "createdAt": task["created_at"], "startedAt": task["created_at"],
+            "finishedAt": task["stopped_at"] or (now() if status == "finished" else None),
+            "steps": [
+                {"number": i + 1, "memory": "", "evaluationPreviousGoal": "", "nextGoal": f"Stub step {i + 1}",
+                 "url": f"https://example.com/page/{i + 1}", "actions": ["click"]}
+                for i in range(count)
+            ],
+            "output": f"Stub result for: {task['task']}" if status == "finished" else None,
+            "outputFiles": [],
+            "isSuccess": True if status == "finished" else None,
+        }
+
+    @app.post("/api/v2/tasks", status_code=202)
+    async def create_task(body: dict):
+        task_id = uuid.uuid4().hex
+        app.state.tasks[task_id] = {
+            "id": task_id, "session_id": uuid.uuid4().hex, "llm": body.get("llm", ""), "task": body.get("task", ""),
+            "hang": "[hang]" in body.get("task", ""), "created_at": now(), "started": time.monotonic(),
+            "stopped_at": None, "steps_at_stop": 0,
+        }
+        return {"id": task_id, "sessionId": app.state.tasks[task_id]["session_id"]}
+
+    def lookup(task_id: str):
+        task = app.state.tasks.get(task_id)
+        if task is None:
+            raise HTTPException(status_code=404, detail="Task not found")
+        return task
+
+    @app.get("/api/v2/tasks/{task_id}")
+    async def get_task(task_id: str):
+        return view(lookup(task_id))
+
+    @app.get("/api/v2/tasks/{task_id}/status")
+    async def get_task_status(task_id: str):
+        v = view(lookup(task_id))
+        return {k: v[k] for k in ("id", "status", "output", "finishedAt", "isSuccess")}
+
+    @app.patch("/api/v2/tasks/{task_id}")
+    async def update_task(task_id: str, body: dict):
+        task = lookup(task_id)
+        if body.get("action") in ("stop", "stop_task_and_session") and task["stopped_at"] is None:
+            task["steps_at_stop"] = len(view(task)["steps"])
+            task["stopped_at"] = now()
+        return view(task)
+
+    return app
+
+
+async def run_scenarios(args) -> dict:
+    import uvicorn
+
+    app = create_stub_app(args.steps, args.step_seconds)
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=args.port, log_level="warning"))
+    serve_task = asyncio.create_task(server.serve())
+    while not server.started:
+        if serve_task.done():
+            serve_task.result()
+        await asyncio.sleep(0.01)
+    port = server.servers[0].sockets[0].getsockname()[1]
+
+    # Point the shared client at the stub before it is created
+    from agentd_backend import browse_cloud_tool, clients
+    from agentd_backend.run_context import current_event_sink
+    clients.BROWSER_USE_BASE_URL = f"http://127.0.0.1:{port}/api/v2"
+    os.environ.setdefault("BROWSER_USE_API_KEY", "stub")
+    browse_cloud_tool.BROWSE_POLL_INTERVAL = args.step_seconds / 2
+    browse_cloud_tool.BROWSE_POLL_MAX_INTERVAL = args.step_seconds * 2
+    # Warm-up: importing the SDK is a one-off cost, not a stall of the polling loop
+    clients.get_async_browser_use_client()
+
+    monitor = LoopStallMonitor()
+    monitor.start()
+    results = {}
+    try:
+        events = []
+        current_event_sink.set(events.append)
+        started = time.perf_counter()
+        result = await browse_cloud_tool.browse_web_cloud.ainvoke({"query": "Find the opening hours"})
+        results["complete"] = {
+            "ok": result["status"] == "success" and len(events) == args.steps,
+            "seconds": round(time.perf_counter() - started, 2),
+            "streamed_steps": len(events),
+            "result": result,
+        }
+
+        started = time.perf_counter()
+        try:
+            await browse_cloud_tool.run_browse_task("[hang] Keep browsing", timeout=args.step_seconds * 3)
+            timed_out = False
+        except browse_cloud_tool.BrowseTimeout:
+            timed_out = True
+        stopped = [t for t in app.state.tasks.values() if t["hang"] and t["stopped_at"]]
+        results["deadline"] = {"ok": timed_out and len(stopped) == 1,
+                               "seconds": round(time.perf_counter() - started, 2)}
+
+        turn = asyncio.create_task(browse_cloud_tool.browse_web_cloud.ainvoke({"query": "[hang] Cancel me"}))
+        await asyncio.sleep(args.step_seconds * 2)
+        turn.cancel()
+        try:
+            await turn
+        except asyncio.CancelledError:
+            pass
+        await asyncio.gather(*browse_cloud_tool._pending_stops)
+        cancelled = [t for t in app.state.tasks.values() if t["task"] == "[hang] Cancel me"]
+        results["cancel"] = {"ok": len(cancelled) == 1 and cancelled[0]["stopped_at"] is not None}
+    finally:
+        await monitor.stop()
+        await clients.close_clients()
+        server.should_exit = True
+        await serve_task
+
+    return {
+        "ok": all(r["ok"] for r in results.values()),
+        "scenarios": results,
+        "event_loop": {
+            "max_stall_ms": round(monitor.max_lag * 1000, 2),
+            "stalls_over_20ms": monitor.stalls,
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--serve", action="store_true", help="only run the stub server")
+    parser.add_argument("--port", type=int, default=0, help="port of the stub (0 = any free port)")
+    parser.add_argument("--steps", type=int, default=4, help="steps a task takes to finish")
+    parser.add_argument("--step-seconds", type=float, default=0.3, help="seconds per step")
+    args = parser.parse_args()
+
+    if args.serve:
+        import uvicorn
+        uvicorn.run(create_stub_app(args.steps, args.step_seconds), host="127.0.0.1", port=args.port or 8765)
+        return
+    result = asyncio.run(run_scenarios(args))
+    print(json.dumps(result, indent=2))
+    sys.exit(0 if result["ok"] else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+Startup benchmark for the AGENTD backend.
+
+Measures, in fresh Python processes:
+  * import time of `app` (median/min over --runs)
+  * time from spawning uvicorn to the first HTTP 200 on /api/health
+  * time until /api/health reports the agent as ready
+
+Usage (from the repository root):
+    python benchmarks/startup_bench.py --runs 5
+    python benchmarks/startup_bench.py --runs 5 --record benchmarks/startup_results.jsonl
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+from datetime import datetime
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+IMPORT_SNIPPET = (
+    "import time; t = time.perf_counter(); import app; "
+    "print(time.perf_counter() - t)"
+)
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _get_json(url: str, timeout: float = 0.5):
+    with urllib.request.urlopen(url, timeout=timeout) as resp:
+        return resp.status, json.loads(resp.read() or b"{}")
+
+
+def measure_import(env) -> float:
+    out = subprocess.run(
+        [sys.executable, "-c", IMPORT_SNIPPET],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True,
+    )
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def measure_server(env, deadline: float = 120.0) -> dict:
+    port = _free_port()
+    url = f"http://127.0.0.1:{port}/api/health"
+    started = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app:app", "--host", "127.0.0.1", "--port", str(port)],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    first_200 = agent_ready = None
+    try:
+        while time.perf_counter() - started < deadline:
+            try:
+                status, body = _get_json(url)
+            except OSError:
+                time.sleep(0.01)
+                continue
+            now = time.perf_counter() - started
+            if status == 200 and first_200 is None:
+                first_200 = now
+            if body.get("agent_ready"):
+                agent_ready = now
+                break
+            time.sleep(0.05)
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+    return {"first_200_s": first_200, "agent_ready_s": agent_ready}
+
+
+def _summary(values):
+    values = [v for v in values if v is not None]
+    if not values:
+        return None
+    return {"median": round(statistics.median(values), 4), "min": round(min(values), 4), "max": round(max(values), 4)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--skip-server", action="store_true", help="only measure import time")
+    parser.add_argument("--record", help="append the result as a JSON line to this file")
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env.setdefault("GOOGLE_API_KEY", "benchmark-placeholder")
+
+    # Warm the bytecode cache so the first run is not an outlier
+    measure_import(env)
+
+    imports = [measure_import(env) for _ in range(args.runs)]
+    servers = [] if args.skip_server else [measure_server(env) for _ in range(args.runs)]
+
+    result = {
+        "timestamp": datetime.utcnow().isoformat(),
+        "commit": subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                                 capture_output=True, text=True).stdout.strip(),
+        "python": sys.version.split()[0],
+        "runs": args.runs,
+        "import_app_s": _summary(imports),
+        "first_200_s": _summary([s["first_200_s"] for s in servers]),
+        "agent_ready_s": _summary([s["agent_ready_s"] for s in servers]),
+    }
+    print(json.dumps(result, indent=2))
+
+    if args.record:
+        with open(args.record, "a") as f:
+            f.write(json.dumps(result) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,6 @@
 import asyncio
 from langgraph.graph import StateGraph, END
-from agentd_backend.terminal_tool import execute_shell_command
+from agentd_backend.terminal_tool import execute_shell_command_sync as execute_shell_command
 from agentd_backend.zapier_tools import initialize_and_get_mcp_tools
 from agentd_backend.browse_cloud_tool import browse_web_cloud
 from agentd_backend.file_tools import create_file, write_file, read_file, list_directory
@@ -0,0 +1,102 @@
+import os
+
+from agentd_backend.file_tools import apply_patch
+
+ORIGINAL = "".join(f"line {i}\n" for i in range(1, 21))
+
+
+def _patch(path, patch, fuzz=2):
+    return apply_patch.invoke({"patch": patch, "path": str(path), "fuzz": fuzz})
+
+
+def _file(tmp_path, content=ORIGINAL):
+    path = tmp_path / "file.txt"
+    path.write_text(content)
+    return path
+
+
+def test_applies_hunk_at_stated_position(tmp_path):
+    path = _file(tmp_path)
+    result = _patch(path, "@@ -9,3 +9,4 @@\n line 9\n line 10\n+inserted\n line 11\n")
+    assert result.startswith("Successfully applied patch")
+    assert path.read_text() == ORIGINAL.replace("line 10\n", "line 10\ninserted\n")
+
+
+def test_finds_hunk_with_wrong_line_numbers(tmp_path):
+    path = _file(tmp_path)
+    result = _patch(path, "@@ -2,3 +2,3 @@\n line 14\n-line 15\n+line fifteen\n line 16\n")
+    assert "offset +12 lines" in result
+    assert "line fifteen\n" in path.read_text()
+
+
+def test_fuzz_ignores_one_mismatched_context_line_per_end(tmp_path):
+    path = _file(tmp_path)
+    patch = "@@ -8,5 +8,5 @@\n changed 8\n line 9\n-line 10\n+line ten\n line 11\n changed 12\n"
+    result = _patch(path, patch)
+    assert "fuzz 1" in result
+    assert path.read_text() == ORIGINAL.replace("line 10\n", "line ten\n")
+
+
+def test_context_that_exists_nowhere_is_a_conflict(tmp_path):
+    path = _file(tmp_path)
+    patch = "@@ -10,4 +10,5 @@\n bogus a\n bogus b\n+inserted\n bogus c\n bogus d\n"
+    result = _patch(path, patch)
+    assert result.startswith("Error applying patch: no files were modified.")
+    assert "Hunk 1" in result
+    assert path.read_text() == ORIGINAL
+
+
+def test_bogus_context_without_line_numbers_is_a_conflict(tmp_path):
+    path = _file(tmp_path)
+    result = _patch(path, "@@ @@\n bogus a\n bogus b\n+inserted\n bogus c\n bogus d\n")
+    assert result.startswith("Error applying patch")
+    assert path.read_text() == ORIGINAL
+
+
+def test_added_lines_without_context_or_line_number_are_a_conflict(tmp_path):
+    path = _file(tmp_path)
+    result = _patch(path, "@@ @@\n+inserted\n")
+    assert "neither context lines nor a line number" in result
+    assert path.read_text() == ORIGINAL
+
+
+def test_added_lines_without_context_use_the_stated_line(tmp_path):
+    path = _file(tmp_path)
+    result = _patch(path, "@@ -3,0 +4 @@\n+inserted\n", fuzz=0)
+    assert result.startswith("Successfully applied patch")
+    assert path.read_text() == ORIGINAL.replace("line 3\n", "line 3\ninserted\n")
+
+
+def test_failed_hunk_leaves_every_file_unchanged(tmp_path):
+    first = tmp_path / "a.txt"
+    second = tmp_path / "b.txt"
+    first.write_text(ORIGINAL)
+    second.write_text(ORIGINAL)
+    patch = (
+        f"--- {first}\n+++ {first}\n@@ -1,3 +1,3 @@\n line 1\n-line 2\n+line two\n line 3\n"
+        f"--- {second}\n+++ {second}\n@@ -1,3 +1,3 @@\n nope 1\n-nope 2\n+line two\n nope 3\n"
+    )
+    result = apply_patch.invoke({"patch": patch})
+    assert result.startswith("Error applying patch: no files were modified.")
+    assert first.read_text() == ORIGINAL
+    assert second.read_text() == ORIGINAL
+
+
+def test_creates_and_deletes_files(tmp_path):
+    created = tmp_path / "new.txt"
+    deleted = _file(tmp_path, "gone\n")
+    patch = (
+        f"--- /dev/null\n+++ {created}\n@@ -0,0 +1,2 @@\n+hello\n+world\n"
+        f"--- {deleted}\n+++ /dev/null\n@@ -1 +0,0 @@\n-gone\n"
+    )
+    result = apply_patch.invoke({"patch": patch})
+    assert result.startswith("Successfully applied patch")
+    assert created.read_text() == "hello\nworld\n"
+    assert not os.path.exists(deleted)
+
+
+def test_creates_file_named_by_path(tmp_path):
+    created = tmp_path / "new.txt"
+    result = _patch(created, "--- /dev/null\n+++ b/new.txt\n@@ -0,0 +1,2 @@\n+hello\n+world\n")
+    assert result.startswith("Successfully applied patch")
+    assert created.read_text() == "hello\nworld\n"
@@ -0,0 +1,55 @@
+import os
+
+from agentd_backend.file_tools import batch_file_operations, replace_in_file
+
+
+def test_replace_in_file_writes_through_symlinks(tmp_path):
+    target = tmp_path / "real.conf"
+    target.write_text("port=1\n")
+    link = tmp_path / "link.conf"
+    link.symlink_to(target)
+    result = replace_in_file.invoke({"path": str(link), "old_string": "port=1", "new_string": "port=2"})
+    assert result.startswith("Successfully replaced")
+    assert link.is_symlink()
+    assert target.read_text() == "port=2\n"
+
+
+def test_replace_in_file_keeps_hard_links(tmp_path):
+    first = tmp_path / "a.txt"
+    first.write_text("old\n")
+    second = tmp_path / "b.txt"
+    os.link(first, second)
+    replace_in_file.invoke({"path": str(first), "old_string": "old", "new_string": "new"})
+    assert second.read_text() == "new\n"
+    assert os.stat(first).st_nlink == 2
+
+
+def test_batch_rollback_restores_hard_linked_file(tmp_path):
+    first = tmp_path / "a.txt"
+    first.write_text("old\n")
+    second = tmp_path / "b.txt"
+    os.link(first, second)
+    result = batch_file_operations.invoke({"atomic": True, "operations": [
+        {"op": "write", "path": str(first), "content": "new\n"},
+        {"op": "delete", "path": str(tmp_path / "missing.txt")},
+    ]})
+    assert "rolled back" in result
+    assert first.read_text() == second.read_text() == "old\n"
+    assert os.stat(first).st_nlink == 2
+    assert sorted(os.listdir(tmp_path)) == ["a.txt", "b.txt"]
+
+
+def test_batch_rollback_restores_deleted_symlink(tmp_path):
+    target = tmp_path / "real.txt"
+    target.write_text("old\n")
+    link = tmp_path / "link.txt"
+    link.symlink_to(target)
+    result = batch_file_operations.invoke({"atomic": True, "operations": [
+        {"op": "write", "path": str(target), "content": "new\n"},
+        {"op": "delete", "path": str(link)},
+        {"op": "delete", "path": str(tmp_path / "missing.txt")},
+    ]})
+    assert "rolled back" in result
+    assert link.is_symlink() and os.readlink(link) == str(target)
+    assert target.read_text() == "old\n"
+    assert sorted(os.listdir(tmp_path)) == ["link.txt", "real.txt"]